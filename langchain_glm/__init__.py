@@ -5,6 +5,7 @@ from importlib import metadata
 
 from langchain_glm.agents import ZhipuAIAllToolsRunnable
 from langchain_glm.chat_models import ChatZhipuAI
+from langchain_glm.embeddings import ZhipuAIEmbeddings
 
 try:
     __version__ = metadata.version(__package__)
@@ -17,4 +18,5 @@ del metadata  # optional, avoids polluting the results of dir(__package__)
 __all__ = [
     "ChatZhipuAI",
     "ZhipuAIAllToolsRunnable",
+    "ZhipuAIEmbeddings",
 ]
@@ -1,4 +1,8 @@
 # -*- coding: utf-8 -*-
-from langchain_glm.agent_toolkits.all_tools import AdapterAllTool, BaseToolOutput
+from langchain_glm.agent_toolkits.all_tools import (
+    AdapterAllTool,
+    BaseToolOutput,
+    LocalCodeInterpreterPool,
+)
 
-__all__ = ["BaseToolOutput", "AdapterAllTool"]
+__all__ = ["BaseToolOutput", "AdapterAllTool", "LocalCodeInterpreterPool"]
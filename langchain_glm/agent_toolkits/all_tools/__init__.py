@@ -1,7 +1,10 @@
 # -*- coding: utf-8 -*-
+from langchain_glm.agent_toolkits.all_tools.code_interpreter_pool import (
+    LocalCodeInterpreterPool,
+)
 from langchain_glm.agent_toolkits.all_tools.tool import (
     AdapterAllTool,
     BaseToolOutput,
 )
 
-__all__ = ["BaseToolOutput", "AdapterAllTool"]
+__all__ = ["BaseToolOutput", "AdapterAllTool", "LocalCodeInterpreterPool"]
@@ -0,0 +1,305 @@
+# -*- coding: utf-8 -*-
+"""Warm worker processes for the local (``sandbox: none``) code interpreter.
+
+Every worker keeps one python interpreter state per session, so variables and
+imports survive between the calls of a conversation, and runs the code with
+CPU time and memory limits. The parent side only waits on a pipe, a call that
+exceeds its wall clock timeout kills and replaces the worker.
+"""
+import itertools
+import logging
+import multiprocessing
+import threading
+from collections import OrderedDict
+from multiprocessing.connection import Connection
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from langchain_core.runnables.config import run_in_executor
+
+logger = logging.getLogger(__name__)
+
+try:
+    import resource
+    import signal
+except ImportError:  # pragma: no cover - windows
+    resource = None
+    signal = None
+
+
+class _CPUTimeExceeded(BaseException):
+    """Raised inside the worker by SIGXCPU, escapes the REPL's error handling."""
+
+
+def _on_cpu_limit(signum: int, frame: Any) -> None:
+    raise _CPUTimeExceeded()
+
+
+def _cpu_seconds() -> float:
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+def _worker_main(
+    conn: Connection,
+    memory_limit: Optional[int],
+    max_sessions: int,
+    preload_modules: Sequence[str],
+) -> None:
+    from langchain_experimental.tools import PythonAstREPLTool
+
+    if resource is not None:
+        if memory_limit is not None:
+            resource.setrlimit(resource.RLIMIT_AS, (memory_limit, memory_limit))
+        signal.signal(signal.SIGXCPU, _on_cpu_limit)
+    warm_globals: Dict[str, Any] = {}
+    for module in preload_modules:
+        try:
+            warm_globals[module] = __import__(module)
+        except ImportError:
+            logger.warning(f"code interpreter worker can not preload {module}")
+    conn.send(("ready", None))
+
+    sessions: "OrderedDict[str, PythonAstREPLTool]" = OrderedDict()
+    while True:
+        try:
+            command, session_id, payload = conn.recv()
+        except EOFError:
+            return
+        if command == "drop":
+            sessions.pop(session_id, None)
+            continue
+
+        code, cpu_time_limit = payload
+        if session_id is None:
+            tool = PythonAstREPLTool(globals=dict(warm_globals))
+        else:
+            tool = sessions.pop(session_id, None) or PythonAstREPLTool(
+                globals=dict(warm_globals)
+            )
+            sessions[session_id] = tool
+            while len(sessions) > max_sessions:
+                sessions.popitem(last=False)
+
+        limited = resource is not None and cpu_time_limit is not None
+        if limited:
+            _, hard = resource.getrlimit(resource.RLIMIT_CPU)
+            resource.setrlimit(
+                resource.RLIMIT_CPU, (int(_cpu_seconds() + cpu_time_limit) + 1, hard)
+            )
+        try:
+            conn.send(("ok", str(tool.run(tool_input=code))))
+        except _CPUTimeExceeded:
+            conn.send(("error", f"CPU time limit of {cpu_time_limit}s exceeded"))
+        except MemoryError:
+            conn.send(("error", "Memory limit exceeded"))
+        finally:
+            if limited:
+                resource.setrlimit(resource.RLIMIT_CPU, (hard, hard))
+
+
+class _Worker:
+    def __init__(self, pool: "LocalCodeInterpreterPool"):
+        self.pool = pool
+        self.lock = threading.Lock()
+        self.process: Optional[multiprocessing.process.BaseProcess] = None
+        self.conn: Optional[Connection] = None
+
+    def start(self) -> None:
+        ctx = multiprocessing.get_context(self.pool.mp_context)
+        parent_conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(
+            target=_worker_main,
+            args=(
+                child_conn,
+                self.pool.memory_limit,
+                self.pool.max_sessions_per_worker,
+                self.pool.preload_modules,
+            ),
+            daemon=True,
+        )
+        self.process.start()
+        child_conn.close()
+        self.conn = parent_conn
+        # the call timeouts should not include spawning and importing
+        try:
+            ready = parent_conn.poll(self.pool.startup_timeout)
+            if ready:
+                parent_conn.recv()
+        except (EOFError, OSError):
+            ready = False
+        if not ready:
+            self.stop()
+            raise RuntimeError("Code interpreter worker failed to start")
+
+    def stop(self) -> None:
+        if self.process is not None and self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+        if self.conn is not None:
+            self.conn.close()
+        self.process = None
+        self.conn = None
+
+    def call(
+        self,
+        session_id: Optional[str],
+        code: str,
+        timeout: Optional[float],
+        cpu_time_limit: Optional[float],
+    ) -> Tuple[str, str]:
+        with self.lock:
+            if self.process is None or not self.process.is_alive():
+                self.stop()
+                self.start()
+            try:
+                self.conn.send(("run", session_id, (code, cpu_time_limit)))
+                if self.conn.poll(timeout):
+                    return self.conn.recv()
+                error = f"Timeout after {timeout}s"
+            except (EOFError, OSError):
+                error = "Code interpreter worker died"
+            # the interpreter state of every session on this worker is lost,
+            # the next call starts a new worker
+            logger.warning(f"{error}, stopping code interpreter worker")
+            self.stop()
+            return "error", error
+
+    def drop(self, session_id: str) -> None:
+        with self.lock:
+            if self.conn is not None:
+                self.conn.send(("drop", session_id, None))
+
+
+class LocalCodeInterpreterPool:
+    """Pool of pre-spawned processes running code with warm interpreters.
+
+    Calls of one session always go to the same worker and share its globals,
+    calls without a session get a fresh interpreter.
+    """
+
+    def __init__(
+        self,
+        size: int = 2,
+        timeout: Optional[float] = 60,
+        cpu_time_limit: Optional[float] = 30,
+        memory_limit: Optional[int] = 1024 * 1024 * 1024,
+        max_sessions_per_worker: int = 64,
+        preload_modules: Sequence[str] = ("math", "json"),
+        mp_context: str = "spawn",
+        startup_timeout: Optional[float] = 60,
+    ):
+        """
+        Args:
+            size: Number of worker processes.
+            timeout: Wall clock seconds per call before the worker is killed.
+            cpu_time_limit: CPU seconds per call (POSIX only).
+            memory_limit: Address space limit of a worker in bytes (POSIX only).
+            max_sessions_per_worker: Interpreter states kept per worker, the
+                least recently used one is dropped first.
+            preload_modules: Imported once per worker and visible in every
+                interpreter.
+            mp_context: multiprocessing start method.
+            startup_timeout: Seconds a new worker may take until it is ready.
+        """
+        self.size = size
+        self.timeout = timeout
+        self.cpu_time_limit = cpu_time_limit
+        self.memory_limit = memory_limit
+        self.max_sessions_per_worker = max_sessions_per_worker
+        self.preload_modules = tuple(preload_modules)
+        self.mp_context = mp_context
+        self.startup_timeout = startup_timeout
+        self._workers: List[_Worker] = []
+        self._affinity: "OrderedDict[str, _Worker]" = OrderedDict()
+        self._next_worker = itertools.count()
+        self._lock = threading.Lock()
+
+    def __deepcopy__(self, memo: Dict[int, Any]) -> "LocalCodeInterpreterPool":
+        # a pool is a shared resource, copies of the tools holding it share it
+        return self
+
+    def start(self) -> None:
+        """Spawn the workers now instead of on the first call."""
+        with self._lock:
+            if self._workers:
+                return
+            self._workers = [_Worker(self) for _ in range(self.size)]
+            for worker in self._workers:
+                worker.start()
+
+    def close(self) -> None:
+        with self._lock:
+            for worker in self._workers:
+                worker.stop()
+            self._workers = []
+            self._affinity.clear()
+
+    def _worker_for(self, session_id: Optional[str]) -> _Worker:
+        self.start()
+        with self._lock:
+            if session_id is None:
+                return self._workers[next(self._next_worker) % self.size]
+            worker = self._affinity.pop(session_id, None)
+            if worker is None:
+                worker = self._workers[next(self._next_worker) % self.size]
+            self._affinity[session_id] = worker
+            while len(self._affinity) > self.size * self.max_sessions_per_worker:
+                self._affinity.popitem(last=False)
+            return worker
+
+    def run(
+        self,
+        code: str,
+        session_id: Optional[str] = None,
+        timeout: Optional[float] = None,
+    ) -> str:
+        """Run ``code`` and return what it printed or evaluated to.
+
+        Raises:
+            RuntimeError: The call hit a limit or the worker died.
+        """
+        worker = self._worker_for(session_id)
+        status, output = worker.call(
+            session_id,
+            code,
+            timeout if timeout is not None else self.timeout,
+            self.cpu_time_limit,
+        )
+        if status == "error":
+            raise RuntimeError(output)
+        return output
+
+    async def arun(
+        self,
+        code: str,
+        session_id: Optional[str] = None,
+        timeout: Optional[float] = None,
+    ) -> str:
+        """Same as :meth:`run`, waiting for the worker off the event loop."""
+        return await run_in_executor(None, self.run, code, session_id, timeout)
+
+    def drop_session(self, session_id: str) -> None:
+        """Forget the interpreter state of a session."""
+        with self._lock:
+            worker = self._affinity.pop(session_id, None)
+        if worker is not None:
+            worker.drop(session_id)
+
+
+_default_pool: Optional[LocalCodeInterpreterPool] = None
+_default_pool_lock = threading.Lock()
+
+
+def get_default_code_interpreter_pool() -> LocalCodeInterpreterPool:
+    """Pool shared by code interpreter tools that were not given their own."""
+    global _default_pool
+    with _default_pool_lock:
+        if _default_pool is None:
+            _default_pool = LocalCodeInterpreterPool()
+        return _default_pool
+
+
+def set_default_code_interpreter_pool(pool: LocalCodeInterpreterPool) -> None:
+    global _default_pool
+    with _default_pool_lock:
+        _default_pool = pool
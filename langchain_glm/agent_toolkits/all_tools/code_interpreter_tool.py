@@ -1,9 +1,10 @@
 # -*- coding: utf-8 -*-
 import json
 import logging
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple, Union
 
+from dataclasses_json import config
 from langchain_core.agents import AgentAction
 from langchain_core.callbacks import (
     AsyncCallbackManagerForChainRun,
@@ -12,6 +13,10 @@ from langchain_core.callbacks import (
 )
 
 from langchain_glm.agent_toolkits import AdapterAllTool
+from langchain_glm.agent_toolkits.all_tools.code_interpreter_pool import (
+    LocalCodeInterpreterPool,
+    get_default_code_interpreter_pool,
+)
 from langchain_glm.agent_toolkits.all_tools.tool import (
     AllToolExecutor,
     BaseToolOutput,
@@ -53,6 +58,37 @@ class CodeInterpreterAllToolExecutor(AllToolExecutor):
     """platform adapter tool for code interpreter tool"""
 
     name: str
+    worker_pool: Optional[LocalCodeInterpreterPool] = field(
+        default=None, metadata=config(exclude=lambda _: True)
+    )
+    """Runs the code of ``sandbox: none``, defaults to the shared pool."""
+    use_worker_pool: bool = True
+    """Run the code of ``sandbox: none`` in ``worker_pool``, ``False`` runs it
+    in this process with ``PythonAstREPLTool`` instead, without worker
+    processes, time or memory limits."""
+
+    def _get_worker_pool(self) -> LocalCodeInterpreterPool:
+        return self.worker_pool or get_default_code_interpreter_pool()
+
+    @staticmethod
+    def _session_id(
+        run_manager: Optional[
+            Union[CallbackManagerForToolRun, AsyncCallbackManagerForToolRun]
+        ],
+    ) -> Optional[str]:
+        if run_manager is None:
+            return None
+        return run_manager.metadata.get("session_id")
+
+    def _local_output(self, code_input: str, out: str) -> CodeInterpreterToolOutput:
+        if str(out) == "":
+            raise ValueError(f"Tool {self.name} local sandbox is out empty")
+        return CodeInterpreterToolOutput(
+            tool="python_repl_ast",
+            code_input=code_input,
+            code_output=out,
+            platform_params=self.platform_params,
+        )
 
     @staticmethod
     def _python_ast_interpreter(
@@ -100,9 +136,14 @@ class CodeInterpreterAllToolExecutor(AllToolExecutor):
                 logger.warning(
                     f"Tool {self.name} sandbox is local!!!, this not safe, please use jupyter sandbox it"
                 )
-                return self._python_ast_interpreter(
-                    code_input=tool_input, platform_params=self.platform_params
+                if not self.use_worker_pool:
+                    return self._python_ast_interpreter(
+                        code_input=tool_input, platform_params=self.platform_params
+                    )
+                out = self._get_worker_pool().run(
+                    tool_input, session_id=self._session_id(run_manager)
                 )
+                return self._local_output(tool_input, out)
 
         return CodeInterpreterToolOutput(
             tool=tool,
@@ -129,9 +170,14 @@ class CodeInterpreterAllToolExecutor(AllToolExecutor):
                 logger.warning(
                     f"Tool {self.name} sandbox is local!!!, this not safe, please use jupyter sandbox it"
                 )
-                return self._python_ast_interpreter(
-                    code_input=tool_input, platform_params=self.platform_params
+                if not self.use_worker_pool:
+                    return self._python_ast_interpreter(
+                        code_input=tool_input, platform_params=self.platform_params
+                    )
+                out = await self._get_worker_pool().arun(
+                    tool_input, session_id=self._session_id(run_manager)
                 )
+                return self._local_output(tool_input, out)
 
         return CodeInterpreterToolOutput(
             tool=tool,
@@ -161,6 +161,7 @@ class AdapterAllTool(BaseTool, Generic[E]):
                     "log": agent_action.log,
                     "outputs": agent_action.outputs,
                 },
+                run_manager=run_manager,
                 **tool_run_kwargs,
             )
         elif AdapterAllToolStructType.DRAWING_TOOL == agent_action.tool and isinstance(
@@ -207,6 +208,7 @@ class AdapterAllTool(BaseTool, Generic[E]):
                     "log": agent_action.log,
                     "outputs": agent_action.outputs,
                 },
+                run_manager=run_manager,
                 **tool_run_kwargs,
             )
 
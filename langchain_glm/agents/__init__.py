@@ -1,4 +1,6 @@
 # -*- coding: utf-8 -*-
+from langchain_glm.agents.tool_cache import ToolResultCache
+from langchain_glm.agents.tool_selector import ToolSelector
 from langchain_glm.agents.zhipuai_all_tools import ZhipuAIAllToolsRunnable
 
-__all__ = ["ZhipuAIAllToolsRunnable"]
+__all__ = ["ZhipuAIAllToolsRunnable", "ToolResultCache", "ToolSelector"]
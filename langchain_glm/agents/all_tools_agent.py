@@ -5,22 +5,34 @@ import asyncio
 import json
 import logging
 import time
+import weakref
 from abc import abstractmethod
+from contextlib import AsyncExitStack, nullcontext
 from pathlib import Path
 from typing import (
     Any,
+    AsyncIterator,
+    Awaitable,
     Dict,
     List,
     Optional,
+    Sequence,
     Tuple,
+    Union,
 )
 
-from langchain.agents.agent import Agent, AgentExecutor, AgentOutputParser
+from langchain.agents.agent import (
+    Agent,
+    AgentExecutor,
+    AgentOutputParser,
+    ExceptionTool,
+)
 from langchain.agents.output_parsers.tools import ToolAgentAction
 from langchain.agents.tools import InvalidTool
 from langchain.utilities.asyncio import asyncio_timeout
 from langchain_core.agents import AgentAction, AgentFinish, AgentStep
 from langchain_core.callbacks import (
+    AsyncCallbackManager,
     AsyncCallbackManagerForChainRun,
     AsyncCallbackManagerForToolRun,
     BaseCallbackManager,
@@ -28,6 +40,8 @@ from langchain_core.callbacks import (
     CallbackManagerForToolRun,
     Callbacks,
 )
+from langchain_core.exceptions import OutputParserException
+from langchain_core.pydantic_v1 import Field, PrivateAttr
 from langchain_core.tools import BaseTool
 from langchain_core.utils import get_color_mapping
 
@@ -40,11 +54,35 @@ from langchain_glm.agents.output_parsers.code_interpreter import (
 )
 from langchain_glm.agents.output_parsers.drawing_tool import DrawingToolAgentAction
 from langchain_glm.agents.output_parsers.web_browser import WebBrowserAgentAction
+from langchain_glm.agents.tool_cache import ToolResultCache, is_cacheable
+from langchain_glm.agents.tool_dispatch import EarlyToolDispatcher, await_dispatched
+from langchain_glm.utils.timing import timed
 
 logger = logging.getLogger(__name__)
 
 
 class ZhipuAiAllToolsAgentExecutor(AgentExecutor):
+    parallel_tool_calls: bool = True
+    """Run the tool calls of one model response concurrently, in order otherwise.
+    Observations are always returned in the order of the tool calls."""
+    max_concurrency: Optional[int] = None
+    """Tool calls running at the same time across all runs of this executor,
+    ``None`` for no limit."""
+    tool_concurrency: Dict[str, int] = Field(default_factory=dict)
+    """Per tool name limit of calls running at the same time."""
+    early_tool_dispatch: bool = False
+    """Start function tools as soon as their arguments are complete in the model
+    stream instead of after the whole response. Needs an agent built by
+    ``create_zhipuai_tools_agent``."""
+    tool_cache: Optional[ToolResultCache] = None
+    """Cache for the results of tools that declare ``{"cacheable": True}`` in
+    their metadata, shared by all runs of this executor."""
+
+    # event loop -> {tool name or None for the global limit: semaphore}
+    _semaphores: weakref.WeakKeyDictionary = PrivateAttr(
+        default_factory=weakref.WeakKeyDictionary
+    )
+
     def _call(
         self,
         inputs: Dict[str, str],
@@ -248,6 +286,215 @@ class ZhipuAiAllToolsAgentExecutor(AgentExecutor):
             )
         return AgentStep(action=agent_action, observation=observation)
 
+    def _get_semaphore(self, tool_name: Optional[str]) -> Optional[asyncio.Semaphore]:
+        """Semaphore of a tool, ``None`` for the global one.
+
+        Bound to the running loop.
+        """
+        limit = (
+            self.max_concurrency
+            if tool_name is None
+            else self.tool_concurrency.get(tool_name)
+        )
+        if limit is None:
+            return None
+        semaphores = self._semaphores.setdefault(asyncio.get_running_loop(), {})
+        if tool_name not in semaphores:
+            semaphores[tool_name] = asyncio.Semaphore(limit)
+        return semaphores[tool_name]
+
+    async def _alimited_perform_agent_action(
+        self,
+        name_to_tool_map: Dict[str, BaseTool],
+        color_mapping: Dict[str, str],
+        agent_action: AgentAction,
+        run_manager: Optional[AsyncCallbackManagerForChainRun] = None,
+    ) -> AgentStep:
+        async with AsyncExitStack() as stack:
+            # take the per tool slot first so a waiting call holds no global slot
+            for tool_name in (agent_action.tool, None):
+                semaphore = self._get_semaphore(tool_name)
+                if semaphore is not None:
+                    await stack.enter_async_context(semaphore)
+            return await self._aperform_agent_action(
+                name_to_tool_map, color_mapping, agent_action, run_manager
+            )
+
+    async def _aperform_agent_actions(
+        self,
+        name_to_tool_map: Dict[str, BaseTool],
+        color_mapping: Dict[str, str],
+        actions: Sequence[AgentAction],
+        run_manager: Optional[AsyncCallbackManagerForChainRun] = None,
+        dispatcher: Optional[EarlyToolDispatcher] = None,
+    ) -> List[AgentStep]:
+        """Run the actions of one step, the result keeps the order of ``actions``.
+
+        Actions already started by ``dispatcher`` are only awaited.
+        """
+
+        def perform(agent_action: AgentAction) -> Awaitable[AgentStep]:
+            task = dispatcher.pop(agent_action) if dispatcher else None
+            if task is not None:
+                return await_dispatched(task, agent_action)
+            return self._alimited_perform_agent_action(
+                name_to_tool_map, color_mapping, agent_action, run_manager
+            )
+
+        if not self.parallel_tool_calls or len(actions) == 1:
+            return [await perform(agent_action) for agent_action in actions]
+        return list(
+            await asyncio.gather(*[perform(agent_action) for agent_action in actions])
+        )
+
+    async def _aiter_next_step(
+        self,
+        name_to_tool_map: Dict[str, BaseTool],
+        color_mapping: Dict[str, str],
+        inputs: Dict[str, str],
+        intermediate_steps: List[Tuple[AgentAction, str]],
+        run_manager: Optional[AsyncCallbackManagerForChainRun] = None,
+    ) -> AsyncIterator[Union[AgentFinish, AgentAction, AgentStep]]:
+        """Take a single step in the thought-action-observation loop.
+
+        Same as ``AgentExecutor._aiter_next_step`` except that the actions
+        are run by :meth:`_aperform_agent_actions`, and with
+        ``early_tool_dispatch`` tools start while the model is streaming.
+        """
+        dispatcher = None
+        if self.early_tool_dispatch:
+            dispatcher = EarlyToolDispatcher(
+                self, name_to_tool_map, color_mapping, run_manager
+            )
+        try:
+            intermediate_steps = self._prepare_intermediate_steps(intermediate_steps)
+
+            # Call the LLM to see what to do.
+            with dispatcher or nullcontext(), timed("plan"):
+                output = await self._action_agent.aplan(
+                    intermediate_steps,
+                    callbacks=run_manager.get_child() if run_manager else None,
+                    **inputs,
+                )
+        except OutputParserException as e:
+            if dispatcher is not None:
+                await dispatcher.aclose()
+            if isinstance(self.handle_parsing_errors, bool):
+                raise_error = not self.handle_parsing_errors
+            else:
+                raise_error = False
+            if raise_error:
+                raise ValueError(
+                    "An output parsing error occurred. "
+                    "In order to pass this error back to the agent and have it try "
+                    "again, pass `handle_parsing_errors=True` to the AgentExecutor. "
+                    f"This is the error: {str(e)}"
+                )
+            text = str(e)
+            if isinstance(self.handle_parsing_errors, bool):
+                if e.send_to_llm:
+                    observation = str(e.observation)
+                    text = str(e.llm_output)
+                else:
+                    observation = "Invalid or incomplete response"
+            elif isinstance(self.handle_parsing_errors, str):
+                observation = self.handle_parsing_errors
+            elif callable(self.handle_parsing_errors):
+                observation = self.handle_parsing_errors(e)
+            else:
+                raise ValueError("Got unexpected type of `handle_parsing_errors`")
+            output = AgentAction("_Exception", observation, text)
+            tool_run_kwargs = self._action_agent.tool_run_logging_kwargs()
+            observation = await ExceptionTool().arun(
+                output.tool_input,
+                verbose=self.verbose,
+                color=None,
+                callbacks=run_manager.get_child() if run_manager else None,
+                **tool_run_kwargs,
+            )
+            yield AgentStep(action=output, observation=observation)
+            return
+
+        except BaseException:
+            if dispatcher is not None:
+                await dispatcher.aclose()
+            raise
+
+        # If the tool chosen is the finishing tool, then we end and return.
+        if isinstance(output, AgentFinish):
+            if dispatcher is not None:
+                await dispatcher.aclose()
+            yield output
+            return
+
+        actions: List[AgentAction]
+        if isinstance(output, AgentAction):
+            actions = [output]
+        else:
+            actions = output
+        for agent_action in actions:
+            yield agent_action
+
+        try:
+            with timed("tools"):
+                steps = await self._aperform_agent_actions(
+                    name_to_tool_map, color_mapping, actions, run_manager, dispatcher
+                )
+        finally:
+            if dispatcher is not None:
+                await dispatcher.aclose()
+        for step in steps:
+            yield step
+
+    async def _acached_tool_run(
+        self,
+        tool: BaseTool,
+        agent_action: AgentAction,
+        color: str,
+        tool_run_kwargs: Dict[str, Any],
+        run_manager: Optional[AsyncCallbackManagerForChainRun] = None,
+    ) -> Any:
+        callbacks = run_manager.get_child() if run_manager else None
+
+        async def run() -> Any:
+            return await tool.arun(
+                agent_action.tool_input,
+                verbose=self.verbose,
+                color=color,
+                callbacks=callbacks,
+                **tool_run_kwargs,
+            )
+
+        cached, observation = await self.tool_cache.aget_or_run(
+            self.tool_cache.make_key(tool.name, agent_action.tool_input),
+            self.tool_cache.ttl_of(tool),
+            run,
+        )
+        if cached:
+            # report the cached call like a real one so consumers see the tool
+            callback_manager = AsyncCallbackManager.configure(
+                callbacks,
+                None,
+                self.verbose,
+                tool.tags,
+                None,
+                tool.metadata,
+                {"cache_hit": True},
+            )
+            tool_input = agent_action.tool_input
+            tool_run_manager = await callback_manager.on_tool_start(
+                {"name": tool.name, "description": tool.description},
+                tool_input if isinstance(tool_input, str) else str(tool_input),
+                color=color,
+                name=tool.name,
+                inputs=tool_input if isinstance(tool_input, dict) else None,
+                **tool_run_kwargs,
+            )
+            await tool_run_manager.on_tool_end(
+                observation, color=color, name=tool.name, **tool_run_kwargs
+            )
+        return observation
+
     async def _aperform_agent_action(
         self,
         name_to_tool_map: Dict[str, BaseTool],
@@ -281,6 +528,10 @@ class ZhipuAiAllToolsAgentExecutor(AgentExecutor):
                     callbacks=run_manager.get_child() if run_manager else None,
                     **tool_run_kwargs,
                 )
+            elif self.tool_cache is not None and is_cacheable(tool):
+                observation = await self._acached_tool_run(
+                    tool, agent_action, color, tool_run_kwargs, run_manager
+                )
             else:
                 observation = await tool.arun(
                     agent_action.tool_input,
@@ -1,22 +1,71 @@
 # -*- coding: utf-8 -*-
-from typing import Sequence
+from typing import Any, AsyncIterator, Iterator, Optional, Sequence
 
+from langchain_core.agents import AgentFinish
 from langchain_core.language_models import BaseLanguageModel
 from langchain_core.prompts.chat import ChatPromptTemplate
-from langchain_core.runnables import Runnable, RunnablePassthrough
-from langchain_core.runnables.base import RunnableBindingBase
+from langchain_core.runnables import Runnable, RunnableConfig, RunnablePassthrough
+from langchain_core.runnables.base import RunnableBinding, RunnableBindingBase
 from langchain_core.tools import BaseTool
 from langchain_core.utils.function_calling import convert_to_openai_tool
 
 from langchain_glm.agents.format_scratchpad.all_tools import (
-    format_to_zhipuai_all_tool_messages,
+    ZhipuAIAllToolsScratchpad,
 )
 from langchain_glm.agents.output_parsers import ZhipuAiALLToolsAgentOutputParser
+from langchain_glm.agents.tool_dispatch import tap_tool_call_chunks
+from langchain_glm.agents.tool_selector import ToolSelector
+from langchain_glm.utils.timing import TimedRunnable, timed
+
+
+class _ReleaseScratchpad(RunnableBinding):
+    """Drops the scratchpad messages of a run once the agent finishes it,
+    without adding a run of its own to the trace."""
+
+    scratchpad: ZhipuAIAllToolsScratchpad
+
+    def __init__(self, bound: Any, scratchpad: ZhipuAIAllToolsScratchpad, **kwargs):
+        super().__init__(bound=bound, scratchpad=scratchpad, **kwargs)
+
+    def _release(self, input: Any, output: Any) -> None:
+        if isinstance(output, AgentFinish):
+            self.scratchpad.release(input["intermediate_steps"])
+
+    def invoke(
+        self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any
+    ) -> Any:
+        output = super().invoke(input, config, **kwargs)
+        self._release(input, output)
+        return output
+
+    async def ainvoke(
+        self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any
+    ) -> Any:
+        output = await super().ainvoke(input, config, **kwargs)
+        self._release(input, output)
+        return output
+
+    def stream(
+        self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any
+    ) -> Iterator[Any]:
+        output = None
+        for output in super().stream(input, config, **kwargs):
+            yield output
+        self._release(input, output)
+
+    async def astream(
+        self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any
+    ) -> AsyncIterator[Any]:
+        output = None
+        async for output in super().astream(input, config, **kwargs):
+            yield output
+        self._release(input, output)
 
 
 def create_zhipuai_tools_agent(
     prompt: ChatPromptTemplate,
     llm_with_all_tools: RunnableBindingBase = None,
+    tool_selector: Optional[ToolSelector] = None,
 ) -> Runnable:
     """Create an agent that uses OpenAI tools.
 
@@ -26,6 +75,8 @@ def create_zhipuai_tools_agent(
         llm_with_all_tools: Optional. If provided, this will be used as the LLM with all
             tools bound to it. If not provided, the tools will be bound to the LLM
             provided.
+        tool_selector: Optional. If provided, every turn binds only the tools it
+            selects for the user input instead of all of them.
 
     Returns:
         A Runnable sequence representing an agent. It takes as input all the same input
@@ -90,15 +141,22 @@ def create_zhipuai_tools_agent(
     if missing_vars:
         raise ValueError(f"Prompt missing required variables: {missing_vars}")
 
+    llm: Runnable = llm_with_all_tools
+    if tool_selector is not None:
+        llm = tool_selector.bind(llm_with_all_tools)
+
+    scratchpad = ZhipuAIAllToolsScratchpad()
+
+    def format_scratchpad(x: dict) -> list:
+        with timed("prompt"):
+            return scratchpad(x["intermediate_steps"])
+
     agent = (
-        RunnablePassthrough.assign(
-            agent_scratchpad=lambda x: format_to_zhipuai_all_tool_messages(
-                x["intermediate_steps"]
-            )
-        )
-        | prompt
-        | llm_with_all_tools
+        RunnablePassthrough.assign(agent_scratchpad=format_scratchpad)
+        | TimedRunnable(prompt, "prompt")
+        | llm
+        | tap_tool_call_chunks
         | ZhipuAiALLToolsAgentOutputParser()
     )
 
-    return agent
+    return _ReleaseScratchpad(agent, scratchpad)
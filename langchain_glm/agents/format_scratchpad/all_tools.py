@@ -1,6 +1,8 @@
 # -*- coding: utf-8 -*-
 import json
-from typing import List, Sequence, Tuple, Union
+import threading
+from collections import OrderedDict
+from typing import Hashable, List, Sequence, Set, Tuple, Union
 
 from langchain.agents.output_parsers.tools import ToolAgentAction
 from langchain_core.agents import AgentAction
@@ -49,6 +51,91 @@ def _create_tool_message(
     )
 
 
+def _format_step(
+    agent_action: AgentAction, observation: Union[str, BaseToolOutput]
+) -> List[BaseMessage]:
+    """Messages of a single (AgentAction, tool output) step."""
+    if isinstance(agent_action, CodeInterpreterAgentAction):
+        if isinstance(observation, CodeInterpreterToolOutput):
+            if "auto" == observation.platform_params.get("sandbox", "auto"):
+                return [
+                    AIMessage(content=str(observation.code_input)),
+                    _create_tool_message(agent_action, observation),
+                ]
+            elif "none" == observation.platform_params.get("sandbox", "auto"):
+                return [
+                    AIMessage(content=str(observation.code_input)),
+                    _create_tool_message(agent_action, observation.code_output),
+                ]
+            else:
+                sandbox = observation.platform_params.get("sandbox", "auto")
+                raise ValueError(f"Unknown sandbox type: {sandbox}")
+        else:
+            raise ValueError(f"Unknown observation type: {type(observation)}")
+
+    elif isinstance(agent_action, DrawingToolAgentAction):
+        if isinstance(observation, DrawingToolOutput):
+            return [AIMessage(content=str(observation))]
+        else:
+            raise ValueError(f"Unknown observation type: {type(observation)}")
+
+    elif isinstance(agent_action, WebBrowserAgentAction):
+        if isinstance(observation, WebBrowserToolOutput):
+            return [AIMessage(content=str(observation))]
+        else:
+            raise ValueError(f"Unknown observation type: {type(observation)}")
+
+    elif isinstance(agent_action, ToolAgentAction):
+        ai_msgs = AIMessage(
+            content=f"arguments='{agent_action.tool_input}', name='{agent_action.tool}'"
+        )
+        return [ai_msgs, _create_tool_message(agent_action, observation)]
+    else:
+        # plain actions are never deduplicated
+        return [AIMessage(content=agent_action.log)]
+
+
+def _message_key(message: BaseMessage) -> Hashable:
+    content = message.content
+    if not isinstance(content, str):
+        content = json.dumps(content, ensure_ascii=False, sort_keys=True)
+    return (
+        message.type,
+        content,
+        getattr(message, "tool_call_id", None),
+        message.additional_kwargs.get("name"),
+    )
+
+
+_DEDUPED_ACTIONS = (
+    CodeInterpreterAgentAction,
+    DrawingToolAgentAction,
+    WebBrowserAgentAction,
+    ToolAgentAction,
+)
+
+
+class _ScratchpadState:
+    __slots__ = ("steps", "messages", "keys")
+
+    def __init__(self) -> None:
+        self.steps: List[Tuple[AgentAction, BaseToolOutput]] = []
+        self.messages: List[BaseMessage] = []
+        self.keys: Set[Hashable] = set()
+
+    def extend(self, steps: Sequence[Tuple[AgentAction, BaseToolOutput]]) -> None:
+        for step in steps:
+            agent_action, observation = step
+            dedupe = isinstance(agent_action, _DEDUPED_ACTIONS)
+            for new in _format_step(agent_action, observation):
+                key = _message_key(new)
+                if dedupe and key in self.keys:
+                    continue
+                self.keys.add(key)
+                self.messages.append(new)
+            self.steps.append(step)
+
+
 def format_to_zhipuai_all_tool_messages(
     intermediate_steps: Sequence[Tuple[AgentAction, BaseToolOutput]],
 ) -> List[BaseMessage]:
@@ -61,55 +148,59 @@ def format_to_zhipuai_all_tool_messages(
         list of messages to send to the LLM for the next prediction
 
     """
-    messages = []
-    for agent_action, observation in intermediate_steps:
-        if isinstance(agent_action, CodeInterpreterAgentAction):
-            if isinstance(observation, CodeInterpreterToolOutput):
-                if "auto" == observation.platform_params.get("sandbox", "auto"):
-                    new_messages = [
-                        AIMessage(content=str(observation.code_input)),
-                        _create_tool_message(agent_action, observation),
-                    ]
-
-                    messages.extend(
-                        [new for new in new_messages if new not in messages]
-                    )
-                elif "none" == observation.platform_params.get("sandbox", "auto"):
-                    new_messages = [
-                        AIMessage(content=str(observation.code_input)),
-                        _create_tool_message(agent_action, observation.code_output),
-                    ]
-
-                    messages.extend(
-                        [new for new in new_messages if new not in messages]
-                    )
-                else:
-                    raise ValueError(
-                        f"Unknown sandbox type: {observation.platform_params.get('sandbox', 'auto')}"
-                    )
-            else:
-                raise ValueError(f"Unknown observation type: {type(observation)}")
+    state = _ScratchpadState()
+    state.extend(intermediate_steps)
+    return state.messages
 
-        elif isinstance(agent_action, DrawingToolAgentAction):
-            if isinstance(observation, DrawingToolOutput):
-                new_messages = [AIMessage(content=str(observation))]
-                messages.extend([new for new in new_messages if new not in messages])
-            else:
-                raise ValueError(f"Unknown observation type: {type(observation)}")
 
-        elif isinstance(agent_action, WebBrowserAgentAction):
-            if isinstance(observation, WebBrowserToolOutput):
-                new_messages = [AIMessage(content=str(observation))]
-                messages.extend([new for new in new_messages if new not in messages])
-            else:
-                raise ValueError(f"Unknown observation type: {type(observation)}")
-
-        elif isinstance(agent_action, ToolAgentAction):
-            ai_msgs = AIMessage(
-                content=f"arguments='{agent_action.tool_input}', name='{agent_action.tool}'"
-            )
-            new_messages = [ai_msgs, _create_tool_message(agent_action, observation)]
-            messages.extend([new for new in new_messages if new not in messages])
-        else:
-            messages.append(AIMessage(content=agent_action.log))
-    return messages
+class ZhipuAIAllToolsScratchpad:
+    """Incremental version of :func:`format_to_zhipuai_all_tool_messages`.
+
+    The executor appends to the same ``intermediate_steps`` list on every
+    iteration of a run, so the messages formatted for the steps seen before
+    are kept and only the new steps are formatted and deduplicated. One
+    instance serves concurrent runs, each run is recognised by its first step.
+    A run's messages are dropped by :meth:`release` when it finishes.
+    """
+
+    def __init__(self, max_runs: int = 256):
+        """
+        Args:
+            max_runs: How many runs keep their formatted messages cached, it
+                bounds the memory of runs that are never released.
+        """
+        self.max_runs = max_runs
+        self._states: "OrderedDict[int, _ScratchpadState]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __call__(
+        self, intermediate_steps: Sequence[Tuple[AgentAction, BaseToolOutput]]
+    ) -> List[BaseMessage]:
+        if not intermediate_steps:
+            return []
+        run_key = id(intermediate_steps[0])
+        with self._lock:
+            state = self._states.pop(run_key, None)
+        if (
+            state is None
+            or len(state.steps) > len(intermediate_steps)
+            or any(a is not b for a, b in zip(state.steps, intermediate_steps))
+        ):
+            state = _ScratchpadState()
+        state.extend(intermediate_steps[len(state.steps) :])
+        with self._lock:
+            self._states[run_key] = state
+            while len(self._states) > self.max_runs:
+                self._states.popitem(last=False)
+        return list(state.messages)
+
+    def __len__(self) -> int:
+        return len(self._states)
+
+    def release(
+        self, intermediate_steps: Sequence[Tuple[AgentAction, BaseToolOutput]]
+    ) -> None:
+        """Drop the messages of the run of ``intermediate_steps``."""
+        if intermediate_steps:
+            with self._lock:
+                self._states.pop(id(intermediate_steps[0]), None)
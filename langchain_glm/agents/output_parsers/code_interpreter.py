@@ -1,4 +1,5 @@
 # -*- coding: utf-8 -*-
+import copy
 import json
 import logging
 from collections import deque
@@ -12,9 +13,6 @@ from langchain_core.messages import (
     BaseMessage,
     ToolCall,
 )
-from langchain_core.utils.json import (
-    parse_partial_json,
-)
 from zhipuai.core import BaseModel
 
 from langchain_glm.agent_toolkits.all_tools.struct_type import (
@@ -28,6 +26,7 @@ from langchain_glm.agents.output_parsers.base import (
     AllToolsMessageToolCall,
     AllToolsMessageToolCallChunk,
 )
+from langchain_glm.utils.partial_json import cached_parse_partial_json
 
 logger = logging.getLogger(__name__)
 
@@ -48,7 +47,7 @@ def _best_effort_parse_code_interpreter_tool_calls(
     for code_interpreter in tool_call_chunks:
         if AdapterAllToolStructType.CODE_INTERPRETER == code_interpreter["name"]:
             if isinstance(code_interpreter["args"], str):
-                args_ = parse_partial_json(code_interpreter["args"])
+                args_ = cached_parse_partial_json(code_interpreter["args"])
             else:
                 args_ = code_interpreter["args"]
             if not isinstance(args_, dict):
@@ -120,7 +119,7 @@ def _paser_code_interpreter_chunk_input(
             code_interpreter_action = CodeInterpreterAgentAction(
                 tool=AdapterAllToolStructType.CODE_INTERPRETER,
                 tool_input=action,
-                outputs=outputs[i],
+                outputs=copy.deepcopy(outputs[i]),
                 log=log,
                 message_log=[message],
                 tool_call_id=tool_call_id,
@@ -1,4 +1,5 @@
 # -*- coding: utf-8 -*-
+import copy
 import json
 import logging
 from collections import deque
@@ -13,9 +14,6 @@ from langchain_core.messages import (
     BaseMessage,
     ToolCall,
 )
-from langchain_core.utils.json import (
-    parse_partial_json,
-)
 from zhipuai.core import BaseModel
 
 from langchain_glm.agent_toolkits.all_tools.struct_type import (
@@ -30,6 +28,7 @@ from langchain_glm.agents.output_parsers.base import (
     AllToolsMessageToolCallChunk,
 )
 from langchain_glm.chat_models.all_tools_message import ALLToolsMessageChunk
+from langchain_glm.utils.partial_json import cached_parse_partial_json
 
 logger = logging.getLogger(__name__)
 
@@ -50,7 +49,7 @@ def _best_effort_parse_drawing_tool_tool_calls(
     for drawing_tool in tool_call_chunks:
         if AdapterAllToolStructType.DRAWING_TOOL == drawing_tool["name"]:
             if isinstance(drawing_tool["args"], str):
-                args_ = parse_partial_json(drawing_tool["args"])
+                args_ = cached_parse_partial_json(drawing_tool["args"])
             else:
                 args_ = drawing_tool["args"]
             if not isinstance(args_, dict):
@@ -124,7 +123,7 @@ def _paser_drawing_tool_chunk_input(
             drawing_tool_action = DrawingToolAgentAction(
                 tool=AdapterAllToolStructType.DRAWING_TOOL,
                 tool_input=action,
-                outputs=outputs[i],
+                outputs=copy.deepcopy(outputs[i]),
                 log=log,
                 message_log=[message],
                 tool_call_id=tool_call_id,
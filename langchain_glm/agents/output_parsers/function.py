@@ -1,4 +1,5 @@
 # -*- coding: utf-8 -*-
+import copy
 import json
 import logging
 from collections import deque
@@ -11,7 +12,6 @@ from langchain_core.messages import (
     BaseMessage,
     ToolCall,
 )
-from langchain_core.utils.json import parse_partial_json
 
 from langchain_glm.agent_toolkits.all_tools.struct_type import AdapterAllToolStructType
 from langchain_glm.agents.output_parsers._utils import (
@@ -22,6 +22,7 @@ from langchain_glm.agents.output_parsers.base import (
     AllToolsMessageToolCall,
     AllToolsMessageToolCallChunk,
 )
+from langchain_glm.utils.partial_json import cached_parse_partial_json
 
 logger = logging.getLogger(__name__)
 
@@ -36,7 +37,7 @@ def _best_effort_parse_function_tool_calls(
     for function in tool_call_chunks:
         if function["name"] not in AdapterAllToolStructType.__members__.values():
             if isinstance(function["args"], str):
-                args_ = parse_partial_json(function["args"])
+                args_ = cached_parse_partial_json(function["args"])
             else:
                 args_ = function["args"]
             if not isinstance(args_, dict):
@@ -87,7 +88,7 @@ def _paser_function_chunk_input(
                 function_action_result_stack.append(
                     ToolAgentAction(
                         tool=function_name,
-                        tool_input=tool_input,
+                        tool_input=copy.deepcopy(tool_input),
                         log=log,
                         message_log=[message],
                         tool_call_id=tool_call_id,
@@ -3,7 +3,7 @@ import json
 import logging
 from collections import deque
 from json import JSONDecodeError
-from typing import Any, Deque, Dict, List, Union
+from typing import Any, Deque, Dict, List, Tuple, Union
 
 from langchain_core.agents import AgentAction, AgentActionMessageLog, AgentFinish
 from langchain_core.exceptions import OutputParserException
@@ -13,9 +13,6 @@ from langchain_core.messages import (
     ToolCall,
     ToolCallChunk,
 )
-from langchain_core.utils.json import (
-    parse_partial_json,
-)
 from zhipuai.core import BaseModel
 
 from langchain_glm.agent_toolkits.all_tools.struct_type import (
@@ -26,11 +23,9 @@ from langchain_glm.agents.output_parsers.base import (
     AllToolsMessageToolCallChunk,
 )
 from langchain_glm.agents.output_parsers.code_interpreter import (
-    _best_effort_parse_code_interpreter_tool_calls,
     _paser_code_interpreter_chunk_input,
 )
 from langchain_glm.agents.output_parsers.drawing_tool import (
-    _best_effort_parse_drawing_tool_tool_calls,
     _paser_drawing_tool_chunk_input,
 )
 from langchain_glm.agents.output_parsers.function import (
@@ -38,10 +33,10 @@ from langchain_glm.agents.output_parsers.function import (
     _paser_function_chunk_input,
 )
 from langchain_glm.agents.output_parsers.web_browser import (
-    _best_effort_parse_web_browser_tool_calls,
     _paser_web_browser_chunk_input,
 )
 from langchain_glm.chat_models.all_tools_message import ALLToolsMessageChunk
+from langchain_glm.utils.partial_json import cached_parse_partial_json
 
 logger = logging.getLogger(__name__)
 
@@ -109,52 +104,39 @@ def parse_ai_message_to_tool_action(
     web_browser_action_result_stack: deque = deque()
     drawing_tool_result_stack: deque = deque()
     function_tool_result_stack: deque = deque()
-    code_interpreter_chunk: List[
-        Union[AllToolsMessageToolCall, AllToolsMessageToolCallChunk]
-    ] = []
+
+    # the args of every chunk are parsed once, for all tool types and the
+    # positions of the calls
+    built_in_chunks: Dict[str, List] = {}
+    call_chunks: List[str] = []
     if message.tool_calls:
         if isinstance(message, ALLToolsMessageChunk):
-            code_interpreter_chunk = _best_effort_parse_code_interpreter_tool_calls(
+            built_in_chunks, call_chunks = _classify_tool_call_chunks(
                 message.tool_call_chunks
             )
     else:
-        code_interpreter_chunk = _best_effort_parse_code_interpreter_tool_calls(
-            tool_calls
-        )
+        built_in_chunks, _ = _classify_tool_call_chunks(tool_calls)
+        if isinstance(message, ALLToolsMessageChunk):
+            _, call_chunks = _classify_tool_call_chunks(
+                message.tool_call_chunks, positions_only=True
+            )
 
-    if code_interpreter_chunk and len(code_interpreter_chunk) > 1:
+    code_interpreter_chunk = built_in_chunks.get(
+        AdapterAllToolStructType.CODE_INTERPRETER, []
+    )
+    if len(code_interpreter_chunk) > 1:
         code_interpreter_action_result_stack = _paser_code_interpreter_chunk_input(
             message, code_interpreter_chunk
         )
 
-    drawing_tool_chunk: List[
-        Union[AllToolsMessageToolCall, AllToolsMessageToolCallChunk]
-    ] = []
-    if message.tool_calls:
-        if isinstance(message, ALLToolsMessageChunk):
-            drawing_tool_chunk = _best_effort_parse_drawing_tool_tool_calls(
-                message.tool_call_chunks
-            )
-    else:
-        drawing_tool_chunk = _best_effort_parse_drawing_tool_tool_calls(tool_calls)
-
-    if drawing_tool_chunk and len(drawing_tool_chunk) > 1:
+    drawing_tool_chunk = built_in_chunks.get(AdapterAllToolStructType.DRAWING_TOOL, [])
+    if len(drawing_tool_chunk) > 1:
         drawing_tool_result_stack = _paser_drawing_tool_chunk_input(
             message, drawing_tool_chunk
         )
 
-    web_browser_chunk: List[
-        Union[AllToolsMessageToolCall, AllToolsMessageToolCallChunk]
-    ] = []
-    if message.tool_calls:
-        if isinstance(message, ALLToolsMessageChunk):
-            web_browser_chunk = _best_effort_parse_web_browser_tool_calls(
-                message.tool_call_chunks
-            )
-    else:
-        web_browser_chunk = _best_effort_parse_web_browser_tool_calls(tool_calls)
-
-    if web_browser_chunk and len(web_browser_chunk) > 1:
+    web_browser_chunk = built_in_chunks.get(AdapterAllToolStructType.WEB_BROWSER, [])
+    if len(web_browser_chunk) > 1:
         web_browser_action_result_stack = _paser_web_browser_chunk_input(
             message, web_browser_chunk
         )
@@ -168,8 +150,6 @@ def parse_ai_message_to_tool_action(
     )
 
     if isinstance(message, ALLToolsMessageChunk):
-        call_chunks = _paser_object_positions(message.tool_call_chunks)
-
         for too_call_name in call_chunks:
             if too_call_name == AdapterAllToolStructType.CODE_INTERPRETER:
                 actions.append(code_interpreter_action_result_stack.popleft())
@@ -193,31 +173,66 @@ def parse_ai_message_to_tool_action(
     return actions
 
 
-def _paser_object_positions(tool_call_chunks: List[ToolCallChunk]):
-    call_chunks = []
+def _classify_tool_call_chunks(
+    tool_call_chunks: List[ToolCallChunk], positions_only: bool = False
+) -> Tuple[
+    Dict[str, List[Union[AllToolsMessageToolCall, AllToolsMessageToolCallChunk]]],
+    List[str],
+]:
+    """Sort the platform tool calls by type and find the position of every call.
+
+    Walks the chunks once and parses the args of every platform tool chunk a
+    single time. Returns the calls grouped by platform tool name and the tool
+    name of every call in order, a run of chunks of one function call is one
+    call. Function calls are left to ``_best_effort_parse_function_tool_calls``.
+    """
+    built_in_chunks: Dict[
+        str, List[Union[AllToolsMessageToolCall, AllToolsMessageToolCallChunk]]
+    ] = {}
+    call_chunks: List[str] = []
     last_name = None
     if not tool_call_chunks:
-        return call_chunks
+        return built_in_chunks, call_chunks
+    built_in_names = AdapterAllToolStructType.__members__.values()
     for call_chunk in tool_call_chunks:
-        if call_chunk["name"] in AdapterAllToolStructType.__members__.values():
+        name = call_chunk["name"]
+        if name in built_in_names:
             if isinstance(call_chunk["args"], str):
-                args_ = parse_partial_json(call_chunk["args"])
+                args_ = cached_parse_partial_json(call_chunk["args"])
             else:
                 args_ = call_chunk["args"]
             if not isinstance(args_, dict):
                 raise ValueError("Malformed args.")
 
             if "outputs" in args_:
-                call_chunks.append(call_chunk["name"])
-                last_name = call_chunk["name"]
+                call_chunks.append(name)
+                last_name = name
+                if not positions_only:
+                    built_in_chunks.setdefault(name, []).append(
+                        AllToolsMessageToolCall(
+                            name=name, args=args_, id=call_chunk["id"]
+                        )
+                    )
+            elif not positions_only:
+                built_in_chunks.setdefault(name, []).append(
+                    AllToolsMessageToolCallChunk(
+                        name=name,
+                        args=args_,
+                        id=call_chunk["id"],
+                        index=call_chunk.get("index"),
+                    )
+                )
 
-        else:
-            if call_chunk["name"] != last_name:
-                call_chunks.append(call_chunk["name"])
-                last_name = call_chunk["name"]
+        elif name != last_name:
+            call_chunks.append(name)
+            last_name = name
 
     if len(call_chunks) == 0:
         call_chunks.append(tool_call_chunks[-1]["name"])
     elif tool_call_chunks[-1]["name"] != call_chunks[-1]:
         call_chunks.append(tool_call_chunks[-1]["name"])
-    return call_chunks
+    return built_in_chunks, call_chunks
+
+
+def _paser_object_positions(tool_call_chunks: List[ToolCallChunk]):
+    return _classify_tool_call_chunks(tool_call_chunks, positions_only=True)[1]
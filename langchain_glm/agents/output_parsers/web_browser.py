@@ -1,4 +1,5 @@
 # -*- coding: utf-8 -*-
+import copy
 import json
 import logging
 from collections import deque
@@ -13,9 +14,6 @@ from langchain_core.messages import (
     BaseMessage,
     ToolCall,
 )
-from langchain_core.utils.json import (
-    parse_partial_json,
-)
 from zhipuai.core import BaseModel
 
 from langchain_glm.agent_toolkits.all_tools.struct_type import (
@@ -30,6 +28,7 @@ from langchain_glm.agents.output_parsers.base import (
     AllToolsMessageToolCallChunk,
 )
 from langchain_glm.chat_models.all_tools_message import ALLToolsMessageChunk
+from langchain_glm.utils.partial_json import cached_parse_partial_json
 
 logger = logging.getLogger(__name__)
 
@@ -50,7 +49,7 @@ def _best_effort_parse_web_browser_tool_calls(
     for web_browser in tool_call_chunks:
         if AdapterAllToolStructType.WEB_BROWSER == web_browser["name"]:
             if isinstance(web_browser["args"], str):
-                args_ = parse_partial_json(web_browser["args"])
+                args_ = cached_parse_partial_json(web_browser["args"])
             else:
                 args_ = web_browser["args"]
             if not isinstance(args_, dict):
@@ -122,7 +121,7 @@ def _paser_web_browser_chunk_input(
             web_browser_action = WebBrowserAgentAction(
                 tool=AdapterAllToolStructType.WEB_BROWSER,
                 tool_input=action,
-                outputs=outputs[i],
+                outputs=copy.deepcopy(outputs[i]),
                 log=log,
                 message_log=[message],
                 tool_call_id=tool_call_id,
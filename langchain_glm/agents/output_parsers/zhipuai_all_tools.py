@@ -15,6 +15,7 @@ from langchain_glm.agents.output_parsers.tools import (
     parse_ai_message_to_tool_action,
 )
 from langchain_glm.agents.output_parsers.web_browser import WebBrowserAgentAction
+from langchain_glm.utils.timing import timed
 
 ZhipuAiALLToolAgentAction = ToolAgentAction
 
@@ -71,7 +72,8 @@ class ZhipuAiALLToolsAgentOutputParser(MultiActionAgentOutputParser):
         if not isinstance(result[0], ChatGeneration):
             raise ValueError("This output parser only works on ChatGeneration output")
         message = result[0].message
-        return parse_ai_message_to_zhipuai_all_tool_action(message)
+        with timed("output_parse"):
+            return parse_ai_message_to_zhipuai_all_tool_action(message)
 
     def parse(self, text: str) -> Union[List[AgentAction], AgentFinish]:
         raise ValueError("Can only parse messages")
@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+"""Memoize the results of deterministic tools across turns and sessions."""
+import asyncio
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple, Union
+
+from langchain_core.tools import BaseTool
+
+logger = logging.getLogger(__name__)
+
+CACHEABLE = "cacheable"
+"""``BaseTool.metadata`` key, a truthy value makes the tool results cacheable."""
+CACHE_TTL = "cache_ttl"
+"""``BaseTool.metadata`` key, seconds a result of the tool stays valid."""
+
+
+def is_cacheable(tool: BaseTool) -> bool:
+    return bool(tool.metadata and tool.metadata.get(CACHEABLE))
+
+
+def _normalize(tool_input: Union[str, Dict]) -> Any:
+    if isinstance(tool_input, str):
+        tool_input = tool_input.strip()
+        try:
+            return json.loads(tool_input)
+        except ValueError:
+            return tool_input
+    return tool_input
+
+
+class ToolResultCache:
+    """Size bounded LRU of tool observations with a TTL per entry.
+
+    Identical calls running at the same time on one event loop are collapsed
+    into a single tool run (single-flight), the other callers wait for its
+    result. Failed runs are not cached.
+    """
+
+    def __init__(self, max_size: int = 1024, default_ttl: Optional[float] = 300):
+        """
+        Args:
+            max_size: Number of observations kept.
+            default_ttl: Seconds an observation stays valid when the tool does
+                not declare ``cache_ttl``, ``None`` keeps it until evicted.
+        """
+        self.max_size = max_size
+        self.default_ttl = default_ttl
+        self._entries: "OrderedDict[str, Tuple[Any, Optional[float]]]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(tool_name: str, tool_input: Union[str, Dict]) -> str:
+        return json.dumps(
+            [tool_name, _normalize(tool_input)],
+            ensure_ascii=False,
+            sort_keys=True,
+            separators=(",", ":"),
+            default=str,
+        )
+
+    def ttl_of(self, tool: BaseTool) -> Optional[float]:
+        if tool.metadata and CACHE_TTL in tool.metadata:
+            return tool.metadata[CACHE_TTL]
+        return self.default_ttl
+
+    def get(self, key: str) -> Tuple[bool, Any]:
+        """Return ``(found, observation)``."""
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                return False, None
+            observation, expires_at = item
+            if expires_at is not None and expires_at < time.monotonic():
+                del self._entries[key]
+                return False, None
+            self._entries.move_to_end(key)
+            return True, observation
+
+    def set(self, key: str, observation: Any, ttl: Optional[float] = None) -> None:
+        expires_at = None if ttl is None else time.monotonic() + ttl
+        with self._lock:
+            self._entries[key] = (observation, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    async def aget_or_run(
+        self,
+        key: str,
+        ttl: Optional[float],
+        run: Callable[[], Awaitable[Any]],
+    ) -> Tuple[bool, Any]:
+        """Return ``(cached, observation)``, calling ``run`` on a miss.
+
+        ``cached`` is ``False`` only for the caller that actually ran the tool.
+        """
+        found, observation = self.get(key)
+        if found:
+            self.hits += 1
+            logger.debug(f"tool cache hit {key}")
+            return True, observation
+
+        loop = asyncio.get_running_loop()
+        inflight = self._inflight.get(key)
+        if inflight is not None and inflight.get_loop() is loop:
+            try:
+                observation = await asyncio.shield(inflight)
+                self.hits += 1
+                logger.debug(f"tool cache hit on the running call {key}")
+                return True, observation
+            except asyncio.CancelledError:
+                if not inflight.cancelled():
+                    raise
+                # the leading call was cancelled, run the tool ourselves
+
+        self.misses += 1
+        logger.debug(f"tool cache miss {key}")
+        future = loop.create_future()
+        self._inflight[key] = future
+        try:
+            observation = await run()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # nobody may be waiting, do not warn about a lost exception
+            future.exception()
+            raise
+        else:
+            self.set(key, observation, ttl)
+            future.set_result(observation)
+            return False, observation
+        finally:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+"""Start function tools while the model is still streaming its response.
+
+The agent chain built by ``create_zhipuai_tools_agent`` passes every message
+chunk of the model through :func:`tap_tool_call_chunks`. When the executor
+runs with ``early_tool_dispatch`` it installs an :class:`EarlyToolDispatcher`
+for the planning step, which starts a tool as soon as the arguments of its
+call are a complete JSON object. Once the output parser produced the actions
+of the step, the executor picks up the results of the tools already running.
+"""
+import asyncio
+import json
+import logging
+from contextvars import ContextVar
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    AsyncIterator,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+)
+
+from langchain.agents.output_parsers.tools import ToolAgentAction
+from langchain_core.agents import AgentAction, AgentStep
+from langchain_core.callbacks import AsyncCallbackManagerForChainRun
+from langchain_core.messages import BaseMessageChunk
+from langchain_core.runnables import RunnableGenerator
+from langchain_core.tools import BaseTool
+
+from langchain_glm.agent_toolkits.all_tools.struct_type import (
+    AdapterAllToolStructType,
+)
+
+if TYPE_CHECKING:
+    from langchain_glm.agents.all_tools_agent import ZhipuAiAllToolsAgentExecutor
+
+logger = logging.getLogger(__name__)
+
+_current_dispatcher: ContextVar[Optional["EarlyToolDispatcher"]] = ContextVar(
+    "early_tool_dispatcher", default=None
+)
+
+
+def _action_key(action: AgentAction) -> Tuple[Optional[str], str, str]:
+    return (
+        getattr(action, "tool_call_id", None),
+        action.tool,
+        json.dumps(action.tool_input, ensure_ascii=False, sort_keys=True, default=str),
+    )
+
+
+class EarlyToolDispatcher:
+    """Collects the tool call chunks of one planning step and starts tools."""
+
+    def __init__(
+        self,
+        executor: "ZhipuAiAllToolsAgentExecutor",
+        name_to_tool_map: Dict[str, BaseTool],
+        color_mapping: Dict[str, str],
+        run_manager: Optional[AsyncCallbackManagerForChainRun] = None,
+    ):
+        self.executor = executor
+        self.name_to_tool_map = name_to_tool_map
+        self.color_mapping = color_mapping
+        self.run_manager = run_manager
+        # tool call index -> {"name", "id", "args"} merged across chunks
+        self._calls: Dict[Any, Dict[str, Any]] = {}
+        self._dispatched: Dict[Any, Tuple[Any, ...]] = {}
+        self._tasks: Dict[Tuple[Optional[str], str, str], asyncio.Task] = {}
+
+    def feed(self, chunk: BaseMessageChunk) -> None:
+        for position, tool_call_chunk in enumerate(
+            getattr(chunk, "tool_call_chunks", None) or []
+        ):
+            index = tool_call_chunk.get("index")
+            if index is None:
+                # without an index every chunk carries a whole call
+                index = ("position", len(self._calls), position)
+            call = self._calls.setdefault(index, {"name": None, "id": None, "args": ""})
+            if tool_call_chunk.get("name"):
+                call["name"] = tool_call_chunk["name"]
+            if tool_call_chunk.get("id"):
+                call["id"] = tool_call_chunk["id"]
+            if isinstance(tool_call_chunk.get("args"), str):
+                call["args"] += tool_call_chunk["args"]
+            self._maybe_dispatch(index, call)
+
+    def _maybe_dispatch(self, index: Any, call: Dict[str, Any]) -> None:
+        name = call["name"]
+        if (
+            index in self._dispatched
+            or not name
+            or name in AdapterAllToolStructType.__members__.values()
+            or name not in self.name_to_tool_map
+        ):
+            return
+        try:
+            args = json.loads(call["args"])
+        except ValueError:
+            return
+        if not isinstance(args, dict):
+            return
+        # mirror the argument handling of the output parser
+        args = {key.strip(): value for key, value in args.items()}
+        tool_input = args["__arg1"] if "__arg1" in args else args
+        action = ToolAgentAction(
+            tool=name,
+            tool_input=tool_input,
+            log=f"\nInvoking: `{name}` with `{tool_input}`\n",
+            message_log=[],
+            tool_call_id=call["id"] or "abc",
+        )
+        key = _action_key(action)
+        self._dispatched[index] = key
+        if key in self._tasks:
+            return
+        logger.debug(f"early dispatch of {name} ({action.tool_call_id})")
+        self._tasks[key] = asyncio.create_task(
+            self.executor._alimited_perform_agent_action(
+                self.name_to_tool_map, self.color_mapping, action, self.run_manager
+            )
+        )
+
+    def pop(self, action: AgentAction) -> Optional[asyncio.Task]:
+        """The running tool of a parsed action, ``None`` if none was started."""
+        return self._tasks.pop(_action_key(action), None)
+
+    async def aclose(self) -> None:
+        """Cancel the tools the parsed response did not ask for."""
+        tasks: List[asyncio.Task] = list(self._tasks.values())
+        self._tasks.clear()
+        for task in tasks:
+            logger.warning("cancelling an early dispatched tool call without action")
+            task.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    def __enter__(self) -> "EarlyToolDispatcher":
+        self._token = _current_dispatcher.set(self)
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        _current_dispatcher.reset(self._token)
+
+
+async def await_dispatched(task: asyncio.Task, action: AgentAction) -> AgentStep:
+    step: AgentStep = await task
+    # keep the action produced by the output parser, it carries the message log
+    return AgentStep(action=action, observation=step.observation)
+
+
+def _tap(chunks: Iterator[BaseMessageChunk]) -> Iterator[BaseMessageChunk]:
+    yield from chunks
+
+
+async def _atap(
+    chunks: AsyncIterator[BaseMessageChunk],
+) -> AsyncIterator[BaseMessageChunk]:
+    dispatcher = _current_dispatcher.get()
+    async for chunk in chunks:
+        if dispatcher is not None:
+            dispatcher.feed(chunk)
+        yield chunk
+
+
+tap_tool_call_chunks = RunnableGenerator(_tap, _atap)
+"""Pass-through step between the model and the output parser."""
@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+"""Bind only the tools relevant to the user input instead of all of them."""
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Sequence
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_core.messages import HumanMessage
+from langchain_core.prompt_values import PromptValue
+from langchain_core.runnables import Runnable, RunnableLambda
+from langchain_core.runnables.base import RunnableBindingBase
+
+from langchain_glm.embeddings.base import ZhipuAIEmbeddings
+from langchain_glm.vectorstores.index import VectorIndex
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PINNED = ("code_interpreter", "web_browser", "drawing_tool")
+
+
+def _tool_name(tool: Dict[str, Any]) -> str:
+    if tool.get("type") == "function":
+        return tool["function"]["name"]
+    return tool["type"]
+
+
+def _tool_text(tool: Dict[str, Any]) -> str:
+    function = tool["function"]
+    return f"{function['name']}: {function.get('description') or ''}".strip()
+
+
+class ToolSelector:
+    """Pick the ``k`` custom tools closest to the user input by embedding.
+
+    Tool descriptions are embedded on the first turn needing a selection and
+    kept in a :class:`VectorIndex`, building a runnable makes no embeddings
+    call, :meth:`fit` embeds them ahead of time. A turn costs one query
+    embedding, remembered for the later steps of the turn. Built-in tools and
+    the ``pinned`` names are bound on every turn.
+
+    Example:
+        .. code-block:: python
+
+            from langchain_glm.agents import ToolSelector, ZhipuAIAllToolsRunnable
+            from langchain_glm.embeddings import ZhipuAIEmbeddings
+
+            agent = ZhipuAIAllToolsRunnable.create_agent_executor(
+                "glm-4",
+                tools=tools,
+                tool_selector=ToolSelector(ZhipuAIEmbeddings(), k=4),
+            )
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        k: int = 4,
+        pinned: Sequence[str] = DEFAULT_PINNED,
+        max_queries: int = 256,
+    ):
+        """
+        Args:
+            embeddings: Embeds the tool descriptions and the user input.
+            k: Number of custom tools bound besides the pinned ones.
+            pinned: Names of the tools bound on every turn.
+            max_queries: Number of query embeddings remembered.
+        """
+        if k < 0:
+            raise ValueError("k must not be negative")
+        self.embeddings = embeddings
+        self.k = k
+        self.pinned = frozenset(pinned)
+        self.max_queries = max_queries
+        self.index = VectorIndex()
+        self._texts: Dict[str, str] = {}
+        self._queries: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        # one turn embeds the tool descriptions, concurrent turns wait for it
+        self._fit_lock = threading.Lock()
+        self.query_embeddings = 0
+
+    def __deepcopy__(self, memo: Dict[int, Any]) -> "ToolSelector":
+        # shared between copies of the runnables holding it
+        return self
+
+    def _embed(self, texts: List[str]) -> np.ndarray:
+        if isinstance(self.embeddings, ZhipuAIEmbeddings):
+            return self.embeddings.embed_documents_into(texts, normalize=True)
+        return np.asarray(self.embeddings.embed_documents(texts), dtype=np.float32)
+
+    def fit(self, tools: Iterable[Dict[str, Any]]) -> None:
+        """Embed the descriptions of the unpinned custom tools not indexed yet.
+
+        Args:
+            tools: Tools in the format bound to the model.
+        """
+        with self._fit_lock:
+            changed: Dict[str, str] = {}
+            for tool in tools:
+                if tool.get("type") != "function" or _tool_name(tool) in self.pinned:
+                    continue
+                name, text = _tool_name(tool), _tool_text(tool)
+                if self._texts.get(name) != text:
+                    changed[name] = text
+            if not changed:
+                return
+            vectors = self._embed(list(changed.values()))
+            with self._lock:
+                self.index.add(list(changed), vectors)
+                self._texts.update(changed)
+
+    def _query_vector(self, query: str) -> np.ndarray:
+        with self._lock:
+            vector = self._queries.get(query)
+            if vector is not None:
+                self._queries.move_to_end(query)
+                return vector
+        vector = np.asarray(self.embeddings.embed_query(query), dtype=np.float32)
+        with self._lock:
+            self.query_embeddings += 1
+            self._queries[query] = vector
+            while len(self._queries) > self.max_queries:
+                self._queries.popitem(last=False)
+        return vector
+
+    def select(
+        self, tools: Sequence[Dict[str, Any]], query: str
+    ) -> List[Dict[str, Any]]:
+        """The tools to bind for ``query``, in the order of ``tools``.
+
+        Args:
+            tools: All tools in the format bound to the model.
+            query: The user input of the turn.
+        """
+        candidates = [
+            _tool_name(tool)
+            for tool in tools
+            if tool.get("type") == "function" and _tool_name(tool) not in self.pinned
+        ]
+        if len(candidates) <= self.k or not query:
+            return list(tools)
+        selected = set()
+        if self.k:
+            self.fit(tools)
+            with self._lock:
+                allowed = self.index.mask(candidates)
+            hits = self.index.search(self._query_vector(query), self.k, allowed)[0]
+            selected = {name for name, _ in hits}
+        logger.debug(f"bound tools {sorted(selected)} of {len(candidates)}")
+        return [
+            tool
+            for tool in tools
+            if tool.get("type") != "function"
+            or _tool_name(tool) in self.pinned
+            or _tool_name(tool) in selected
+        ]
+
+    @staticmethod
+    def _last_human_input(prompt_value: PromptValue) -> str:
+        for message in reversed(prompt_value.to_messages()):
+            if isinstance(message, HumanMessage) and isinstance(message.content, str):
+                return message.content
+        return ""
+
+    def bind(self, llm_with_all_tools: RunnableBindingBase) -> Runnable:
+        """Wrap a model bound to all tools into one bound to the selected ones.
+
+        The returned runnable takes the prompt value of the agent and picks
+        the tools from its last human message.
+        """
+        llm = llm_with_all_tools.bound
+        kwargs = dict(llm_with_all_tools.kwargs)
+        tools = kwargs.pop("tools", [])
+
+        def _bind(prompt_value: PromptValue) -> Runnable:
+            selected = self.select(tools, self._last_human_input(prompt_value))
+            return llm.bind(tools=selected, **kwargs)
+
+        return RunnableLambda(_bind, name="ToolSelector")
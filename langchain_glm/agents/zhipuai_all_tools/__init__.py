@@ -2,6 +2,7 @@
 from langchain_glm.agents.zhipuai_all_tools.base import (
     ZhipuAIAllToolsRunnable,
 )
+from langchain_glm.agents.zhipuai_all_tools.history_policy import HistoryPolicy
 from langchain_glm.agents.zhipuai_all_tools.schema import (
     AllToolsAction,
     AllToolsActionToolEnd,
@@ -9,11 +10,25 @@ from langchain_glm.agents.zhipuai_all_tools.schema import (
     AllToolsBaseComponent,
     AllToolsFinish,
     AllToolsLLMStatus,
+    AllToolsTiming,
     MsgType,
 )
+from langchain_glm.agents.zhipuai_all_tools.session import ZhipuAIAllToolsSession
+from langchain_glm.agents.zhipuai_all_tools.session_store import (
+    BaseSessionStore,
+    FileSessionStore,
+    InMemorySessionStore,
+    SQLiteSessionStore,
+)
 
 __all__ = [
     "ZhipuAIAllToolsRunnable",
+    "ZhipuAIAllToolsSession",
+    "BaseSessionStore",
+    "InMemorySessionStore",
+    "SQLiteSessionStore",
+    "FileSessionStore",
+    "HistoryPolicy",
     "MsgType",
     "AllToolsBaseComponent",
     "AllToolsAction",
@@ -21,4 +36,5 @@ __all__ = [
     "AllToolsActionToolStart",
     "AllToolsActionToolEnd",
     "AllToolsLLMStatus",
+    "AllToolsTiming",
 ]
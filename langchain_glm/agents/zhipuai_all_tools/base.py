@@ -2,6 +2,9 @@
 import asyncio
 import json
 import logging
+import uuid
+from contextlib import nullcontext
+from functools import partial
 from typing import (
     Any,
     AsyncIterable,
@@ -24,9 +27,10 @@ from langchain_core.language_models import BaseLanguageModel
 from langchain_core.messages import convert_to_messages
 from langchain_core.runnables import RunnableConfig, RunnableSerializable
 from langchain_core.runnables.base import RunnableBindingBase
+from langchain_core.runnables.config import merge_configs, run_in_executor
 from langchain_core.tools import BaseTool
 from langchain_core.utils.function_calling import convert_to_openai_tool
-from pydantic.v1 import Field, validator
+from pydantic.v1 import Field
 from typing_extensions import ClassVar
 from zhipuai.core import PYDANTIC_V2, BaseModel, ConfigDict
 
@@ -46,19 +50,28 @@ from langchain_glm.agents.format_scratchpad.all_tools import (
     format_to_zhipuai_all_tool_messages,
 )
 from langchain_glm.agents.output_parsers import ZhipuAiALLToolsAgentOutputParser
+from langchain_glm.agents.tool_cache import ToolResultCache
+from langchain_glm.agents.tool_selector import ToolSelector
+from langchain_glm.agents.zhipuai_all_tools.history_policy import HistoryPolicy
 from langchain_glm.agents.zhipuai_all_tools.schema import (
     AllToolsAction,
     AllToolsActionToolEnd,
     AllToolsActionToolStart,
     AllToolsFinish,
     AllToolsLLMStatus,
+    AllToolsTiming,
 )
+from langchain_glm.agents.zhipuai_all_tools.session import ZhipuAIAllToolsSession
+from langchain_glm.agents.zhipuai_all_tools.session_store import BaseSessionStore
 from langchain_glm.callbacks.agent_callback_handler import (
     AgentExecutorAsyncIteratorCallbackHandler,
     AgentStatus,
+    QueueOverflowPolicy,
 )
 from langchain_glm.chat_models import ChatZhipuAI
 from langchain_glm.utils import History
+from langchain_glm.utils.profiling import RunProfiler
+from langchain_glm.utils.timing import TimingSink, TurnTiming, run_timed
 
 logger = logging.getLogger()
 
@@ -92,11 +105,15 @@ def _agents_registry(
     tools: Sequence[Union[Dict[str, Any], Type[BaseModel], Callable, BaseTool]] = [],
     callbacks: List[BaseCallbackHandler] = [],
     verbose: bool = False,
+    tool_cache: Optional[ToolResultCache] = None,
+    tool_selector: Optional[ToolSelector] = None,
 ):
     if llm_with_all_tools:
         prompt = hub.pull("zhipuai-all-tools-chat/zhipuai-all-tools-agent")
         agent = create_zhipuai_tools_agent(
-            prompt=prompt, llm_with_all_tools=llm_with_all_tools
+            prompt=prompt,
+            llm_with_all_tools=llm_with_all_tools,
+            tool_selector=tool_selector,
         )
     else:
         prompt = hub.pull("zhipuai-all-tools-chat/zhipuai-all-tools-chat")
@@ -111,6 +128,7 @@ def _agents_registry(
         verbose=verbose,
         callbacks=callbacks,
         return_intermediate_steps=True,
+        tool_cache=tool_cache,
     )
 
     return agent_executor
@@ -134,6 +152,7 @@ OutputType = Union[
     AllToolsActionToolEnd,
     AllToolsFinish,
     AllToolsLLMStatus,
+    AllToolsTiming,
 ]
 
 
@@ -143,12 +162,34 @@ class ZhipuAIAllToolsRunnable(RunnableSerializable[Dict, OutputType]):
 
     model_name: str = Field(default="glm-4-alltools")
     """工具模型"""
-    callback: AgentExecutorAsyncIteratorCallbackHandler
-    """ZhipuAI AgentExecutor callback."""
-    intermediate_steps: List[Tuple[AgentAction, BaseToolOutput]] = []
-    """intermediate_steps to store the data to be processed."""
-    history: List[Union[List, Tuple, Dict]] = []
-    """user message history"""
+    callback: Optional[AgentExecutorAsyncIteratorCallbackHandler] = None
+    """Callback of the latest run on the default session."""
+    intermediate_steps: List[Tuple[AgentAction, BaseToolOutput]] = Field(
+        default_factory=list
+    )
+    """intermediate_steps of the default session."""
+    history: List[Union[List, Tuple, Dict]] = Field(default_factory=list)
+    """user message history of the default session."""
+    history_summary: Optional[str] = None
+    """rolling summary of the default session, see ``history_policy``."""
+    history_summary_upto: int = 0
+    max_queue_size: int = 0
+    """Maximum number of events buffered per run, 0 keeps it unbounded."""
+    queue_overflow_policy: QueueOverflowPolicy = QueueOverflowPolicy.BLOCK
+    """What to do when the per run event queue is full."""
+    session_store: Optional[BaseSessionStore] = None
+    """Where sessions addressed by ``session_id`` are loaded from and saved."""
+    history_policy: Optional[HistoryPolicy] = None
+    """Window (and summary) applied to the history of every turn, ``None``
+    sends the full history."""
+    timing: bool = False
+    """Time the stages of every turn, the turn then ends with an
+    ``AllToolsTiming`` event."""
+    timing_sink: Optional[TimingSink] = None
+    """Called with the ``TurnTiming`` of every timed turn, from the event
+    loop."""
+    profiler: Optional[RunProfiler] = None
+    """Samples the stacks of the turns it picks, see ``invoke(profile=...)``."""
 
     class Config:
         arbitrary_types_allowed = True
@@ -177,22 +218,44 @@ class ZhipuAIAllToolsRunnable(RunnableSerializable[Dict, OutputType]):
         cls,
         model_name: str,
         *,
-        intermediate_steps: List[Tuple[AgentAction, BaseToolOutput]] = [],
-        history: List[Union[List, Tuple, Dict]] = [],
+        intermediate_steps: Optional[List[Tuple[AgentAction, BaseToolOutput]]] = None,
+        history: Optional[List[Union[List, Tuple, Dict]]] = None,
         tools: Sequence[
             Union[Dict[str, Any], Type[BaseModel], Callable, BaseTool]
         ] = None,
         temperature: float = 0.7,
+        max_queue_size: int = 0,
+        queue_overflow_policy: Union[
+            str, QueueOverflowPolicy
+        ] = QueueOverflowPolicy.BLOCK,
+        session_store: Optional[BaseSessionStore] = None,
+        history_policy: Optional[HistoryPolicy] = None,
+        tool_cache: Optional[ToolResultCache] = None,
+        tool_selector: Optional[ToolSelector] = None,
+        timing: bool = False,
+        timing_sink: Optional[TimingSink] = None,
+        profiler: Optional[RunProfiler] = None,
         **kwargs: Any,
     ) -> "ZhipuAIAllToolsRunnable":
-        """Create an ZhipuAI Assistant and instantiate the Runnable."""
+        """Create an ZhipuAI Assistant and instantiate the Runnable.
+
+        ``max_queue_size`` bounds the events buffered for a slow consumer,
+        ``queue_overflow_policy`` decides what happens when that bound is hit.
+        ``history_policy`` keeps the history of long sessions within a token
+        budget. ``tool_cache`` memoizes the tools marked cacheable.
+        ``tool_selector`` binds only the tools relevant to each user input.
+        ``timing`` times the stages of every turn and reports them to the
+        event stream and ``timing_sink``. ``profiler`` writes a profile of
+        the turns asked for or sampled.
+
+        No callback is bound to the llm, the tools or the executor, every
+        :meth:`invoke` attaches its own one through the run config, so one
+        runnable can serve many sessions concurrently.
+        """
 
-        callback = AgentExecutorAsyncIteratorCallbackHandler()
-        callbacks = [callback]
         params = dict(
             streaming=True,
             verbose=True,
-            callbacks=callbacks,
             model=model_name,
             temperature=temperature,
             **kwargs,
@@ -208,13 +271,7 @@ class ZhipuAIAllToolsRunnable(RunnableSerializable[Dict, OutputType]):
                 tools=[_get_assistants_tool(tool) for tool in tools]
             )
 
-            temp_tools.extend(
-                [
-                    t.copy(update={"callbacks": callbacks})
-                    for t in tools
-                    if not _is_assistants_builtin_tool(t)
-                ]
-            )
+            temp_tools.extend([t for t in tools if not _is_assistants_builtin_tool(t)])
 
             assistants_builtin_tools = []
             for t in tools:
@@ -222,52 +279,151 @@ class ZhipuAIAllToolsRunnable(RunnableSerializable[Dict, OutputType]):
                 #       load with langchain_glm/agents/all_tools_agent.py:108
                 # AdapterAllTool implements it
                 if _is_assistants_builtin_tool(t):
-                    assistants_builtin_tools.append(cls.paser_all_tools(t, callbacks))
+                    assistants_builtin_tools.append(cls.paser_all_tools(t))
             temp_tools.extend(assistants_builtin_tools)
 
         agent_executor = _agents_registry(
             llm=llm,
-            callbacks=callbacks,
             tools=temp_tools,
             llm_with_all_tools=llm_with_all_tools,
             verbose=True,
+            tool_cache=tool_cache,
+            tool_selector=tool_selector,
         )
         return cls(
             model_name=model_name,
             agent_executor=agent_executor,
-            callback=callback,
-            intermediate_steps=intermediate_steps,
-            history=history,
+            intermediate_steps=intermediate_steps
+            if intermediate_steps is not None
+            else [],
+            history=history if history is not None else [],
+            max_queue_size=max_queue_size,
+            queue_overflow_policy=queue_overflow_policy,
+            session_store=session_store,
+            history_policy=history_policy,
+            timing=timing,
+            timing_sink=timing_sink,
+            profiler=profiler,
             **kwargs,
         )
 
+    def new_session(
+        self,
+        session_id: Optional[str] = None,
+        *,
+        history: Optional[List[Union[List, Tuple, Dict]]] = None,
+        intermediate_steps: Optional[List[Tuple[AgentAction, BaseToolOutput]]] = None,
+    ) -> ZhipuAIAllToolsSession:
+        """Create the state container of a new conversation."""
+        session = ZhipuAIAllToolsSession(
+            history=list(history or []),
+            intermediate_steps=list(intermediate_steps or []),
+        )
+        if session_id is not None:
+            session.session_id = session_id
+        return session
+
+    def _new_callback(self) -> AgentExecutorAsyncIteratorCallbackHandler:
+        return AgentExecutorAsyncIteratorCallbackHandler(
+            max_queue_size=self.max_queue_size,
+            overflow_policy=self.queue_overflow_policy,
+        )
+
     def invoke(
-        self, chat_input: str, config: Optional[RunnableConfig] = None
+        self,
+        chat_input: str,
+        config: Optional[RunnableConfig] = None,
+        *,
+        session: Optional[ZhipuAIAllToolsSession] = None,
+        session_id: Optional[str] = None,
+        profile: Optional[bool] = None,
     ) -> AsyncIterable[OutputType]:
+        """Run one conversation turn.
+
+        Args:
+            chat_input: The user message.
+            config: Optional run config, merged with the per run callback.
+            session: The conversation to continue. Without it the turn runs on
+                the default session kept in ``history``/``intermediate_steps``.
+            session_id: Continue the conversation kept in ``session_store``
+                under this id, a new one is started if it is unknown. The
+                turn's history and steps are appended to the store.
+            profile: Write a profile of this turn to the directory of
+                ``profiler``, named after the run id. ``None`` leaves it to
+                the sample rate of ``profiler``.
+        """
+        if session is not None and session_id is not None:
+            raise ValueError("Pass either `session` or `session_id`, not both.")
+        if session_id is not None and self.session_store is None:
+            raise ValueError("`session_id` requires a `session_store`.")
+        if profile and self.profiler is None:
+            raise ValueError("`profile` requires a `profiler`.")
+        is_default_session = session is None and session_id is None
+        if is_default_session:
+            session = ZhipuAIAllToolsSession(
+                session_id="default",
+                history=self.history,
+                intermediate_steps=self.intermediate_steps,
+                summary=self.history_summary,
+                summary_upto=self.history_summary_upto,
+            )
+
         async def chat_iterator() -> AsyncIterable[OutputType]:
+            turn_session = session
+            if turn_session is None:
+                turn_session = await run_in_executor(
+                    None, self.session_store.load, session_id
+                ) or self.new_session(session_id)
+
+            callback = self._new_callback()
+            if is_default_session:
+                self.callback = callback
+            run_config = merge_configs(
+                config,
+                {
+                    "callbacks": [callback],
+                    "metadata": {"session_id": turn_session.session_id},
+                },
+            )
+            profiling = self.profiler is not None and self.profiler.should_profile(
+                profile
+            )
+            timing = None
+            if self.timing or profiling:
+                # timing records and profiles carry the run id of the executor
+                run_config["run_id"] = run_config.get("run_id") or uuid.uuid4()
+            if self.timing:
+                timing = TurnTiming(str(run_config["run_id"]))
+
             history_message = []
-            if self.history:
-                _history = [History.from_data(h) for h in self.history]
-                chat_history = [h.to_msg_tuple() for h in _history]
-
-                history_message = convert_to_messages(chat_history)
-
-            task = asyncio.create_task(
-                wrap_done(
-                    self.agent_executor.ainvoke(
-                        {
-                            "input": chat_input,
-                            "chat_history": history_message,
-                            "agent_scratchpad": lambda x: format_to_zhipuai_all_tool_messages(
-                                self.intermediate_steps
-                            ),
-                        }
+            with timing.stage("history") if timing else nullcontext():
+                if self.history_policy is not None:
+                    history_message = self.history_policy.select_messages(turn_session)
+                elif turn_session.history:
+                    _history = [History.from_data(h) for h in turn_session.history]
+                    chat_history = [h.to_msg_tuple() for h in _history]
+
+                    history_message = convert_to_messages(chat_history)
+
+            run = self.agent_executor.ainvoke(
+                {
+                    "input": chat_input,
+                    "chat_history": history_message,
+                    "agent_scratchpad": lambda x: format_to_zhipuai_all_tool_messages(
+                        turn_session.intermediate_steps
                     ),
-                    self.callback.done,
-                )
+                },
+                config=run_config,
             )
-
-            async for chunk in self.callback.aiter():
+            if timing is not None:
+                run = run_timed(timing, run)
+            task = asyncio.create_task(wrap_done(run, callback.done))
+            sampler = None
+            if profiling:
+                sampler = self.profiler.start()
+                task.add_done_callback(lambda _: sampler.stop())
+
+            async for chunk in callback.aiter():
                 data = json.loads(chunk)
                 class_status = None
                 if data["status"] == AgentStatus.llm_start:
@@ -345,12 +501,60 @@ class ZhipuAIAllToolsRunnable(RunnableSerializable[Dict, OutputType]):
                 yield class_status
 
             await task
-
-            if self.callback.out:
-                self.history.append({"role": "user", "content": chat_input})
-                self.history.append(
-                    {"role": "assistant", "content": self.callback.outputs["output"]}
+            if timing is not None:
+                timing.finish()
+            if sampler is not None:
+                await run_in_executor(
+                    None, self.profiler.write, sampler, str(run_config["run_id"])
                 )
-                self.intermediate_steps.extend(self.callback.intermediate_steps)
+
+            if callback.out:
+                new_history = [
+                    {"role": "user", "content": chat_input},
+                    {"role": "assistant", "content": callback.outputs["output"]},
+                ]
+                turn_session.history.extend(new_history)
+                turn_session.intermediate_steps.extend(callback.intermediate_steps)
+                if self.session_store is not None and not is_default_session:
+                    await run_in_executor(
+                        None,
+                        partial(
+                            self.session_store.append,
+                            turn_session.session_id,
+                            history=new_history,
+                            intermediate_steps=callback.intermediate_steps,
+                        ),
+                    )
+                if self.history_policy is not None:
+                    on_summary = None
+                    if is_default_session:
+                        on_summary = self._on_history_summary
+                    elif self.session_store is not None:
+                        on_summary = self._store_history_summary
+                    self.history_policy.schedule_summary(
+                        turn_session, on_summary=on_summary
+                    )
+
+            if timing is not None:
+                if self.timing_sink is not None:
+                    try:
+                        self.timing_sink(timing)
+                    except Exception as e:
+                        logger.error(f"timing sink failed: {e}", exc_info=e)
+                yield AllToolsTiming(status=AgentStatus.timing, **timing.to_dict())
 
         return chat_iterator()
+
+    def _on_history_summary(self, session: ZhipuAIAllToolsSession) -> None:
+        self.history_summary = session.summary
+        self.history_summary_upto = session.summary_upto
+
+    async def _store_history_summary(self, session: ZhipuAIAllToolsSession) -> None:
+        await run_in_executor(
+            None,
+            partial(
+                self.session_store.append,
+                session.session_id,
+                summary=(session.summary, session.summary_upto),
+            ),
+        )
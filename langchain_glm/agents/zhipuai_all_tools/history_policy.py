@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+"""Bound the chat history sent with every agent turn."""
+import asyncio
+import logging
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from langchain_core.language_models import BaseLanguageModel
+from langchain_core.messages import (
+    BaseMessage,
+    HumanMessage,
+    SystemMessage,
+    convert_to_messages,
+)
+
+from langchain_glm.agents.zhipuai_all_tools.session import ZhipuAIAllToolsSession
+from langchain_glm.utils import History
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SUMMARY_PROMPT = (
+    "Summarize the conversation below in a few sentences. Keep names, numbers, "
+    "decisions and open questions, drop greetings and small talk. If a previous "
+    "summary is given, merge it into the new one."
+)
+
+
+@lru_cache(maxsize=1)
+def _tiktoken_encoding() -> Any:
+    try:
+        import tiktoken
+
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception:
+        return None
+
+
+def default_token_counter(text: str) -> int:
+    """Count tokens with tiktoken when it is installed, characters otherwise."""
+    encoding = _tiktoken_encoding()
+    if encoding is None:
+        return len(text)
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+class HistoryPolicy:
+    """Select the part of a session history that goes into the prompt.
+
+    The newest entries are kept while they fit ``max_turns`` and
+    ``max_tokens``. Entries that fall out of the window can be folded into a
+    rolling summary by ``summary_llm``; the summary is produced in the
+    background after a turn finishes and is used from the next turn on.
+    """
+
+    def __init__(
+        self,
+        max_turns: Optional[int] = None,
+        max_tokens: Optional[int] = None,
+        token_counter: Optional[Callable[[str], int]] = None,
+        summary_llm: Optional[BaseLanguageModel] = None,
+        summary_prompt: str = DEFAULT_SUMMARY_PROMPT,
+        token_cache_size: int = 4096,
+    ):
+        """
+        Args:
+            max_turns: Keep at most this many user/assistant turns.
+            max_tokens: Token budget of the history, including the summary.
+            token_counter: Counts the tokens of a text, defaults to
+                :func:`default_token_counter`.
+            summary_llm: Model used to summarize entries outside the window,
+                ``None`` simply drops them.
+            summary_prompt: Instruction given to ``summary_llm``.
+            token_cache_size: How many per-message token counts are cached.
+        """
+        self.max_turns = max_turns
+        self.max_tokens = max_tokens
+        self.token_counter = token_counter or default_token_counter
+        self.summary_llm = summary_llm
+        self.summary_prompt = summary_prompt
+        self.token_cache_size = token_cache_size
+        self._token_counts: "OrderedDict[Tuple[str, str], int]" = OrderedDict()
+        self._summary_tasks: Dict[str, asyncio.Task] = {}
+
+    def count_tokens(self, role: str, content: str) -> int:
+        key = (role, content)
+        count = self._token_counts.get(key)
+        if count is None:
+            count = self.token_counter(content)
+            self._token_counts[key] = count
+            if len(self._token_counts) > self.token_cache_size:
+                self._token_counts.popitem(last=False)
+        else:
+            self._token_counts.move_to_end(key)
+        return count
+
+    def window_start(self, session: ZhipuAIAllToolsSession) -> int:
+        """Index of the first history entry that is sent with the next turn."""
+        history = [History.from_data(h) for h in session.history]
+        start = session.summary_upto
+        if self.max_turns is not None:
+            start = max(start, len(history) - 2 * self.max_turns)
+
+        if self.max_tokens is not None:
+            budget = self.max_tokens
+            if session.summary:
+                budget -= self.count_tokens("system", session.summary)
+            index = len(history)
+            while index > start:
+                entry = history[index - 1]
+                budget -= self.count_tokens(entry.role, entry.content)
+                if budget < 0:
+                    break
+                index -= 1
+            start = index
+
+        # never open the window with an assistant reply
+        while start < len(history) and history[start].role in ("assistant", "ai"):
+            start += 1
+        return start
+
+    def select_messages(self, session: ZhipuAIAllToolsSession) -> List[BaseMessage]:
+        """Chat history messages for the next turn of ``session``."""
+        start = self.window_start(session)
+        messages: List[BaseMessage] = []
+        if session.summary:
+            messages.append(
+                SystemMessage(
+                    content=f"Summary of the earlier conversation: {session.summary}"
+                )
+            )
+        chat_history = [
+            History.from_data(h).to_msg_tuple() for h in session.history[start:]
+        ]
+        messages.extend(convert_to_messages(chat_history))
+        return messages
+
+    def schedule_summary(
+        self,
+        session: ZhipuAIAllToolsSession,
+        on_summary: Optional[Callable[[ZhipuAIAllToolsSession], Any]] = None,
+    ) -> Optional[asyncio.Task]:
+        """Summarize entries that left the window in a background task.
+
+        Args:
+            session: The session whose window just moved.
+            on_summary: Called with the session once the summary is updated,
+                e.g. to persist it.
+        """
+        if self.summary_llm is None:
+            return None
+        pending = self._summary_tasks.get(session.session_id)
+        if pending is not None and not pending.done():
+            return pending
+        end = self.window_start(session)
+        if end <= session.summary_upto:
+            return None
+
+        task = asyncio.create_task(self._summarize(session, end, on_summary))
+        self._summary_tasks[session.session_id] = task
+        task.add_done_callback(
+            lambda _: self._summary_tasks.pop(session.session_id, None)
+        )
+        return task
+
+    async def _summarize(
+        self,
+        session: ZhipuAIAllToolsSession,
+        end: int,
+        on_summary: Optional[Callable[[ZhipuAIAllToolsSession], Any]],
+    ) -> None:
+        transcript = "\n".join(
+            f"{h.role}: {h.content}"
+            for h in (
+                History.from_data(h)
+                for h in session.history[session.summary_upto : end]
+            )
+        )
+        if session.summary:
+            transcript = f"Previous summary: {session.summary}\n\n{transcript}"
+        try:
+            result = await self.summary_llm.ainvoke(
+                [SystemMessage(content=self.summary_prompt), HumanMessage(transcript)]
+            )
+        except Exception as e:
+            logger.error(f"{e.__class__.__name__}: history summary failed", exc_info=e)
+            return
+        session.summary = getattr(result, "content", result)
+        session.summary_upto = end
+        if on_summary is not None:
+            result = on_summary(session)
+            if asyncio.iscoroutine(result):
+                await result
@@ -117,3 +117,17 @@ class AllToolsLLMStatus(AllToolsBaseComponent):
     @classmethod
     def class_name(cls) -> str:
         return "AllToolsLLMStatus"
+
+
+class AllToolsTiming(AllToolsBaseComponent):
+    """Time spent per stage of a turn, the last event of a timed turn."""
+
+    run_id: str
+    status: int  # AgentStatus
+    total_ms: float
+    stages: Dict[str, Dict[str, float]]
+    """``{stage: {"ms": ..., "count": ...}}``"""
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "AllToolsTiming"
@@ -0,0 +1,28 @@
+# -*- coding: utf-8 -*-
+import uuid
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple, Union
+
+from langchain_core.agents import AgentAction
+
+from langchain_glm.agent_toolkits.all_tools.tool import BaseToolOutput
+
+
+@dataclass
+class ZhipuAIAllToolsSession:
+    """Conversation state of one session served by a ZhipuAIAllToolsRunnable.
+
+    A runnable is stateless between calls, everything a conversation needs to
+    continue lives here. A session must not run two turns at the same time.
+    """
+
+    session_id: str = field(default_factory=lambda: uuid.uuid4().hex)
+    history: List[Union[List, Tuple, Dict]] = field(default_factory=list)
+    """user message history"""
+    intermediate_steps: List[Tuple[AgentAction, BaseToolOutput]] = field(
+        default_factory=list
+    )
+    """intermediate_steps to store the data to be processed."""
+    summary: Optional[str] = None
+    """rolling summary of the history entries before ``summary_upto``"""
+    summary_upto: int = 0
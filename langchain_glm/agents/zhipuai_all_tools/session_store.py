@@ -0,0 +1,540 @@
+# -*- coding: utf-8 -*-
+"""Session stores keep ZhipuAIAllToolsSession state outside of the runnable.
+
+Every backend is append-only per session: a turn only writes the history
+entries and intermediate steps it produced, and any worker holding the same
+store can load the session back.
+"""
+import asyncio
+import base64
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Type, Union
+
+from langchain.agents.output_parsers.tools import ToolAgentAction
+from langchain_core.agents import AgentAction
+from langchain_core.runnables.config import run_in_executor
+
+from langchain_glm.agent_toolkits.all_tools.code_interpreter_tool import (
+    CodeInterpreterToolOutput,
+)
+from langchain_glm.agent_toolkits.all_tools.drawing_tool import DrawingToolOutput
+from langchain_glm.agent_toolkits.all_tools.tool import BaseToolOutput
+from langchain_glm.agent_toolkits.all_tools.web_browser_tool import (
+    WebBrowserToolOutput,
+)
+from langchain_glm.agents.output_parsers.code_interpreter import (
+    CodeInterpreterAgentAction,
+)
+from langchain_glm.agents.output_parsers.drawing_tool import DrawingToolAgentAction
+from langchain_glm.agents.output_parsers.web_browser import WebBrowserAgentAction
+from langchain_glm.agents.zhipuai_all_tools.session import ZhipuAIAllToolsSession
+
+logger = logging.getLogger(__name__)
+
+IntermediateStep = Tuple[AgentAction, Union[str, BaseToolOutput]]
+
+# most specific classes first, isinstance picks the first match
+_ACTION_TYPES: List[Tuple[str, Type[AgentAction]]] = [
+    ("ci", CodeInterpreterAgentAction),
+    ("dt", DrawingToolAgentAction),
+    ("wb", WebBrowserAgentAction),
+    ("tc", ToolAgentAction),
+    ("a", AgentAction),
+]
+_ACTION_CLASSES: Dict[str, Type[AgentAction]] = dict(_ACTION_TYPES)
+
+_HISTORY = "h"
+_STEP = "s"
+_SUMMARY = "m"
+
+
+def _jsonable(data: Any) -> Any:
+    try:
+        json.dumps(data, ensure_ascii=False)
+        return data
+    except (TypeError, ValueError):
+        return str(data)
+
+
+def dump_intermediate_step(step: IntermediateStep) -> Dict[str, Any]:
+    """Convert an (AgentAction, observation) pair into a compact dict.
+
+    The ``message_log`` of tool actions is dropped, it is only needed while
+    the step that produced it is running.
+    """
+    action, observation = step
+    action_type = next(k for k, cls in _ACTION_TYPES if isinstance(action, cls))
+    action_data: Dict[str, Any] = {
+        "t": action_type,
+        "tool": action.tool,
+        "tool_input": _jsonable(action.tool_input),
+        "log": action.log,
+    }
+    if isinstance(action, ToolAgentAction):
+        action_data["tool_call_id"] = action.tool_call_id
+    if getattr(action, "outputs", None) is not None:
+        action_data["outputs"] = _jsonable(action.outputs)
+    if getattr(action, "platform_params", None) is not None:
+        action_data["platform_params"] = action.platform_params
+
+    if isinstance(observation, CodeInterpreterToolOutput):
+        observation_data = {
+            "t": "ci",
+            "tool": observation.tool,
+            "code_input": observation.code_input,
+            "code_output": _jsonable(observation.code_output),
+            "platform_params": observation.platform_params,
+        }
+    elif isinstance(observation, (DrawingToolOutput, WebBrowserToolOutput)):
+        observation_data = {
+            "t": "dt" if isinstance(observation, DrawingToolOutput) else "wb",
+            "data": _jsonable(observation.data),
+            "platform_params": observation.platform_params,
+        }
+    elif isinstance(observation, BaseToolOutput):
+        observation_data = {
+            "t": "base",
+            "data": _jsonable(observation.data),
+            "format": observation.format,
+        }
+    else:
+        observation_data = {"t": "str", "data": str(observation)}
+    return {"a": action_data, "o": observation_data}
+
+
+def load_intermediate_step(data: Dict[str, Any]) -> IntermediateStep:
+    """Inverse of :func:`dump_intermediate_step`."""
+    action_data = dict(data["a"])
+    action_cls = _ACTION_CLASSES[action_data.pop("t")]
+    if issubclass(action_cls, ToolAgentAction):
+        action_data["message_log"] = []
+    action = action_cls(**action_data)
+
+    observation_data = data["o"]
+    observation_type = observation_data["t"]
+    observation: Union[str, BaseToolOutput]
+    if observation_type == "ci":
+        observation = CodeInterpreterToolOutput(
+            tool=observation_data["tool"],
+            code_input=observation_data["code_input"],
+            code_output=observation_data["code_output"],
+            platform_params=observation_data["platform_params"],
+        )
+    elif observation_type == "dt":
+        observation = DrawingToolOutput(
+            data=observation_data["data"],
+            platform_params=observation_data["platform_params"],
+        )
+    elif observation_type == "wb":
+        observation = WebBrowserToolOutput(
+            data=observation_data["data"],
+            platform_params=observation_data["platform_params"],
+        )
+    elif observation_type == "base":
+        observation = BaseToolOutput(
+            observation_data["data"], format=observation_data["format"]
+        )
+    else:
+        observation = observation_data["data"]
+    return action, observation
+
+
+def _encode(value: Any, compress_threshold: Optional[int]) -> bytes:
+    """Serialize a record, zlib compressed once it exceeds the threshold."""
+    raw = json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode()
+    if compress_threshold is not None and len(raw) > compress_threshold:
+        return b"z" + zlib.compress(raw)
+    return b"j" + raw
+
+
+def _decode(payload: bytes) -> Any:
+    if payload[:1] == b"z":
+        return json.loads(zlib.decompress(payload[1:]))
+    return json.loads(payload[1:])
+
+
+def _records(
+    history: Iterable[Union[List, Tuple, Dict]],
+    intermediate_steps: Iterable[IntermediateStep],
+    summary: Optional[Tuple[str, int]] = None,
+) -> List[Tuple[str, Any]]:
+    records: List[Tuple[str, Any]] = [(_HISTORY, _jsonable(h)) for h in history]
+    records.extend((_STEP, dump_intermediate_step(s)) for s in intermediate_steps)
+    if summary is not None:
+        records.append((_SUMMARY, list(summary)))
+    return records
+
+
+def _session_from_records(
+    session_id: str, records: Iterable[Tuple[str, Any]]
+) -> ZhipuAIAllToolsSession:
+    session = ZhipuAIAllToolsSession(session_id=session_id)
+    for kind, value in records:
+        if kind == _HISTORY:
+            session.history.append(value)
+        elif kind == _STEP:
+            session.intermediate_steps.append(load_intermediate_step(value))
+        elif kind == _SUMMARY:
+            session.summary, session.summary_upto = value
+    return session
+
+
+class BaseSessionStore(ABC):
+    """Persist sessions as an append-only log of history entries and steps."""
+
+    def __init__(self, ttl: Optional[float] = None):
+        """
+        Args:
+            ttl: Seconds after the last write when a session expires,
+                ``None`` keeps sessions forever.
+        """
+        self.ttl = ttl
+
+    def _expired(self, updated_at: float, now: Optional[float] = None) -> bool:
+        if self.ttl is None:
+            return False
+        return (now or time.time()) - updated_at > self.ttl
+
+    @abstractmethod
+    def load(self, session_id: str) -> Optional[ZhipuAIAllToolsSession]:
+        """Return the session, ``None`` if it is unknown or expired."""
+
+    @abstractmethod
+    def append(
+        self,
+        session_id: str,
+        *,
+        history: Iterable[Union[List, Tuple, Dict]] = (),
+        intermediate_steps: Iterable[IntermediateStep] = (),
+        summary: Optional[Tuple[str, int]] = None,
+    ) -> None:
+        """Append the entries produced by one turn to the session.
+
+        ``summary`` is a ``(text, summary_upto)`` pair that replaces the
+        rolling summary of the session, see :class:`HistoryPolicy`.
+        """
+
+    @abstractmethod
+    def delete(self, session_id: str) -> None:
+        """Forget the session."""
+
+    @abstractmethod
+    def evict_expired(self) -> int:
+        """Drop expired sessions, returns how many were removed."""
+
+    async def evict_expired_every(self, interval: float) -> None:
+        """Call :meth:`evict_expired` every ``interval`` seconds until cancelled.
+
+        Expired sessions are otherwise only dropped when they are loaded again,
+        the sessions nobody comes back to would stay forever. Meant to run as a
+        background task of the process owning the store, the eviction runs in
+        an executor thread.
+        """
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await run_in_executor(None, self.evict_expired)
+            except Exception as e:
+                logger.error("evicting expired sessions failed", exc_info=e)
+
+
+class InMemorySessionStore(BaseSessionStore):
+    """Process-local LRU store, sessions are kept as live objects."""
+
+    def __init__(self, max_sessions: int = 10000, ttl: Optional[float] = None):
+        super().__init__(ttl=ttl)
+        self.max_sessions = max_sessions
+        self._sessions: "OrderedDict[str, Tuple[ZhipuAIAllToolsSession, float]]" = (
+            OrderedDict()
+        )
+        self._lock = threading.Lock()
+
+    def load(self, session_id: str) -> Optional[ZhipuAIAllToolsSession]:
+        with self._lock:
+            item = self._sessions.get(session_id)
+            if item is None:
+                return None
+            session, updated_at = item
+            if self._expired(updated_at):
+                del self._sessions[session_id]
+                return None
+            self._sessions.move_to_end(session_id)
+            # hand out a copy so the caller's appends do not land twice
+            return ZhipuAIAllToolsSession(
+                session_id=session_id,
+                history=list(session.history),
+                intermediate_steps=list(session.intermediate_steps),
+                summary=session.summary,
+                summary_upto=session.summary_upto,
+            )
+
+    def append(
+        self,
+        session_id: str,
+        *,
+        history: Iterable[Union[List, Tuple, Dict]] = (),
+        intermediate_steps: Iterable[IntermediateStep] = (),
+        summary: Optional[Tuple[str, int]] = None,
+    ) -> None:
+        with self._lock:
+            item = self._sessions.get(session_id)
+            session = item[0] if item else ZhipuAIAllToolsSession(session_id=session_id)
+            session.history.extend(history)
+            session.intermediate_steps.extend(intermediate_steps)
+            if summary is not None:
+                session.summary, session.summary_upto = summary
+            self._sessions[session_id] = (session, time.time())
+            self._sessions.move_to_end(session_id)
+            while len(self._sessions) > self.max_sessions:
+                evicted, _ = self._sessions.popitem(last=False)
+                logger.debug(f"session {evicted} evicted, store is full")
+
+    def delete(self, session_id: str) -> None:
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def evict_expired(self) -> int:
+        now = time.time()
+        with self._lock:
+            expired = [
+                session_id
+                for session_id, (_, updated_at) in self._sessions.items()
+                if self._expired(updated_at, now)
+            ]
+            for session_id in expired:
+                del self._sessions[session_id]
+        if expired:
+            logger.debug(f"evicted {len(expired)} expired sessions")
+        return len(expired)
+
+
+class SQLiteSessionStore(BaseSessionStore):
+    """Store backed by a sqlite database shared by all workers on a host."""
+
+    def __init__(
+        self,
+        database: Union[str, Path],
+        ttl: Optional[float] = None,
+        compress_threshold: Optional[int] = 4096,
+    ):
+        """
+        Args:
+            database: Path of the sqlite file.
+            ttl: Seconds after the last write when a session expires.
+            compress_threshold: Records larger than this many bytes are zlib
+                compressed, ``None`` disables compression.
+        """
+        super().__init__(ttl=ttl)
+        self.compress_threshold = compress_threshold
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            str(database), check_same_thread=False, isolation_level=None
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            "session_id TEXT PRIMARY KEY, updated_at REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS session_records ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, session_id TEXT NOT NULL, "
+            "kind TEXT NOT NULL, payload BLOB NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS session_records_session_id "
+            "ON session_records (session_id, id)"
+        )
+
+    def load(self, session_id: str) -> Optional[ZhipuAIAllToolsSession]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT updated_at FROM sessions WHERE session_id = ?", (session_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            if self._expired(row[0]):
+                self._delete(session_id)
+                return None
+            rows = self._conn.execute(
+                "SELECT kind, payload FROM session_records "
+                "WHERE session_id = ? ORDER BY id",
+                (session_id,),
+            ).fetchall()
+        return _session_from_records(
+            session_id, ((kind, _decode(payload)) for kind, payload in rows)
+        )
+
+    def append(
+        self,
+        session_id: str,
+        *,
+        history: Iterable[Union[List, Tuple, Dict]] = (),
+        intermediate_steps: Iterable[IntermediateStep] = (),
+        summary: Optional[Tuple[str, int]] = None,
+    ) -> None:
+        rows = [
+            (session_id, kind, _encode(value, self.compress_threshold))
+            for kind, value in _records(history, intermediate_steps, summary)
+        ]
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany(
+                    "INSERT INTO session_records (session_id, kind, payload) "
+                    "VALUES (?, ?, ?)",
+                    rows,
+                )
+                self._conn.execute(
+                    "INSERT INTO sessions (session_id, updated_at) VALUES (?, ?) "
+                    "ON CONFLICT(session_id) DO UPDATE SET updated_at = "
+                    "excluded.updated_at",
+                    (session_id, time.time()),
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def _delete(self, session_id: str) -> None:
+        self._conn.execute(
+            "DELETE FROM session_records WHERE session_id = ?", (session_id,)
+        )
+        self._conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+
+    def delete(self, session_id: str) -> None:
+        with self._lock:
+            self._delete(session_id)
+
+    def evict_expired(self) -> int:
+        if self.ttl is None:
+            return 0
+        deadline = time.time() - self.ttl
+        with self._lock:
+            expired = [
+                row[0]
+                for row in self._conn.execute(
+                    "SELECT session_id FROM sessions WHERE updated_at < ?",
+                    (deadline,),
+                )
+            ]
+            for session_id in expired:
+                self._delete(session_id)
+        if expired:
+            logger.debug(f"evicted {len(expired)} expired sessions")
+        return len(expired)
+
+    def close(self) -> None:
+        self._conn.close()
+
+
+class FileSessionStore(BaseSessionStore):
+    """One append-only JSON lines file per session inside a directory.
+
+    Each :meth:`append` is written with a single ``write`` call so concurrent
+    writers on a local filesystem do not interleave records.
+    """
+
+    def __init__(
+        self,
+        directory: Union[str, Path],
+        ttl: Optional[float] = None,
+        compress_threshold: Optional[int] = 4096,
+    ):
+        super().__init__(ttl=ttl)
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.compress_threshold = compress_threshold
+
+    def _path(self, session_id: str) -> Path:
+        digest = hashlib.sha1(session_id.encode()).hexdigest()
+        return self.directory / f"{digest}.jsonl"
+
+    def load(self, session_id: str) -> Optional[ZhipuAIAllToolsSession]:
+        path = self._path(session_id)
+        try:
+            if self._expired(path.stat().st_mtime):
+                path.unlink()
+                return None
+            lines = path.read_bytes().splitlines()
+        except FileNotFoundError:
+            return None
+
+        def records() -> Iterable[Tuple[str, Any]]:
+            for number, line in enumerate(lines, 1):
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                    if "z" in record:
+                        value = _decode(base64.b64decode(record["z"]))
+                    else:
+                        value = record["v"]
+                    kind = record["k"]
+                except (ValueError, KeyError, TypeError, zlib.error) as e:
+                    logger.warning(
+                        f"skipping corrupt record {number} of session "
+                        f"{session_id} in {path}: {e}"
+                    )
+                    continue
+                yield kind, value
+
+        return _session_from_records(session_id, records())
+
+    def append(
+        self,
+        session_id: str,
+        *,
+        history: Iterable[Union[List, Tuple, Dict]] = (),
+        intermediate_steps: Iterable[IntermediateStep] = (),
+        summary: Optional[Tuple[str, int]] = None,
+    ) -> None:
+        lines = []
+        for kind, value in _records(history, intermediate_steps, summary):
+            payload = _encode(value, self.compress_threshold)
+            if payload[:1] == b"z":
+                record = {"k": kind, "z": base64.b64encode(payload).decode()}
+            else:
+                record = {"k": kind, "v": value}
+            lines.append(json.dumps(record, ensure_ascii=False, separators=(",", ":")))
+        if not lines:
+            # still refresh the session like the other stores do
+            self._path(session_id).touch()
+            return
+        data = ("\n".join(lines) + "\n").encode()
+        fd = os.open(self._path(session_id), os.O_WRONLY | os.O_CREAT | os.O_APPEND)
+        try:
+            os.write(fd, data)
+        finally:
+            os.close(fd)
+
+    def delete(self, session_id: str) -> None:
+        try:
+            self._path(session_id).unlink()
+        except FileNotFoundError:
+            pass
+
+    def evict_expired(self) -> int:
+        if self.ttl is None:
+            return 0
+        now = time.time()
+        removed = 0
+        for path in self.directory.glob("*.jsonl"):
+            try:
+                if self._expired(path.stat().st_mtime, now):
+                    path.unlink()
+                    removed += 1
+            except FileNotFoundError:
+                continue
+        if removed:
+            logger.debug(f"evicted {removed} expired sessions")
+        return removed
@@ -9,8 +9,14 @@
 """
 from langchain_glm.callbacks.agent_callback_handler import (
     AgentExecutorAsyncIteratorCallbackHandler,
+    CallbackQueueFullError,
+    QueueMetrics,
+    QueueOverflowPolicy,
 )
 
 __all__ = [
     "AgentExecutorAsyncIteratorCallbackHandler",
+    "CallbackQueueFullError",
+    "QueueMetrics",
+    "QueueOverflowPolicy",
 ]
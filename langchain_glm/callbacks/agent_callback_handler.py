@@ -3,7 +3,10 @@ from __future__ import annotations
 
 import asyncio
 import json
-from typing import Any, Dict, List, Optional, Tuple
+import time
+from dataclasses import dataclass
+from enum import Enum
+from typing import Any, Dict, List, Optional, Set, Tuple, Union
 from uuid import UUID
 
 from langchain.callbacks import AsyncIteratorCallbackHandler
@@ -12,12 +15,48 @@ from langchain_core.outputs import LLMResult
 
 from langchain_glm.agent_toolkits import BaseToolOutput
 from langchain_glm.utils import History
+from langchain_glm.utils.timing import timed
 
 
 def dumps(obj: Dict) -> str:
     return json.dumps(obj, ensure_ascii=False)
 
 
+class QueueOverflowPolicy(str, Enum):
+    """What the handler does when a bounded event queue is full.
+
+    Attributes:
+        BLOCK ("block"): wait until the consumer frees a slot.
+        DROP ("drop"): drop token events, block for every other event.
+        MERGE ("merge"): coalesce token events of the same run into one
+            pending event, block for every other event.
+        ERROR ("error"): raise :class:`CallbackQueueFullError` and fail the run.
+    """
+
+    BLOCK = "block"
+    DROP = "drop"
+    MERGE = "merge"
+    ERROR = "error"
+
+
+class CallbackQueueFullError(RuntimeError):
+    """Raised when the event queue is full and the policy is ``error``."""
+
+
+@dataclass
+class QueueMetrics:
+    """Counters describing the event queue of a callback handler."""
+
+    max_size: int = 0
+    depth: int = 0
+    high_watermark: int = 0
+    enqueued: int = 0
+    dropped: int = 0
+    merged: int = 0
+    blocked: int = 0
+    blocked_seconds: float = 0.0
+
+
 class AgentStatus:
     chain_start: int = 0
     llm_start: int = 1
@@ -27,18 +66,118 @@ class AgentStatus:
     agent_finish: int = 5
     tool_start: int = 6
     tool_end: int = 7
+    timing: int = 8
     error: int = -1
     chain_end: int = -999
 
 
 class AgentExecutorAsyncIteratorCallbackHandler(AsyncIteratorCallbackHandler):
-    def __init__(self):
+    def __init__(
+        self,
+        max_queue_size: int = 0,
+        overflow_policy: Union[str, QueueOverflowPolicy] = QueueOverflowPolicy.BLOCK,
+    ):
+        """
+        Args:
+            max_queue_size: Maximum number of events buffered for the consumer,
+                ``0`` keeps the queue unbounded.
+            overflow_policy: What to do when the bounded queue is full,
+                see :class:`QueueOverflowPolicy`.
+        """
         super().__init__()
-        self.queue = asyncio.Queue()
+        self.queue = asyncio.Queue(maxsize=max_queue_size)
         self.done = asyncio.Event()
         self.out = False
         self.intermediate_steps: List[Tuple[AgentAction, BaseToolOutput]] = []
         self.outputs: Dict[str, Any] = {}
+        self.overflow_policy = QueueOverflowPolicy(overflow_policy)
+        # the error policy only fails the run if the callback manager re-raises
+        self.raise_error = self.overflow_policy == QueueOverflowPolicy.ERROR
+        self._metrics = QueueMetrics(max_size=max_queue_size)
+        self._pending_token: Optional[Dict[str, Any]] = None
+        # chain runs seen by this handler, nested ones are not forwarded
+        self._chain_run_ids: Set[UUID] = set()
+        self._nested_chain_run_ids: Set[UUID] = set()
+
+    @property
+    def queue_metrics(self) -> QueueMetrics:
+        """Snapshot of the event queue counters."""
+        self._metrics.depth = self.queue.qsize()
+        return QueueMetrics(**self._metrics.__dict__)
+
+    def _is_nested_chain_start(
+        self, run_id: UUID, parent_run_id: Optional[UUID]
+    ) -> bool:
+        """Track chain runs, the handler is usually attached through the run
+        config so it also sees the prompt, llm and parser sub-chains of the
+        agent; only the outermost chain is reported."""
+        nested = parent_run_id is not None and parent_run_id in self._chain_run_ids
+        self._chain_run_ids.add(run_id)
+        if nested:
+            self._nested_chain_run_ids.add(run_id)
+        return nested
+
+    def _is_nested_chain_end(self, run_id: UUID) -> bool:
+        self._chain_run_ids.discard(run_id)
+        if run_id in self._nested_chain_run_ids:
+            self._nested_chain_run_ids.discard(run_id)
+            return True
+        return False
+
+    def _enqueue(self, data: Dict[str, Any]) -> None:
+        self.queue.put_nowait(dumps(data))
+        self._metrics.enqueued += 1
+        self._metrics.high_watermark = max(
+            self._metrics.high_watermark, self.queue.qsize()
+        )
+
+    async def _enqueue_blocking(self, data: Dict[str, Any]) -> None:
+        if self.queue.full():
+            if self.overflow_policy == QueueOverflowPolicy.ERROR:
+                raise CallbackQueueFullError(
+                    f"Callback event queue is full ({self.queue.maxsize} events)"
+                )
+            self._metrics.blocked += 1
+            start = time.monotonic()
+            await self.queue.put(dumps(data))
+            self._metrics.blocked_seconds += time.monotonic() - start
+            self._metrics.enqueued += 1
+            self._metrics.high_watermark = max(
+                self._metrics.high_watermark, self.queue.qsize()
+            )
+        else:
+            self._enqueue(data)
+
+    async def _put(self, data: Dict[str, Any]) -> None:
+        """Put an event on the queue honouring the overflow policy.
+
+        Token events may be dropped or merged, every other event keeps its
+        order relative to the token events emitted before it.
+        """
+        with timed("callbacks"):
+            is_token = data["status"] == AgentStatus.llm_new_token
+            if self._pending_token is not None:
+                if not is_token or self._pending_token.get("run_id") != data.get(
+                    "run_id"
+                ):
+                    pending, self._pending_token = self._pending_token, None
+                    await self._enqueue_blocking(pending)
+                elif not self.queue.full():
+                    pending, self._pending_token = self._pending_token, None
+                    self._enqueue(pending)
+
+            if not self.queue.full() and self._pending_token is None:
+                self._enqueue(data)
+            elif is_token and self.overflow_policy == QueueOverflowPolicy.DROP:
+                self._metrics.dropped += 1
+            elif is_token and self.overflow_policy == QueueOverflowPolicy.MERGE:
+                if self._pending_token is None:
+                    self._pending_token = dict(data)
+                else:
+                    self._pending_token["text"] += data["text"]
+                    self._metrics.merged += 1
+            else:
+                await self._enqueue_blocking(data)
 
     async def on_llm_start(
         self, serialized: Dict[str, Any], prompts: List[str], **kwargs: Any
@@ -49,7 +188,7 @@ class AgentExecutorAsyncIteratorCallbackHandler(AsyncIteratorCallbackHandler):
         }
         self.out = False
         self.done.clear()
-        self.queue.put_nowait(dumps(data))
+        await self._put(data)
 
     async def on_llm_new_token(self, token: str, **kwargs: Any) -> None:
         special_tokens = ["\nAction:", "\nObservation:", "<|observation|>"]
@@ -57,10 +196,11 @@ class AgentExecutorAsyncIteratorCallbackHandler(AsyncIteratorCallbackHandler):
             if stoken in token:
                 before_action = token.split(stoken)[0]
                 data = {
+                    "run_id": str(kwargs["run_id"]),
                     "status": AgentStatus.llm_new_token,
                     "text": before_action + "\n",
                 }
-                self.queue.put_nowait(dumps(data))
+                await self._put(data)
                 self.out = False
                 break
 
@@ -70,7 +210,7 @@ class AgentExecutorAsyncIteratorCallbackHandler(AsyncIteratorCallbackHandler):
                 "status": AgentStatus.llm_new_token,
                 "text": token,
             }
-            self.queue.put_nowait(dumps(data))
+            await self._put(data)
 
     async def on_chat_model_start(
         self,
@@ -89,7 +229,7 @@ class AgentExecutorAsyncIteratorCallbackHandler(AsyncIteratorCallbackHandler):
             "text": "",
         }
         self.done.clear()
-        self.queue.put_nowait(dumps(data))
+        await self._put(data)
 
     async def on_llm_end(self, response: LLMResult, **kwargs: Any) -> None:
         data = {
@@ -98,7 +238,7 @@ class AgentExecutorAsyncIteratorCallbackHandler(AsyncIteratorCallbackHandler):
             "text": response.generations[0][0].message.content,
         }
 
-        self.queue.put_nowait(dumps(data))
+        await self._put(data)
 
     async def on_llm_error(
         self, error: Exception | KeyboardInterrupt, **kwargs: Any
@@ -107,7 +247,7 @@ class AgentExecutorAsyncIteratorCallbackHandler(AsyncIteratorCallbackHandler):
             "status": AgentStatus.error,
             "text": str(error),
         }
-        self.queue.put_nowait(dumps(data))
+        await self._put(data)
 
     async def on_tool_start(
         self,
@@ -127,7 +267,7 @@ class AgentExecutorAsyncIteratorCallbackHandler(AsyncIteratorCallbackHandler):
             "tool_input": input_str,
         }
         self.done.clear()
-        self.queue.put_nowait(dumps(data))
+        await self._put(data)
 
     async def on_tool_end(
         self,
@@ -145,7 +285,7 @@ class AgentExecutorAsyncIteratorCallbackHandler(AsyncIteratorCallbackHandler):
             "tool": kwargs["name"],
             "tool_output": str(output),
         }
-        self.queue.put_nowait(dumps(data))
+        await self._put(data)
 
     async def on_tool_error(
         self,
@@ -164,7 +304,7 @@ class AgentExecutorAsyncIteratorCallbackHandler(AsyncIteratorCallbackHandler):
             "is_error": True,
         }
 
-        self.queue.put_nowait(dumps(data))
+        await self._put(data)
 
     async def on_agent_action(
         self,
@@ -184,7 +324,7 @@ class AgentExecutorAsyncIteratorCallbackHandler(AsyncIteratorCallbackHandler):
                 "log": action.log,
             },
         }
-        self.queue.put_nowait(dumps(data))
+        await self._put(data)
 
     async def on_agent_finish(
         self,
@@ -209,7 +349,7 @@ class AgentExecutorAsyncIteratorCallbackHandler(AsyncIteratorCallbackHandler):
             },
         }
 
-        self.queue.put_nowait(dumps(data))
+        await self._put(data)
 
     async def on_chain_start(
         self,
@@ -223,6 +363,8 @@ class AgentExecutorAsyncIteratorCallbackHandler(AsyncIteratorCallbackHandler):
         **kwargs: Any,
     ) -> None:
         """Run when chain starts running."""
+        if self._is_nested_chain_start(run_id, parent_run_id):
+            return
         if "agent_scratchpad" in inputs:
             del inputs["agent_scratchpad"]
         if "chat_history" in inputs:
@@ -241,7 +383,7 @@ class AgentExecutorAsyncIteratorCallbackHandler(AsyncIteratorCallbackHandler):
 
         self.done.clear()
         self.out = False
-        self.queue.put_nowait(dumps(data))
+        await self._put(data)
 
     async def on_chain_error(
         self,
@@ -253,12 +395,14 @@ class AgentExecutorAsyncIteratorCallbackHandler(AsyncIteratorCallbackHandler):
         **kwargs: Any,
     ) -> None:
         """Run when chain errors."""
+        if self._is_nested_chain_end(run_id):
+            return
         data = {
             "run_id": str(run_id),
             "status": AgentStatus.error,
             "error": str(error),
         }
-        self.queue.put_nowait(dumps(data))
+        await self._put(data)
 
     async def on_chain_end(
         self,
@@ -269,6 +413,8 @@ class AgentExecutorAsyncIteratorCallbackHandler(AsyncIteratorCallbackHandler):
         tags: List[str] | None = None,
         **kwargs: Any,
     ) -> None:
+        if self._is_nested_chain_end(run_id):
+            return
         if "intermediate_steps" in outputs:
             self.intermediate_steps = outputs["intermediate_steps"]
             self.outputs = outputs
@@ -280,6 +426,6 @@ class AgentExecutorAsyncIteratorCallbackHandler(AsyncIteratorCallbackHandler):
             "parent_run_id": parent_run_id,
             "tags": tags,
         }
-        self.queue.put_nowait(dumps(data))
+        await self._put(data)
         self.out = True
         # self.done.set()
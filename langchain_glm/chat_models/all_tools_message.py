@@ -18,9 +18,8 @@ from langchain_core.messages.tool import (
 )
 from langchain_core.pydantic_v1 import root_validator
 from langchain_core.utils._merge import merge_dicts, merge_lists
-from langchain_core.utils.json import (
-    parse_partial_json,
-)
+
+from langchain_glm.utils.partial_json import cached_parse_partial_json
 
 
 def default_all_tool_chunk_parser(raw_tool_calls: List[dict]) -> List[ToolCallChunk]:
@@ -189,7 +188,7 @@ def _paser_chunk(tool_call_chunks):
     for chunk in tool_call_chunks:
         try:
             if "code_interpreter" in chunk["name"]:
-                args_ = parse_partial_json(chunk["args"])
+                args_ = cached_parse_partial_json(chunk["args"])
 
                 if not isinstance(args_, dict):
                     raise ValueError("Malformed args.")
@@ -213,7 +212,7 @@ def _paser_chunk(tool_call_chunks):
                         )
                     )
             elif "drawing_tool" in chunk["name"]:
-                args_ = parse_partial_json(chunk["args"])
+                args_ = cached_parse_partial_json(chunk["args"])
 
                 if not isinstance(args_, dict):
                     raise ValueError("Malformed args.")
@@ -237,7 +236,7 @@ def _paser_chunk(tool_call_chunks):
                         )
                     )
             elif "web_browser" in chunk["name"]:
-                args_ = parse_partial_json(chunk["args"])
+                args_ = cached_parse_partial_json(chunk["args"])
 
                 if not isinstance(args_, dict):
                     raise ValueError("Malformed args.")
@@ -261,7 +260,7 @@ def _paser_chunk(tool_call_chunks):
                         )
                     )
             else:
-                args_ = parse_partial_json(chunk["args"])
+                args_ = cached_parse_partial_json(chunk["args"])
 
                 if isinstance(args_, dict):
                     temp_args_ = {}
@@ -75,7 +75,6 @@ from langchain_core.utils.function_calling import (
     convert_to_openai_function,
     convert_to_openai_tool,
 )
-from langchain_core.utils.json import parse_partial_json
 from langchain_core.utils.utils import build_extra_kwargs
 from typing_extensions import ClassVar
 from zhipuai.core import PYDANTIC_V2, ConfigDict
@@ -84,6 +83,8 @@ from langchain_glm.chat_models.all_tools_message import (
     ALLToolsMessageChunk,
     _paser_chunk,
 )
+from langchain_glm.utils.partial_json import cached_parse_partial_json
+from langchain_glm.utils.timing import timed
 
 if TYPE_CHECKING:
     from langchain_core.runnables import Runnable, RunnableConfig
@@ -512,13 +513,17 @@ class ChatZhipuAI(BaseChatModel):
                         isinstance(chunk.message, ALLToolsMessageChunk)
                         and chunk.message.content == ""
                     ):
-                        tool_calls, invalid_tool_calls = _paser_chunk(
-                            chunk.message.tool_call_chunks
-                        )
+                        with timed("stream_parse"):
+                            tool_calls, invalid_tool_calls = _paser_chunk(
+                                chunk.message.tool_call_chunks
+                            )
 
                         for chunk_tool in invalid_tool_calls:
                             if isinstance(chunk_tool["args"], str):
-                                args_ = parse_partial_json(chunk_tool["args"])
+                                with timed("stream_parse"):
+                                    args_ = cached_parse_partial_json(
+                                        chunk_tool["args"]
+                                    )
                             else:
                                 args_ = chunk_tool["args"]
                             if not isinstance(args_, dict):
@@ -605,14 +610,18 @@ class ChatZhipuAI(BaseChatModel):
                     isinstance(chunk.message, ALLToolsMessageChunk)
                     and chunk.message.content == ""
                 ):
-                    tool_calls, invalid_tool_calls = _paser_chunk(
-                        chunk.message.tool_call_chunks
-                    )
+                    with timed("stream_parse"):
+                        tool_calls, invalid_tool_calls = _paser_chunk(
+                            chunk.message.tool_call_chunks
+                        )
 
                     for chunk_tool in invalid_tool_calls:
                         if isinstance(chunk_tool["args"], str):
                             try:
-                                args_ = parse_partial_json(chunk_tool["args"])
+                                with timed("stream_parse"):
+                                    args_ = cached_parse_partial_json(
+                                        chunk_tool["args"]
+                                    )
                             except Exception as e:
                                 args_ = {"input": chunk_tool["args"]}
                         else:
@@ -659,33 +668,41 @@ class ChatZhipuAI(BaseChatModel):
         params = {**params, **kwargs, "stream": True}
 
         default_chunk_class = AIMessageChunk
-        for chunk in self.client.create(messages=message_dicts, **params):
-            if not isinstance(chunk, dict):
-                chunk = chunk.dict()
-            if len(chunk["choices"]) == 0:
-                continue
-            choice = chunk["choices"][0]
-            # all_tools chunk load action exec parse tool
-            if params["model"] in [
-                "glm-4-alltools-dev",
-                "tob-alltools-api-dev",
-                "glm-4-alltools",
-            ]:
-                default_chunk_class = ALLToolsMessageChunk
-
-            chunk = _convert_delta_to_message_chunk(
-                choice["delta"], default_chunk_class
-            )
-            generation_info = {}
-            if finish_reason := choice.get("finish_reason"):
-                generation_info["finish_reason"] = finish_reason
-            logprobs = choice.get("logprobs")
-            if logprobs:
-                generation_info["logprobs"] = logprobs
-            default_chunk_class = chunk.__class__
-            chunk = ChatGenerationChunk(
-                message=chunk, generation_info=generation_info or None
-            )
+        with timed("upstream"):
+            response = iter(self.client.create(messages=message_dicts, **params))
+        while True:
+            # the time spent waiting for the api, and decoding its sse stream
+            with timed("upstream"):
+                chunk = next(response, None)
+            if chunk is None:
+                break
+            with timed("stream_parse"):
+                if not isinstance(chunk, dict):
+                    chunk = chunk.dict()
+                if len(chunk["choices"]) == 0:
+                    continue
+                choice = chunk["choices"][0]
+                # all_tools chunk load action exec parse tool
+                if params["model"] in [
+                    "glm-4-alltools-dev",
+                    "tob-alltools-api-dev",
+                    "glm-4-alltools",
+                ]:
+                    default_chunk_class = ALLToolsMessageChunk
+
+                chunk = _convert_delta_to_message_chunk(
+                    choice["delta"], default_chunk_class
+                )
+                generation_info = {}
+                if finish_reason := choice.get("finish_reason"):
+                    generation_info["finish_reason"] = finish_reason
+                logprobs = choice.get("logprobs")
+                if logprobs:
+                    generation_info["logprobs"] = logprobs
+                default_chunk_class = chunk.__class__
+                chunk = ChatGenerationChunk(
+                    message=chunk, generation_info=generation_info or None
+                )
             if run_manager:
                 run_manager.on_llm_new_token(chunk.text, chunk=chunk, logprobs=logprobs)
             yield chunk
@@ -710,7 +727,8 @@ class ChatZhipuAI(BaseChatModel):
             **({"stream": stream} if stream is not None else {}),
             **kwargs,
         }
-        response = self.client.create(messages=message_dicts, **params)
+        with timed("upstream"):
+            response = self.client.create(messages=message_dicts, **params)
         return self._create_chat_result(response)
 
     def _create_message_dicts(
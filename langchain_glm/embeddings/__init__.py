@@ -1,4 +1,10 @@
 # -*- coding: utf-8 -*-
+from langchain_glm.embeddings.base import ZhipuAIEmbeddings
+from langchain_glm.embeddings.batching import AdaptiveBatcher
+from langchain_glm.embeddings.cache import EmbeddingCache
+
 __all__ = [
-    "ZhipuAIAIEmbeddings",
+    "AdaptiveBatcher",
+    "EmbeddingCache",
+    "ZhipuAIEmbeddings",
 ]
@@ -1,13 +1,22 @@
 # -*- coding: utf-8 -*-
 from __future__ import annotations
 
+import asyncio
 import logging
 import os
+import threading
+import time
+import unicodedata
 import warnings
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import lru_cache
 from typing import (
     Any,
+    Deque,
     Dict,
     Iterable,
+    Iterator,
     List,
     Literal,
     Mapping,
@@ -19,24 +28,69 @@ from typing import (
     cast,
 )
 
+import numpy as np
 import zhipuai
 from langchain_core.embeddings import Embeddings
 from langchain_core.pydantic_v1 import (
     BaseModel,
     Extra,
     Field,
+    PrivateAttr,
     SecretStr,
     root_validator,
 )
+from langchain_core.runnables.config import run_in_executor
 from langchain_core.utils import (
     convert_to_secret_str,
     get_from_dict_or_env,
     get_pydantic_field_names,
 )
 
+from langchain_glm.embeddings.batching import AdaptiveBatcher
+from langchain_glm.embeddings.cache import EmbeddingCache
+
 logger = logging.getLogger(__name__)
 
 
+@lru_cache(maxsize=None)
+def _tiktoken_encoding(name: str) -> Any:
+    try:
+        import tiktoken
+
+        return tiktoken.get_encoding(name)
+    except Exception:
+        return None
+
+
+def _dedup_key(text: str) -> str:
+    return unicodedata.normalize("NFC", text).strip()
+
+
+class DedupStats:
+    """Texts asked for and distinct texts embedded by an embeddings instance."""
+
+    def __init__(self) -> None:
+        self.texts = 0
+        self.embedded = 0
+        self._lock = threading.Lock()
+
+    def add(self, texts: int, embedded: int) -> None:
+        with self._lock:
+            self.texts += texts
+            self.embedded += embedded
+
+    @property
+    def ratio(self) -> float:
+        """Share of the texts that were duplicates and not embedded again."""
+        return 1 - self.embedded / self.texts if self.texts else 0.0
+
+    def __repr__(self) -> str:
+        return (
+            f"DedupStats(texts={self.texts}, embedded={self.embedded}, "
+            f"ratio={self.ratio:.3f})"
+        )
+
+
 class ZhipuAIEmbeddings(BaseModel, Embeddings):
     """ZhipuAI embedding models.
 
@@ -61,12 +115,23 @@ class ZhipuAIEmbeddings(BaseModel, Embeddings):
         emulator."""
     zhipuai_proxy: Optional[str] = None
     embedding_ctx_length: int = 8191
-    """The maximum number of tokens to embed at once."""
+    """The maximum number of tokens to embed at once, longer texts are split and
+        the embeddings of the pieces averaged."""
+    tiktoken_enabled: bool = True
+    """Count tokens with tiktoken, when disabled or tiktoken is not available
+        every character counts as a token."""
+    tiktoken_encoding: str = "cl100k_base"
+    """tiktoken encoding used to count tokens."""
     zhipuai_api_key: Optional[SecretStr] = Field(default=None, alias="api_key")
     """Automatically inferred from env var `OPENAI_API_KEY` if not provided."""
 
     chunk_size: int = 1000
     """Maximum number of texts to embed in each batch"""
+    max_batch_tokens: Optional[int] = None
+    """Maximum number of tokens in each batch, ``8 * embedding_ctx_length`` when
+        None."""
+    max_concurrency: int = 4
+    """Maximum number of batch requests in flight at once."""
     max_retries: int = 2
     """Maximum number of retries to make when generating."""
     request_timeout: Optional[Union[float, Tuple[float, float], Any]] = Field(
@@ -82,6 +147,16 @@ class ZhipuAIEmbeddings(BaseModel, Embeddings):
     """Holds any model parameters valid for `create` call not explicitly specified."""
     http_client: Union[Any, None] = None
     """Optional httpx.Client."""
+    cache: Optional[EmbeddingCache] = Field(default=None, exclude=True)
+    """Cache of the embeddings, only texts missing from it reach the API."""
+    adaptive_batcher: Optional[AdaptiveBatcher] = Field(default=None, exclude=True)
+    """Adapts the token budget of the batches to the observed latency and splits
+        batches the API rejects as too large."""
+    deduplicate: bool = True
+    """Embed every distinct text of a call once, texts equal after unicode NFC
+        normalization and stripping of surrounding whitespace are duplicates."""
+
+    _dedup_stats: DedupStats = PrivateAttr(default_factory=DedupStats)
 
 
     class Config:
@@ -89,6 +164,7 @@ class ZhipuAIEmbeddings(BaseModel, Embeddings):
 
         extra = Extra.forbid
         allow_population_by_field_name = True
+        arbitrary_types_allowed = True
 
     @root_validator(pre=True, allow_reuse=True)
     def build_extra(cls, values: Dict[str, Any]) -> Dict[str, Any]:
@@ -154,11 +230,215 @@ class ZhipuAIEmbeddings(BaseModel, Embeddings):
             values["client"] = zhipuai.ZhipuAI(**client_params).embeddings
         return values
 
+    @property
+    def dedup_stats(self) -> DedupStats:
+        """Deduplication counts over all calls of this instance."""
+        return self._dedup_stats
+
+    def _dedupe(self, texts: List[str]) -> Tuple[List[int], List[int]]:
+        """Positions of the first occurrence of every distinct text, and for
+        every text the index of its first occurrence in that list."""
+        if not self.deduplicate:
+            positions = list(range(len(texts)))
+            return positions, positions
+        firsts: List[int] = []
+        inverse: List[int] = []
+        seen: Dict[str, int] = {}
+        for i, text in enumerate(texts):
+            key = _dedup_key(text)
+            if key not in seen:
+                seen[key] = len(firsts)
+                firsts.append(i)
+            inverse.append(seen[key])
+        self._dedup_stats.add(len(texts), len(firsts))
+        if len(firsts) < len(texts):
+            logger.debug(
+                f"embedding {len(firsts)} distinct of {len(texts)} texts, "
+                f"{self._dedup_stats}"
+            )
+        return firsts, inverse
+
+    @staticmethod
+    def _scatter(
+        embeddings: List[List[float]], inverse: List[int]
+    ) -> List[List[float]]:
+        if len(embeddings) == len(inverse):
+            return embeddings
+        scattered: List[List[float]] = []
+        used: Set[int] = set()
+        for j in inverse:
+            # duplicates get their own copy of the list
+            scattered.append(list(embeddings[j]) if j in used else embeddings[j])
+            used.add(j)
+        return scattered
+
     @property
     def _invocation_params(self) -> Dict[str, Any]:
         params: Dict = {"model": self.model, **self.model_kwargs}
         return params
 
+    def _progress(self, iterable: Iterable, total: Optional[int] = None) -> Iterable:
+        if self.show_progress_bar:
+            try:
+                from tqdm.auto import tqdm
+
+                return tqdm(iterable, total=total)
+            except ImportError:
+                pass
+        return iterable
+
+    def _embed_batch(self, batch: List[str]) -> List[List[float]]:
+        """Embed one batch, retries are left to the client's ``max_retries``."""
+        response = self.client.create(input=batch, **self._invocation_params)
+        if not isinstance(response, dict):
+            response = response.dict()
+        return [r["embedding"] for r in response["data"]]
+
+    def _tokenize(self, texts: List[str]) -> Tuple[List[str], List[int], List[int]]:
+        """Split the texts into pieces of at most ``embedding_ctx_length`` tokens.
+
+        Returns:
+            The pieces, the index of the text of every piece and its token count.
+        """
+        encoding = (
+            _tiktoken_encoding(self.tiktoken_encoding)
+            if self.tiktoken_enabled
+            else None
+        )
+        pieces: List[str] = []
+        owners: List[int] = []
+        weights: List[int] = []
+        for i, text in enumerate(texts):
+            tokens: Sequence = (
+                encoding.encode(text, disallowed_special=())
+                if encoding is not None
+                else text
+            )
+            if len(tokens) <= self.embedding_ctx_length:
+                pieces.append(text)
+                owners.append(i)
+                weights.append(max(len(tokens), 1))
+                continue
+            for j in range(0, len(tokens), self.embedding_ctx_length):
+                window = tokens[j : j + self.embedding_ctx_length]
+                pieces.append(
+                    encoding.decode(window) if encoding is not None else window
+                )
+                owners.append(i)
+                weights.append(len(window))
+        return pieces, owners, weights
+
+    def _pack_batches(
+        self, weights: List[int], chunk_size: Optional[int] = None
+    ) -> Iterator[Tuple[int, int]]:
+        """Group consecutive pieces into ``(start, end)`` batches.
+
+        A batch holds at most ``chunk_size`` pieces and at most
+        ``max_batch_tokens`` tokens, ``8 * embedding_ctx_length`` by default, or
+        the budget of the ``adaptive_batcher``.
+        Batches are packed lazily, each one with the budget of the moment.
+        """
+        _chunk_size = chunk_size or self.chunk_size
+        max_batch_tokens = self.max_batch_tokens or 8 * self.embedding_ctx_length
+        start = 0
+        while start < len(weights):
+            token_limit = max_batch_tokens
+            if self.adaptive_batcher is not None:
+                token_limit = min(token_limit, self.adaptive_batcher.budget)
+            end = start + 1
+            tokens = weights[start]
+            while (
+                end < len(weights)
+                and end - start < _chunk_size
+                and tokens + weights[end] <= token_limit
+            ):
+                tokens += weights[end]
+                end += 1
+            yield start, end
+            start = end
+
+    @staticmethod
+    def _combine(
+        embeddings: List[List[float]], owners: List[int], weights: List[int]
+    ) -> List[List[float]]:
+        """Average the embeddings of the pieces of every text by token count."""
+        if len(embeddings) == len(set(owners)):
+            return embeddings
+        grouped: Dict[int, List[int]] = {}
+        for piece, owner in enumerate(owners):
+            grouped.setdefault(owner, []).append(piece)
+        combined: List[List[float]] = []
+        for owner in sorted(grouped):
+            indices = grouped[owner]
+            if len(indices) == 1:
+                combined.append(embeddings[indices[0]])
+                continue
+            average = np.average(
+                [embeddings[i] for i in indices],
+                axis=0,
+                weights=[weights[i] for i in indices],
+            )
+            combined.append((average / np.linalg.norm(average)).tolist())
+        return combined
+
+    def _embed_pieces(
+        self, batch: List[str], batch_weights: List[int], depth: int = 0
+    ) -> List[List[float]]:
+        """Embed one batch, splitting it when the API rejects its size."""
+        if self.adaptive_batcher is None:
+            return self._embed_batch(batch)
+        started = time.monotonic()
+        try:
+            embeddings = self._embed_batch(batch)
+        except Exception as e:
+            if (
+                len(batch) < 2
+                or depth >= self.adaptive_batcher.max_split_depth
+                or not self.adaptive_batcher.is_oversized(e)
+            ):
+                raise
+            self.adaptive_batcher.observe_error(sum(batch_weights), e)
+            half = len(batch) // 2
+            return self._embed_pieces(
+                batch[:half], batch_weights[:half], depth + 1
+            ) + self._embed_pieces(batch[half:], batch_weights[half:], depth + 1)
+        self.adaptive_batcher.observe(sum(batch_weights), time.monotonic() - started)
+        return embeddings
+
+    def _iter_batch_embeddings(
+        self, pieces: List[str], weights: List[int], chunk_size: Optional[int] = None
+    ) -> Iterator[List[List[float]]]:
+        """Embed the pieces batch by batch, yielding the batches in order."""
+
+        def embed(batch: Tuple[int, int]) -> List[List[float]]:
+            start, end = batch
+            return self._embed_pieces(pieces[start:end], weights[start:end])
+
+        batches = self._pack_batches(weights, chunk_size)
+        if len(pieces) < 2 or self.max_concurrency < 2:
+            yield from self._progress(map(embed, batches))
+            return
+
+        def ordered() -> Iterator[List[List[float]]]:
+            # a window of requests in flight, results are yielded in the order
+            # of the batches whichever request finishes first
+            inflight: Deque[Future] = deque()
+            executor = ThreadPoolExecutor(max_workers=self.max_concurrency)
+            try:
+                for batch in batches:
+                    inflight.append(executor.submit(embed, batch))
+                    if len(inflight) >= self.max_concurrency:
+                        yield inflight.popleft().result()
+                while inflight:
+                    yield inflight.popleft().result()
+            finally:
+                # shutdown(cancel_futures=True) needs python 3.9
+                for future in inflight:
+                    future.cancel()
+                executor.shutdown()
+
+        yield from self._progress(ordered())
+
     def _get_len_safe_embeddings(
         self, texts: List[str], *, chunk_size: Optional[int] = None
     ) -> List[List[float]]:
@@ -171,29 +451,151 @@ class ZhipuAIEmbeddings(BaseModel, Embeddings):
         Returns:
             List[List[float]]: A list of embeddings for each input text.
         """
+        firsts, inverse = self._dedupe(texts)
+        pieces, owners, weights = self._tokenize([texts[i] for i in firsts])
+        batched_embeddings: List[List[float]] = []
+        for embeddings in self._iter_batch_embeddings(pieces, weights, chunk_size):
+            batched_embeddings.extend(embeddings)
+        return self._scatter(
+            self._combine(batched_embeddings, owners, weights), inverse
+        )
 
-        _chunk_size = chunk_size or self.chunk_size
-
-        if self.show_progress_bar:
-            try:
-                from tqdm.auto import tqdm
+    async def _aget_len_safe_embeddings(
+        self, texts: List[str], *, chunk_size: Optional[int] = None
+    ) -> List[List[float]]:
+        """Async version of :meth:`_get_len_safe_embeddings`."""
+        firsts, inverse = self._dedupe(texts)
+        pieces, owners, weights = self._tokenize([texts[i] for i in firsts])
+        batches = enumerate(self._pack_batches(weights, chunk_size))
+        embedded: Dict[int, List[List[float]]] = {}
+
+        async def worker() -> None:
+            # the workers share the lazy batch iterator
+            for index, (start, end) in batches:
+                embedded[index] = await run_in_executor(
+                    None, self._embed_pieces, pieces[start:end], weights[start:end]
+                )
 
-                _iter: Iterable = tqdm(range(0, len(texts), _chunk_size))
-            except ImportError:
-                _iter = range(0, len(texts), _chunk_size)
-        else:
-            _iter = range(0, len(texts), _chunk_size)
+        workers = [
+            asyncio.ensure_future(worker()) for _ in range(max(self.max_concurrency, 1))
+        ]
+        try:
+            await asyncio.gather(*workers)
+        except BaseException:
+            for task in workers:
+                task.cancel()
+            raise
+        results = [embedded[index] for index in range(len(embedded))]
+        combined = self._combine(
+            [embedding for embeddings in results for embedding in embeddings],
+            owners,
+            weights,
+        )
+        return self._scatter(combined, inverse)
+
+    def _cache_lookup(
+        self, texts: List[str]
+    ) -> Tuple[List[str], List[Optional[List[float]]], List[int]]:
+        """Cache keys and cached embeddings of the texts and the missing positions."""
+        keys = [
+            EmbeddingCache.make_key(self.model, self.model_kwargs, text)
+            for text in texts
+        ]
+        embeddings = self.cache.mget(keys)
+        missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+        return keys, embeddings, missing
+
+    def embed_documents_into(
+        self,
+        texts: List[str],
+        out: Optional[np.ndarray] = None,
+        *,
+        offset: int = 0,
+        chunk_size: Optional[int] = 0,
+        normalize: bool = False,
+    ) -> np.ndarray:
+        """Embed texts into the rows of a float32 array.
+
+        The rows are filled batch by batch as the responses arrive, the
+        embeddings never exist as Python lists of floats all at once.
 
-        batched_embeddings: List[List[float]] = []
-        for i in _iter:
-            response = self.client.create(
-                input=texts[i : i + _chunk_size], **self._invocation_params
-            )
-            if not isinstance(response, dict):
-                response = response.dict()
-            batched_embeddings.extend(r["embedding"] for r in response["data"])
+        Args:
+            texts: The list of texts to embed.
+            out: Array receiving the embedding of ``texts[i]`` in row
+                ``offset + i``, for example a ``numpy.memmap``. A new array
+                is allocated when None.
+            offset: First row of ``out`` to write.
+            chunk_size: The chunk size of embeddings. If None, will use the chunk
+                size specified by the class.
+            normalize: Scale every embedding to unit length.
 
-        return batched_embeddings
+        Returns:
+            The ``len(texts)`` rows holding the embeddings.
+        """
+        rows: Optional[np.ndarray] = None
+        if out is not None:
+            if out.shape[0] < offset + len(texts):
+                raise ValueError(
+                    f"out has {out.shape[0]} rows, {offset + len(texts)} are needed"
+                )
+            rows = out[offset : offset + len(texts)]
+
+        def write(i: int, embedding: Sequence[float]) -> None:
+            nonlocal rows
+            if rows is None:
+                rows = np.zeros((len(texts), len(embedding)), dtype=np.float32)
+            rows[i] = embedding
+
+        todo = list(range(len(texts)))
+        keys: List[str] = []
+        if self.cache is not None:
+            keys, cached, todo = self._cache_lookup(texts)
+            for i, embedding in enumerate(cached):
+                if embedding is not None:
+                    write(i, embedding)
+
+        firsts, inverse = self._dedupe([texts[i] for i in todo])
+        duplicates = [
+            (todo[i], todo[firsts[j]]) for i, j in enumerate(inverse) if firsts[j] != i
+        ]
+        todo = [todo[i] for i in firsts]
+
+        pieces, owners, weights = self._tokenize([texts[i] for i in todo])
+        piece_counts: Dict[int, int] = {}
+        for owner in owners:
+            piece_counts[owner] = piece_counts.get(owner, 0) + 1
+        split = {owner for owner, count in piece_counts.items() if count > 1}
+
+        started: Set[int] = set()
+        piece = 0
+        for embeddings in self._iter_batch_embeddings(pieces, weights, chunk_size):
+            for embedding in embeddings:
+                owner = owners[piece]
+                if owner not in split:
+                    write(todo[owner], embedding)
+                else:
+                    # weighted sum of the pieces, normalized below
+                    weighted = weights[piece] * np.asarray(embedding, np.float32)
+                    if owner in started:
+                        rows[todo[owner]] += weighted
+                    else:
+                        write(todo[owner], weighted)
+                        started.add(owner)
+                piece += 1
+        for owner in split:
+            row = todo[owner]
+            rows[row] /= np.linalg.norm(rows[row])
+        for row, first in duplicates:
+            rows[row] = rows[first]
+
+        if rows is None:
+            rows = np.zeros((0, 0), dtype=np.float32)
+        if self.cache is not None and todo:
+            self.cache.mset([(keys[i], rows[i].tolist()) for i in todo])
+        if normalize and len(rows):
+            norms = np.linalg.norm(rows, axis=1, keepdims=True)
+            np.divide(rows, norms, out=rows, where=norms > 0)
+        return rows
 
     def embed_documents(
         self, texts: List[str], chunk_size: Optional[int] = 0
@@ -208,7 +610,18 @@ class ZhipuAIEmbeddings(BaseModel, Embeddings):
         Returns:
             List of embeddings, one for each text.
         """
-        return self._get_len_safe_embeddings(texts)
+        if self.cache is None:
+            return self._get_len_safe_embeddings(texts, chunk_size=chunk_size)
+
+        keys, embeddings, missing = self._cache_lookup(texts)
+        if missing:
+            computed = self._get_len_safe_embeddings(
+                [texts[i] for i in missing], chunk_size=chunk_size
+            )
+            self.cache.mset([(keys[i], computed[j]) for j, i in enumerate(missing)])
+            for j, i in enumerate(missing):
+                embeddings[i] = computed[j]
+        return cast(List[List[float]], embeddings)
 
     def embed_query(self, text: str) -> List[float]:
         """Call out to OpenAI's embedding endpoint for embedding query text.
@@ -220,3 +633,46 @@ class ZhipuAIEmbeddings(BaseModel, Embeddings):
             Embedding for the text.
         """
         return self.embed_documents([text])[0]
+
+    async def aembed_documents(
+        self, texts: List[str], chunk_size: Optional[int] = 0
+    ) -> List[List[float]]:
+        """Asynchronous call out to the embedding endpoint for embedding search docs.
+
+        Args:
+            texts: The list of texts to embed.
+            chunk_size: The chunk size of embeddings. If None, will use the chunk size
+                specified by the class.
+
+        Returns:
+            List of embeddings, one for each text.
+        """
+        if self.cache is None:
+            return await self._aget_len_safe_embeddings(texts, chunk_size=chunk_size)
+
+        keys, embeddings, missing = await run_in_executor(
+            None, self._cache_lookup, texts
+        )
+        if missing:
+            computed = await self._aget_len_safe_embeddings(
+                [texts[i] for i in missing], chunk_size=chunk_size
+            )
+            await run_in_executor(
+                None,
+                self.cache.mset,
+                [(keys[i], computed[j]) for j, i in enumerate(missing)],
+            )
+            for j, i in enumerate(missing):
+                embeddings[i] = computed[j]
+        return cast(List[List[float]], embeddings)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        """Asynchronous call out to the embedding endpoint for embedding query text.
+
+        Args:
+            text: The text to embed.
+
+        Returns:
+            Embedding for the text.
+        """
+        return (await self.aembed_documents([text]))[0]
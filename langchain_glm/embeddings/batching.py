@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+"""Size embedding batches by tokens from the observed request latency."""
+import logging
+import threading
+from typing import Optional
+
+import zhipuai
+
+logger = logging.getLogger(__name__)
+
+# error code of the platform for an input over the length limit
+_SIZE_ERROR_CODES = {"1261"}
+_SIZE_ERROR_HINTS = (
+    "too long",
+    "too large",
+    "too many",
+    "exceed",
+    "超长",
+    "过长",
+    "超过",
+)
+
+
+class AdaptiveBatcher:
+    """Token budget of the next embedding batch.
+
+    The budget grows while batches come back faster than ``target_latency``
+    and shrinks when they are slower or the API rejects them. A batch
+    rejected for its size is split in halves and retried, at most
+    ``max_split_depth`` times in a row, other errors are raised right away.
+    """
+
+    def __init__(
+        self,
+        min_tokens: int = 512,
+        max_tokens: int = 65536,
+        initial_tokens: int = 8192,
+        target_latency: float = 2.0,
+        grow_factor: float = 1.5,
+        shrink_factor: float = 0.5,
+        max_split_depth: int = 4,
+    ):
+        """
+        Args:
+            min_tokens: Lower bound of the budget.
+            max_tokens: Upper bound of the budget.
+            initial_tokens: Budget of the first batches.
+            target_latency: Seconds a batch request should take.
+            grow_factor: Budget multiplier after a fast full batch.
+            shrink_factor: Budget multiplier after an error, slow batches shrink
+                the budget in proportion to their latency.
+            max_split_depth: Times a rejected batch is halved before the error
+                is raised.
+        """
+        if not 0 < min_tokens <= max_tokens:
+            raise ValueError("min_tokens must be positive and at most max_tokens")
+        self.min_tokens = min_tokens
+        self.max_tokens = max_tokens
+        self.target_latency = target_latency
+        self.grow_factor = grow_factor
+        self.shrink_factor = shrink_factor
+        self.max_split_depth = max_split_depth
+        self._budget = float(min(max(initial_tokens, min_tokens), max_tokens))
+        self._lock = threading.Lock()
+        self.splits = 0
+
+    @property
+    def budget(self) -> int:
+        return int(self._budget)
+
+    def _set(self, budget: float) -> None:
+        self._budget = min(max(budget, self.min_tokens), self.max_tokens)
+
+    def observe(self, tokens: int, latency: float) -> None:
+        """Adapt the budget to a successful batch of ``tokens`` tokens."""
+        with self._lock:
+            if latency > self.target_latency:
+                self._set(self._budget * max(self.target_latency / latency, 0.5))
+            elif latency < self.target_latency / 2 and tokens >= self._budget / 2:
+                # only batches that used the budget tell something about it
+                self._set(self._budget * self.grow_factor)
+
+    def observe_error(self, tokens: int, error: BaseException) -> None:
+        with self._lock:
+            self.splits += 1
+            self._set(min(self._budget, tokens) * self.shrink_factor)
+        logger.warning(
+            f"embedding batch of {tokens} tokens failed ({error!r}), "
+            f"splitting it, next batches use {self.budget} tokens"
+        )
+
+    @staticmethod
+    def is_oversized(error: BaseException) -> bool:
+        """Whether the API rejected the batch for its size, splitting it may
+        get it through.
+
+        Timeouts are left to the retries of the client, a 400 only counts when
+        its code or message is about the input size.
+        """
+        if not isinstance(error, zhipuai.APIStatusError):
+            return False
+        if error.status_code == 413:
+            return True
+        if error.status_code != 400:
+            return False
+        code: Optional[str] = None
+        try:
+            code = str(error.response.json()["error"]["code"])
+        except Exception:
+            pass
+        if code in _SIZE_ERROR_CODES:
+            return True
+        message = str(error).lower()
+        return any(hint in message for hint in _SIZE_ERROR_HINTS)
@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+"""Content addressed cache of embeddings, so unchanged texts are embedded once."""
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# sqlite limits the number of parameters of a statement
+_SQLITE_BATCH = 500
+
+
+class EmbeddingCache:
+    """Embeddings keyed by the hash of (model, model kwargs, text).
+
+    A size bounded in memory LRU answers repeated queries, the optional sqlite
+    file keeps the embeddings across processes and restarts. Vectors are
+    stored as float32.
+    """
+
+    def __init__(self, path: Optional[str] = None, max_size: int = 10000):
+        """
+        Args:
+            path: sqlite file of the persistent tier, ``None`` keeps the
+                embeddings in memory only.
+            max_size: Number of embeddings kept in memory.
+        """
+        self.path = path
+        self.max_size = max_size
+        self._memory: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        if path is not None:
+            directory = os.path.dirname(os.path.abspath(path))
+            os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings "
+                "(key TEXT PRIMARY KEY, vector BLOB NOT NULL)"
+            )
+            self._conn.commit()
+        self.hits = 0
+        self.misses = 0
+
+    def __deepcopy__(self, memo: Dict[int, Any]) -> "EmbeddingCache":
+        # shared between copies of the embeddings holding it
+        return self
+
+    @staticmethod
+    def make_key(model: str, model_kwargs: Dict[str, Any], text: str) -> str:
+        payload = json.dumps(
+            [model, model_kwargs, text],
+            ensure_ascii=False,
+            sort_keys=True,
+            separators=(",", ":"),
+            default=str,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _remember(self, key: str, vector: List[float]) -> None:
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_size:
+            self._memory.popitem(last=False)
+
+    def mget(self, keys: Sequence[str]) -> List[Optional[List[float]]]:
+        """The cached embedding of every key, ``None`` for a miss."""
+        found: Dict[str, List[float]] = {}
+        with self._lock:
+            for key in keys:
+                vector = self._memory.get(key)
+                if vector is not None:
+                    self._memory.move_to_end(key)
+                    found[key] = list(vector)
+            missing = list({key: None for key in keys if key not in found})
+            if self._conn is not None and missing:
+                for i in range(0, len(missing), _SQLITE_BATCH):
+                    batch = missing[i : i + _SQLITE_BATCH]
+                    rows = self._conn.execute(
+                        "SELECT key, vector FROM embeddings WHERE key IN "
+                        f"({','.join('?' * len(batch))})",
+                        batch,
+                    ).fetchall()
+                    for key, blob in rows:
+                        vector = np.frombuffer(blob, dtype=np.float32).tolist()
+                        found[key] = vector
+                        self._remember(key, vector)
+            results = [found.get(key) for key in keys]
+            hits = sum(vector is not None for vector in results)
+            self.hits += hits
+            self.misses += len(results) - hits
+        return results
+
+    def mset(self, items: Sequence[Tuple[str, List[float]]]) -> None:
+        with self._lock:
+            for key, vector in items:
+                self._remember(key, list(vector))
+            if self._conn is not None and items:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)",
+                    [
+                        (key, np.asarray(vector, dtype=np.float32).tobytes())
+                        for key, vector in items
+                    ],
+                )
+                self._conn.commit()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._memory.clear()
+            if self._conn is not None:
+                self._conn.execute("DELETE FROM embeddings")
+                self._conn.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
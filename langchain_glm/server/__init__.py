@@ -0,0 +1,15 @@
+# -*- coding: utf-8 -*-
+from langchain_glm.server.app import create_app
+from langchain_glm.server.client import ChatEvent, SSEParser, ZhipuAIPluginsClient
+from langchain_glm.server.pool import PoolBusyError, RunnablePool
+from langchain_glm.server.settings import ServerSettings
+
+__all__ = [
+    "create_app",
+    "RunnablePool",
+    "PoolBusyError",
+    "ServerSettings",
+    "ZhipuAIPluginsClient",
+    "ChatEvent",
+    "SSEParser",
+]
@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+"""Run the agent server: ``python -m langchain_glm.server --workers 4``."""
+import argparse
+import logging
+import os
+
+from langchain_glm.server.settings import ServerSettings
+
+logger = logging.getLogger(__name__)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        prog="python -m langchain_glm.server",
+        description="Serve ZhipuAIAllToolsRunnable over server-sent events.",
+    )
+    parser.add_argument("--host")
+    parser.add_argument("--port", type=int)
+    parser.add_argument("--workers", type=int)
+    parser.add_argument("--loop", help="uvicorn event loop, auto prefers uvloop")
+    parser.add_argument("--model-name")
+    parser.add_argument("--runnable-factory", help="module:callable")
+    parser.add_argument("--pool-size", type=int)
+    parser.add_argument("--max-concurrent-streams", type=int)
+    parser.add_argument("--acquire-timeout", type=float)
+    parser.add_argument("--ping-interval", type=float)
+    parser.add_argument("--session-store-path")
+    parser.add_argument("--log-level")
+    args = parser.parse_args()
+
+    overrides = {k: v for k, v in vars(args).items() if v is not None}
+    settings = ServerSettings.from_env(**overrides)
+    # the worker processes build their application from the environment
+    os.environ.update(settings.to_env())
+
+    try:
+        import uvicorn
+    except ImportError as e:
+        raise ImportError(
+            "The server requires uvicorn, install it with `pip install uvicorn`."
+        ) from e
+
+    uvicorn.run(
+        "langchain_glm.server.app:create_app",
+        factory=True,
+        host=settings.host,
+        port=settings.port,
+        workers=settings.workers,
+        loop=settings.loop,
+        log_level=settings.log_level,
+        timeout_graceful_shutdown=5,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,322 @@
+# -*- coding: utf-8 -*-
+"""FastAPI application streaming the events of a ZhipuAIAllToolsRunnable.
+
+fastapi is imported when an application is created, the rest of the package
+does not need it.
+"""
+import asyncio
+import importlib
+import json
+import logging
+import uuid
+from contextlib import asynccontextmanager
+from typing import TYPE_CHECKING, Any, AsyncIterator, Callable, Dict, List, Optional
+
+from langchain_core.runnables.config import run_in_executor
+
+from langchain_glm.agents.tool_cache import ToolResultCache
+from langchain_glm.agents.zhipuai_all_tools import (
+    AllToolsBaseComponent,
+    AllToolsLLMStatus,
+    BaseSessionStore,
+    InMemorySessionStore,
+    SQLiteSessionStore,
+    ZhipuAIAllToolsRunnable,
+)
+from langchain_glm.callbacks.agent_callback_handler import AgentStatus
+from langchain_glm.server.pool import PoolBusyError, RunnablePool
+from langchain_glm.server.replay import (
+    ReplayGapError,
+    RunBuffer,
+    RunRegistry,
+    format_event_id,
+    parse_event_id,
+)
+from langchain_glm.server.settings import ServerSettings
+from langchain_glm.server.sse import with_pings
+from langchain_glm.server.wire import WireFormat, negotiate
+from langchain_glm.utils.profiling import RunProfiler
+from langchain_glm.utils.timing import logging_sink
+
+if TYPE_CHECKING:
+    from fastapi import FastAPI
+
+logger = logging.getLogger(__name__)
+
+RunnableFactory = Callable[..., ZhipuAIAllToolsRunnable]
+
+
+def _import_factory(path: str) -> RunnableFactory:
+    module_name, _, attr = path.partition(":")
+    if not attr:
+        raise ValueError(f"runnable_factory must look like 'module:callable': {path}")
+    return getattr(importlib.import_module(module_name), attr)
+
+
+def create_session_store(settings: ServerSettings) -> BaseSessionStore:
+    if settings.session_store_path:
+        return SQLiteSessionStore(settings.session_store_path, ttl=settings.session_ttl)
+    if settings.workers > 1:
+        logger.warning(
+            "sessions are kept in the memory of every worker, set "
+            "session_store_path or route the requests of a session to one worker"
+        )
+    return InMemorySessionStore(
+        max_sessions=settings.max_sessions, ttl=settings.session_ttl
+    )
+
+
+def create_runnable_pool(
+    settings: ServerSettings, session_store: BaseSessionStore
+) -> RunnablePool:
+    """Pool of the runnables of one worker, all of them share ``session_store``
+    and one tool result cache."""
+    if settings.runnable_factory:
+        factory = _import_factory(settings.runnable_factory)
+
+        def build() -> ZhipuAIAllToolsRunnable:
+            return factory(session_store=session_store)
+
+    else:
+        tool_cache = ToolResultCache()
+        profiler = None
+        if settings.profile_dir:
+            profiler = RunProfiler(
+                settings.profile_dir,
+                sample_rate=settings.profile_sample_rate,
+                interval=settings.profile_interval,
+            )
+
+        def build() -> ZhipuAIAllToolsRunnable:
+            return ZhipuAIAllToolsRunnable.create_agent_executor(
+                model_name=settings.model_name,
+                tools=[{"type": name} for name in settings.builtin_tools],
+                max_queue_size=settings.max_queue_size,
+                session_store=session_store,
+                tool_cache=tool_cache,
+                timing=settings.timing,
+                timing_sink=logging_sink,
+                profiler=profiler,
+            )
+
+    return RunnablePool(
+        build, size=settings.pool_size, max_concurrency=settings.max_concurrent_streams
+    )
+
+
+def create_app(
+    settings: Optional[ServerSettings] = None,
+    pool: Optional[RunnablePool] = None,
+    session_store: Optional[BaseSessionStore] = None,
+) -> "FastAPI":
+    """Create the server application.
+
+    Without arguments the settings are read from the environment, this is how
+    the worker processes started by ``python -m langchain_glm.server`` build
+    their application.
+
+    Args:
+        settings: Server configuration.
+        pool: Runnables serving the streams, built from ``settings`` if not
+            given.
+        session_store: Where the sessions live, it must be the store of the
+            runnables of ``pool``.
+    """
+    try:
+        from fastapi import Body, FastAPI, HTTPException, Request
+        from fastapi.middleware.cors import CORSMiddleware
+        from fastapi.responses import StreamingResponse
+    except ImportError as e:
+        raise ImportError(
+            "The server requires fastapi and uvicorn, "
+            "install them with `pip install fastapi uvicorn`."
+        ) from e
+
+    settings = settings or ServerSettings.from_env()
+    if pool is None:
+        session_store = session_store or create_session_store(settings)
+        pool = create_runnable_pool(settings, session_store)
+    runs = RunRegistry(
+        max_runs=settings.replay_max_runs,
+        max_events=settings.replay_max_events,
+        ttl=settings.replay_ttl,
+    )
+
+    @asynccontextmanager
+    async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+        # build the runnables before the first request arrives
+        await run_in_executor(None, pool.start)
+        eviction = None
+        if (
+            session_store is not None
+            and session_store.ttl is not None
+            and settings.session_evict_interval
+        ):
+            eviction = asyncio.ensure_future(
+                session_store.evict_expired_every(settings.session_evict_interval)
+            )
+        try:
+            yield
+        finally:
+            if eviction is not None:
+                eviction.cancel()
+                await asyncio.gather(eviction, return_exceptions=True)
+            await runs.aclose()
+
+    app = FastAPI(title="langchain-glm", lifespan=lifespan)
+    app.state.settings = settings
+    app.state.pool = pool
+    app.state.session_store = session_store
+    app.state.runs = runs
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=settings.cors_origins,
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+        expose_headers=["X-Run-Id", "X-Session-Id", "X-Event-Format"],
+    )
+
+    def negotiate_wire(request: Request) -> WireFormat:
+        try:
+            return negotiate(
+                request.headers,
+                request.query_params,
+                default=settings.event_format,
+                allow_gzip=settings.compress_streams,
+                max_batch_size=settings.batch_max_size,
+                max_delay=settings.batch_max_delay,
+            )
+        except (ValueError, ImportError) as e:
+            raise HTTPException(status_code=406, detail=str(e)) from e
+
+    def stream_run(wire: WireFormat, run: RunBuffer, after: int) -> StreamingResponse:
+        """Stream the events of ``run`` after number ``after``. Closing the
+        stream leaves the run going."""
+        try:
+            run.check(after)
+        except ReplayGapError as e:
+            raise HTTPException(status_code=410, detail=str(e)) from e
+        frames = with_pings(
+            wire.encode(run.read(after), run.run_id, after),
+            settings.ping_interval,
+            wire.ping,
+        )
+        headers = {
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",
+            "X-Run-Id": run.run_id,
+            **wire.headers,
+        }
+        if run.session_id is not None:
+            headers["X-Session-Id"] = run.session_id
+        return StreamingResponse(
+            wire.compress(frames), media_type=wire.media_type, headers=headers
+        )
+
+    def resume(wire: WireFormat, last_event_id: str) -> StreamingResponse:
+        parsed = parse_event_id(last_event_id)
+        run = parsed and runs.get(parsed[0])
+        if not run:
+            raise HTTPException(
+                status_code=404, detail=f"unknown or expired run: {last_event_id}"
+            )
+        return stream_run(wire, run, parsed[1])
+
+    @app.post("/chat")
+    async def chat(
+        request: Request,
+        query: str = Body(..., description="用户输入", examples=["帮我计算100+1"]),
+        session_id: Optional[str] = Body(None, description="会话ID，为空时创建新会话"),
+        history: List[Dict[str, Any]] = Body(
+            [], description="新会话的历史对话", examples=[[]]
+        ),
+    ) -> StreamingResponse:
+        """Agent 对话，以 SSE 流式返回事件，带 Last-Event-ID 时从断点续传"""
+        wire = negotiate_wire(request)
+        last_event_id = request.headers.get("last-event-id")
+        if last_event_id:
+            return resume(wire, last_event_id)
+
+        session_id = session_id or uuid.uuid4().hex
+        # the run id of the agent executor, also names the run profile
+        run_id = uuid.uuid4()
+        profile = None
+        if request.headers.get("x-profile", "").lower() in ("1", "true", "yes"):
+            profile = True
+        try:
+            lease = await pool.acquire(session_id, timeout=settings.acquire_timeout)
+        except PoolBusyError as e:
+            raise HTTPException(status_code=503, detail=str(e)) from e
+
+        try:
+            runnable = lease.runnable
+            store = runnable.session_store
+            if history and store is not None:
+                known = await run_in_executor(None, store.load, session_id)
+                if known is None:
+                    await run_in_executor(
+                        None, lambda: store.append(session_id, history=history)
+                    )
+            events = runnable.invoke(
+                chat_input=query,
+                config={"run_id": run_id},
+                session_id=session_id,
+                profile=profile if runnable.profiler is not None else None,
+            )
+        except BaseException:
+            lease.release()
+            raise
+
+        async def guarded() -> AsyncIterator[AllToolsBaseComponent]:
+            try:
+                async for event in events:
+                    if event is not None:
+                        yield event
+            except Exception as e:
+                logger.error(f"stream of session {session_id} failed", exc_info=e)
+                yield AllToolsLLMStatus(
+                    run_id=str(run_id),
+                    status=AgentStatus.error,
+                    text=json.dumps(
+                        {"error": f"{e.__class__.__name__}: {e}"}, ensure_ascii=False
+                    ),
+                )
+            finally:
+                lease.release()
+
+        # the run is pumped by a background task, it finishes without client
+        run = runs.start(str(run_id), guarded(), session_id=session_id)
+        return stream_run(wire, run, 0)
+
+    @app.get("/runs/{run_id}/events")
+    async def run_events(
+        request: Request, run_id: str, last_event_id: Optional[int] = None
+    ) -> StreamingResponse:
+        """Reconnect to a run, e.g. from an ``EventSource``, the events after
+        the ``Last-Event-ID`` header or the ``last_event_id`` number are sent."""
+        wire = negotiate_wire(request)
+        header = request.headers.get("last-event-id")
+        if header:
+            return resume(wire, header)
+        return resume(wire, format_event_id(run_id, last_event_id or 0))
+
+    @app.delete("/sessions/{session_id}")
+    async def delete_session(session_id: str) -> Dict[str, Any]:
+        store = session_store
+        if store is None and pool.runnables:
+            store = pool.runnables[0].session_store
+        if store is not None:
+            await run_in_executor(None, store.delete, session_id)
+        return {"session_id": session_id, "deleted": store is not None}
+
+    @app.get("/health")
+    async def health() -> Dict[str, Any]:
+        return {
+            "status": "ok",
+            "runnables": len(pool.runnables),
+            "in_flight": pool.in_flight,
+            "max_concurrency": pool.max_concurrency,
+        }
+
+    return app
@@ -0,0 +1,491 @@
+# -*- coding: utf-8 -*-
+"""Client of the agent server with pooled connections and lazy event decoding."""
+import importlib.util
+import json
+import logging
+import re
+from typing import (
+    Any,
+    AsyncIterator,
+    Dict,
+    Iterator,
+    List,
+    Mapping,
+    Optional,
+)
+
+import httpx
+
+from langchain_glm.agents.zhipuai_all_tools.schema import (
+    AllToolsAction,
+    AllToolsActionToolEnd,
+    AllToolsActionToolStart,
+    AllToolsBaseComponent,
+    AllToolsFinish,
+    AllToolsLLMStatus,
+    AllToolsTiming,
+)
+from langchain_glm.callbacks.agent_callback_handler import AgentStatus
+from langchain_glm.server.replay import format_event_id
+from langchain_glm.server.wire import (
+    COMPACT,
+    JSON,
+    MSGPACK,
+    MSGPACK_EVENT_ID,
+    MSGPACK_EVENTS,
+    MSGPACK_MEDIA_TYPE,
+    CompactDecoder,
+)
+
+logger = logging.getLogger(__name__)
+
+HTTPX_DEFAULT_TIMEOUT = 300.0
+
+_LINE_END = re.compile(rb"\r\n|\r|\n")
+_COMPONENTS = {
+    cls.class_name(): cls
+    for cls in (
+        AllToolsLLMStatus,
+        AllToolsAction,
+        AllToolsActionToolStart,
+        AllToolsActionToolEnd,
+        AllToolsFinish,
+        AllToolsTiming,
+    )
+}
+
+
+class SSEMessage:
+    """One server-sent event, ``data`` is decoded on first access."""
+
+    __slots__ = ("event", "id", "retry", "raw", "_data")
+
+    def __init__(
+        self,
+        raw: bytes,
+        event: Optional[str] = None,
+        id: Optional[str] = None,
+        retry: Optional[int] = None,
+    ):
+        self.raw = raw
+        self.event = event
+        self.id = id
+        self.retry = retry
+        self._data: Optional[str] = None
+
+    @property
+    def data(self) -> str:
+        if self._data is None:
+            self._data = self.raw.decode("utf-8")
+        return self._data
+
+
+class SSEParser:
+    """Incremental parser of a server-sent event stream.
+
+    Bytes go in as they arrive, lines split over several chunks are kept in
+    one buffer that is compacted once per chunk. Only the payload of the
+    ``data`` lines is copied out of it.
+    """
+
+    def __init__(self) -> None:
+        self._buffer = bytearray()
+        # the buffered partial line has no line end before this offset
+        self._scanned = 0
+        self._data: List[bytes] = []
+        self._event: Optional[str] = None
+        self._retry: Optional[int] = None
+        self.last_event_id: Optional[str] = None
+
+    def feed(self, chunk: bytes) -> List[SSEMessage]:
+        """Parse ``chunk``, returns the events it completes."""
+        buffer = self._buffer
+        buffer += chunk
+        messages: List[SSEMessage] = []
+        start = 0
+        with memoryview(buffer) as view:
+            while True:
+                match = _LINE_END.search(buffer, max(start, self._scanned))
+                if match is None:
+                    self._scanned = len(buffer)
+                    break
+                if match.group() == b"\r" and match.end() == len(buffer):
+                    # may be the first half of a \r\n split over two chunks
+                    self._scanned = match.start()
+                    break
+                self._line(view, start, match.start(), messages)
+                start = match.end()
+        del buffer[:start]
+        self._scanned -= start
+        return messages
+
+    def _line(
+        self, view: memoryview, start: int, end: int, messages: List[SSEMessage]
+    ) -> None:
+        if start == end:
+            if self._data:
+                raw = self._data[0] if len(self._data) == 1 else b"\n".join(self._data)
+                messages.append(
+                    SSEMessage(raw, self._event, self.last_event_id, self._retry)
+                )
+            self._data = []
+            self._event = None
+            self._retry = None
+            return
+        if view[start] == 0x3A:  # ":" starts a comment, e.g. a keep-alive ping
+            return
+        colon = self._buffer.find(b":", start, end)
+        if colon < 0:
+            name, value_start = view[start:end], end
+        else:
+            name, value_start = view[start:colon], colon + 1
+            if value_start < end and view[value_start] == 0x20:
+                value_start += 1
+        value = view[value_start:end].tobytes()
+        if name == b"data":
+            self._data.append(value)
+        elif name == b"event":
+            self._event = value.decode("utf-8")
+        elif name == b"id":
+            if b"\0" not in value:
+                self.last_event_id = value.decode("utf-8")
+        elif name == b"retry" and value.isdigit():
+            self._retry = int(value)
+
+
+class ChatEvent(Mapping[str, Any]):
+    """An agent event as sent by the server.
+
+    The JSON payload is parsed on first access and the
+    :class:`AllToolsBaseComponent` is only built by :meth:`to_component`, so
+    reading the text deltas of a stream costs no more than needed.
+    """
+
+    __slots__ = ("raw", "id", "_data")
+
+    def __init__(
+        self,
+        raw: Optional[bytes] = None,
+        data: Optional[Dict[str, Any]] = None,
+        id: Optional[str] = None,
+    ):
+        self.raw = raw
+        self.id = id
+        self._data = data
+
+    @property
+    def data(self) -> Dict[str, Any]:
+        if self._data is None:
+            self._data = json.loads(self.raw)
+        return self._data
+
+    def __getitem__(self, key: str) -> Any:
+        return self.data[key]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.data)
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+    def __repr__(self) -> str:
+        return f"ChatEvent({self.data!r})"
+
+    @property
+    def is_text_delta(self) -> bool:
+        if (
+            self._data is None
+            and b'"status": 2' not in self.raw
+            and b'"status":2' not in self.raw
+        ):
+            return False
+        return (
+            self.data.get("class_name") == AllToolsLLMStatus.class_name()
+            and self.data.get("status") == AgentStatus.llm_new_token
+        )
+
+    @property
+    def text(self) -> Optional[str]:
+        return self.data.get("text")
+
+    def to_component(self) -> AllToolsBaseComponent:
+        data = dict(self.data)
+        return _COMPONENTS[data["class_name"]].from_dict(data)
+
+
+class EventDecoder:
+    """Chat events of a response body in the wire format the server chose."""
+
+    def __init__(self, event_format: str = JSON):
+        self.event_format = event_format
+        self._sse = SSEParser()
+        self._compact = CompactDecoder()
+        self._unpacker: Any = None
+        self._frame_id: Optional[str] = None
+        if event_format == MSGPACK:
+            import msgpack
+
+            self._unpacker = msgpack.Unpacker()
+
+    @property
+    def last_event_id(self) -> Optional[str]:
+        if self._unpacker is not None:
+            return self._frame_id
+        return self._sse.last_event_id
+
+    def feed(self, chunk: bytes) -> List[ChatEvent]:
+        events: List[ChatEvent] = []
+        if self._unpacker is not None:
+            self._unpacker.feed(chunk)
+            for frame in self._unpacker:
+                if frame is None:  # keep-alive
+                    continue
+                self._frame_id = frame.get(MSGPACK_EVENT_ID, self._frame_id)
+                events.extend(
+                    ChatEvent(data=data, id=self._frame_id)
+                    for data in self._compact.decode_batch(frame[MSGPACK_EVENTS])
+                )
+            return events
+        for message in self._sse.feed(chunk):
+            if self.event_format == COMPACT:
+                events.extend(
+                    ChatEvent(data=data, id=message.id)
+                    for data in self._compact.decode_batch(json.loads(message.raw))
+                )
+            else:
+                events.append(ChatEvent(raw=message.raw, id=message.id))
+        return events
+
+
+class ZhipuAIPluginsClient:
+    """Client of ``python -m langchain_glm.server``.
+
+    The sync and the async httpx clients are created once and keep their
+    connections alive between requests. HTTP/2 is used when ``h2`` is
+    installed, unless ``http2`` says otherwise.
+
+    Example:
+        .. code-block:: python
+
+            client = ZhipuAIPluginsClient("http://127.0.0.1:10000")
+            for text in client.chat_text("帮我计算100+1"):
+                print(text, end="")
+    """
+
+    def __init__(
+        self,
+        base_url: str = "http://127.0.0.1:10000",
+        timeout: float = HTTPX_DEFAULT_TIMEOUT,
+        event_format: str = JSON,
+        http2: Optional[bool] = None,
+        max_connections: int = 100,
+        max_keepalive_connections: int = 20,
+        keepalive_expiry: float = 30.0,
+        headers: Optional[Dict[str, str]] = None,
+        max_reconnects: int = 3,
+        **kwargs: Any,
+    ):
+        """
+        Args:
+            base_url: Address of the server.
+            timeout: Seconds to wait for the server, also between two events.
+            event_format: Wire format asked from the server.
+            http2: Speak HTTP/2, ``None`` does when ``h2`` is installed.
+            max_connections: Connections of a pool.
+            max_keepalive_connections: Idle connections kept open.
+            keepalive_expiry: Seconds an idle connection is kept open.
+            headers: Extra headers of every request.
+            max_reconnects: Times a dropped stream is resumed.
+            kwargs: Further arguments of the httpx clients, e.g. ``proxy``.
+        """
+        self.base_url = base_url
+        self.timeout = timeout
+        self.event_format = event_format
+        if http2 is None:
+            http2 = importlib.util.find_spec("h2") is not None
+        self.http2 = http2
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self.headers = {"X-Event-Format": event_format}
+        if event_format == MSGPACK:
+            self.headers["Accept"] = MSGPACK_MEDIA_TYPE
+        self.headers.update(headers or {})
+        self.max_reconnects = max_reconnects
+        self.client_kwargs = kwargs
+        self.last_session_id: Optional[str] = None
+        self.last_run_id: Optional[str] = None
+        self._client: Optional[httpx.Client] = None
+        self._aclient: Optional[httpx.AsyncClient] = None
+
+    def _client_kwargs(self) -> Dict[str, Any]:
+        return dict(
+            base_url=self.base_url,
+            timeout=httpx.Timeout(self.timeout, connect=min(self.timeout, 10.0)),
+            limits=self.limits,
+            http2=self.http2,
+            headers=self.headers,
+            **self.client_kwargs,
+        )
+
+    @property
+    def client(self) -> httpx.Client:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.Client(**self._client_kwargs())
+        return self._client
+
+    @property
+    def aclient(self) -> httpx.AsyncClient:
+        if self._aclient is None or self._aclient.is_closed:
+            self._aclient = httpx.AsyncClient(**self._client_kwargs())
+        return self._aclient
+
+    @staticmethod
+    def _chat_body(
+        query: str,
+        history: Optional[List[Dict[str, Any]]],
+        session_id: Optional[str],
+    ) -> Dict[str, Any]:
+        body: Dict[str, Any] = {"query": query, "history": history or []}
+        if session_id is not None:
+            body["session_id"] = session_id
+        return body
+
+    def _decoder(self, response: httpx.Response) -> EventDecoder:
+        if response.is_error:
+            response.read()
+            response.raise_for_status()
+        self.last_session_id = response.headers.get("X-Session-Id")
+        self.last_run_id = response.headers.get("X-Run-Id")
+        return EventDecoder(response.headers.get("X-Event-Format", JSON))
+
+    def _resume_request(
+        self, received: int, last_event_id: Optional[str]
+    ) -> Optional[Dict[str, Any]]:
+        """Arguments of the request resuming the current run, ``None`` if the
+        server did not send a run id.
+
+        The stream resumes after ``last_event_id``, the id of the last event
+        received, or after the ``received`` events when the server sent none.
+        """
+        if self.last_run_id is None:
+            return None
+        if last_event_id is None:
+            last_event_id = format_event_id(self.last_run_id, received)
+        return dict(
+            method="GET",
+            url=f"/runs/{self.last_run_id}/events",
+            headers={"Last-Event-ID": last_event_id},
+        )
+
+    def chat(
+        self,
+        query: str,
+        history: Optional[List[Dict[str, Any]]] = None,
+        session_id: Optional[str] = None,
+    ) -> Iterator[ChatEvent]:
+        """Stream the events of one turn.
+
+        A dropped connection is resumed from the last received event, up to
+        ``max_reconnects`` times, the run goes on on the server meanwhile.
+
+        Args:
+            query: The user message.
+            history: History of a new session.
+            session_id: Session to continue, the server starts a new one
+                without it, see :attr:`last_session_id`.
+        """
+        self.last_run_id = None
+        request: Optional[Dict[str, Any]] = dict(
+            method="POST",
+            url="/chat",
+            json=self._chat_body(query, history, session_id),
+        )
+        received = 0
+        last_event_id: Optional[str] = None
+        reconnects = 0
+        while True:
+            try:
+                with self.client.stream(**request) as response:
+                    decoder = self._decoder(response)
+                    for chunk in response.iter_bytes():
+                        for event in decoder.feed(chunk):
+                            received += 1
+                            last_event_id = event.id or last_event_id
+                            yield event
+                return
+            except httpx.TransportError as e:
+                request = self._resume_request(received, last_event_id)
+                if request is None or reconnects >= self.max_reconnects:
+                    raise
+                reconnects += 1
+                logger.warning(f"stream dropped ({e!r}), resuming after {received}")
+
+    async def achat(
+        self,
+        query: str,
+        history: Optional[List[Dict[str, Any]]] = None,
+        session_id: Optional[str] = None,
+    ) -> AsyncIterator[ChatEvent]:
+        """Async version of :meth:`chat`."""
+        self.last_run_id = None
+        request: Optional[Dict[str, Any]] = dict(
+            method="POST",
+            url="/chat",
+            json=self._chat_body(query, history, session_id),
+        )
+        received = 0
+        last_event_id: Optional[str] = None
+        reconnects = 0
+        while True:
+            try:
+                async with self.aclient.stream(**request) as response:
+                    if response.is_error:
+                        await response.aread()
+                    decoder = self._decoder(response)
+                    async for chunk in response.aiter_bytes():
+                        for event in decoder.feed(chunk):
+                            received += 1
+                            last_event_id = event.id or last_event_id
+                            yield event
+                return
+            except httpx.TransportError as e:
+                request = self._resume_request(received, last_event_id)
+                if request is None or reconnects >= self.max_reconnects:
+                    raise
+                reconnects += 1
+                logger.warning(f"stream dropped ({e!r}), resuming after {received}")
+
+    def chat_text(self, query: str, **kwargs: Any) -> Iterator[str]:
+        """Stream only the text deltas of the model."""
+        for event in self.chat(query, **kwargs):
+            if event.is_text_delta:
+                yield event.text
+
+    async def achat_text(self, query: str, **kwargs: Any) -> AsyncIterator[str]:
+        async for event in self.achat(query, **kwargs):
+            if event.is_text_delta:
+                yield event.text
+
+    def close(self) -> None:
+        if self._client is not None:
+            self._client.close()
+
+    async def aclose(self) -> None:
+        if self._aclient is not None:
+            await self._aclient.aclose()
+        self.close()
+
+    def __enter__(self) -> "ZhipuAIPluginsClient":
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
+
+    async def __aenter__(self) -> "ZhipuAIPluginsClient":
+        return self
+
+    async def __aexit__(self, *exc_info: object) -> None:
+        await self.aclose()
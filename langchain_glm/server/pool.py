@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+"""Pre-built runnables shared by the requests of one worker."""
+import asyncio
+import logging
+from typing import Callable, Dict, List, Optional, Tuple
+
+from langchain_glm.agents.zhipuai_all_tools import ZhipuAIAllToolsRunnable
+
+logger = logging.getLogger(__name__)
+
+
+class PoolBusyError(RuntimeError):
+    """Raised when no stream slot frees up within the acquire timeout."""
+
+
+class Lease:
+    """A stream slot on one runnable, :meth:`release` hands it back."""
+
+    def __init__(
+        self,
+        pool: "RunnablePool",
+        runnable_index: int,
+        session: Optional[Tuple[str, asyncio.Lock]],
+    ):
+        self._pool = pool
+        self._index = runnable_index
+        self._session = session
+        self._released = False
+
+    @property
+    def runnable(self) -> ZhipuAIAllToolsRunnable:
+        return self._pool.runnables[self._index]
+
+    def release(self) -> None:
+        if self._released:
+            return
+        self._released = True
+        self._pool._release(self._index, self._session)
+
+    async def __aenter__(self) -> "Lease":
+        return self
+
+    async def __aexit__(self, *exc_info: object) -> None:
+        self.release()
+
+
+class RunnablePool:
+    """Runnables built once at startup and handed out per stream.
+
+    A runnable keeps no per-conversation state, so one serves many streams.
+    Several of them spread the load over separate model clients, a stream
+    gets the least busy one. ``max_concurrency`` bounds the streams of the
+    pool and the turns of one session run one after the other.
+    """
+
+    def __init__(
+        self,
+        factory: Callable[[], ZhipuAIAllToolsRunnable],
+        size: int = 1,
+        max_concurrency: int = 64,
+    ):
+        """
+        Args:
+            factory: Builds one runnable.
+            size: Number of runnables.
+            max_concurrency: Streams served at the same time.
+        """
+        if size < 1 or max_concurrency < 1:
+            raise ValueError("size and max_concurrency must be positive")
+        self.factory = factory
+        self.size = size
+        self.max_concurrency = max_concurrency
+        self.runnables: List[ZhipuAIAllToolsRunnable] = []
+        self._busy: List[int] = []
+        self._slots: Optional[asyncio.Semaphore] = None
+        # lock and number of streams holding or waiting for it
+        self._session_locks: Dict[str, List] = {}
+
+    def start(self) -> None:
+        """Build the runnables, a started pool is left as it is."""
+        while len(self.runnables) < self.size:
+            self.runnables.append(self.factory())
+            self._busy.append(0)
+        logger.info(f"runnable pool ready with {self.size} runnables")
+
+    @property
+    def in_flight(self) -> int:
+        return sum(self._busy)
+
+    async def acquire(
+        self, session_id: Optional[str] = None, timeout: Optional[float] = None
+    ) -> Lease:
+        """Wait for a stream slot and the turn of ``session_id``.
+
+        Args:
+            session_id: Session of the stream, its turns never overlap.
+            timeout: Seconds to wait for a slot, ``None`` waits forever.
+
+        Raises:
+            PoolBusyError: When ``timeout`` passes without a free slot.
+        """
+        if not self.runnables:
+            self.start()
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_concurrency)
+
+        session = None
+        if session_id is not None:
+            # queued turns of a session wait here without holding a slot
+            entry = self._session_locks.setdefault(session_id, [asyncio.Lock(), 0])
+            entry[1] += 1
+            try:
+                await entry[0].acquire()
+            except BaseException:
+                self._forget_session(session_id)
+                raise
+            session = (session_id, entry[0])
+
+        try:
+            if timeout is None:
+                await self._slots.acquire()
+            elif timeout <= 0:
+                if self._slots.locked():
+                    raise asyncio.TimeoutError
+                await self._slots.acquire()
+            else:
+                await asyncio.wait_for(self._slots.acquire(), timeout)
+        except BaseException as e:
+            if session is not None:
+                session[1].release()
+                self._forget_session(session_id)
+            if isinstance(e, asyncio.TimeoutError):
+                raise PoolBusyError(
+                    f"all {self.max_concurrency} streams are busy"
+                ) from None
+            raise
+
+        index = min(range(len(self.runnables)), key=self._busy.__getitem__)
+        self._busy[index] += 1
+        return Lease(self, index, session)
+
+    def _forget_session(self, session_id: str) -> None:
+        entry = self._session_locks[session_id]
+        entry[1] -= 1
+        if entry[1] == 0:
+            del self._session_locks[session_id]
+
+    def _release(self, index: int, session: Optional[Tuple[str, asyncio.Lock]]) -> None:
+        self._busy[index] -= 1
+        self._slots.release()
+        if session is not None:
+            session[1].release()
+            self._forget_session(session[0])
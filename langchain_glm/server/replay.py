@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+"""Buffer the events of agent runs so a reconnecting client can resume.
+
+A run is pumped into its :class:`RunBuffer` by a background task, it keeps
+going when the client disconnects. Clients read the buffer from the event
+after the one they saw last, given by the ``Last-Event-ID`` they send back.
+"""
+import asyncio
+import logging
+import time
+from collections import OrderedDict, deque
+from typing import Any, AsyncIterator, Deque, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class ReplayGapError(RuntimeError):
+    """Raised when events a reader needs were already dropped from the buffer."""
+
+
+def format_event_id(run_id: str, seq: int) -> str:
+    return f"{run_id}:{seq}"
+
+
+def parse_event_id(event_id: str) -> Optional[Tuple[str, int]]:
+    """``(run_id, seq)`` of an event id, ``None`` if it is not one of ours."""
+    run_id, _, seq = event_id.strip().rpartition(":")
+    if not run_id or not seq.isdigit():
+        return None
+    return run_id, int(seq)
+
+
+class RunBuffer:
+    """The last ``max_events`` events of one run, numbered from 1."""
+
+    def __init__(self, run_id: str, max_events: int, session_id: Optional[str] = None):
+        self.run_id = run_id
+        self.session_id = session_id
+        self.events: Deque[Tuple[int, Any]] = deque(maxlen=max_events)
+        self.last_seq = 0
+        self.done = False
+        self.finished_at: Optional[float] = None
+        self.task: Optional[asyncio.Task] = None
+        self._changed = asyncio.Event()
+
+    @property
+    def first_seq(self) -> int:
+        """Number of the oldest buffered event."""
+        return self.events[0][0] if self.events else self.last_seq + 1
+
+    def append(self, event: Any) -> None:
+        self.last_seq += 1
+        self.events.append((self.last_seq, event))
+        self._notify()
+
+    def finish(self) -> None:
+        self.done = True
+        self.finished_at = time.monotonic()
+        self._notify()
+
+    def _notify(self) -> None:
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    def check(self, after: int) -> None:
+        """Raise :class:`ReplayGapError` if reading after ``after`` would
+        skip events."""
+        if after + 1 < self.first_seq:
+            raise ReplayGapError(
+                f"events {after + 1} to {self.first_seq - 1} of run "
+                f"{self.run_id} are no longer buffered"
+            )
+        if after > self.last_seq:
+            raise ReplayGapError(f"run {self.run_id} has no event {after}")
+
+    async def read(self, after: int = 0) -> AsyncIterator[Any]:
+        """Events after number ``after``, then the new ones until the run ends.
+
+        Raises:
+            ReplayGapError: When the reader falls behind by more than the
+                buffer holds.
+        """
+        self.check(after)
+        while True:
+            changed = self._changed
+            if after < self.last_seq:
+                self.check(after)
+                after += 1
+                yield self.events[after - self.first_seq][1]
+                continue
+            if self.done:
+                return
+            await changed.wait()
+
+
+class RunRegistry:
+    """Buffers of the runs of one worker.
+
+    Finished runs are kept ``ttl`` seconds for late reconnects, at most
+    ``max_runs`` buffers are kept, finished ones are dropped first.
+    """
+
+    def __init__(
+        self, max_runs: int = 1024, max_events: int = 4096, ttl: float = 300.0
+    ):
+        """
+        Args:
+            max_runs: Number of buffered runs.
+            max_events: Events buffered per run, older ones are dropped.
+            ttl: Seconds a finished run stays available.
+        """
+        self.max_runs = max_runs
+        self.max_events = max_events
+        self.ttl = ttl
+        self._runs: "OrderedDict[str, RunBuffer]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._runs)
+
+    def get(self, run_id: str) -> Optional[RunBuffer]:
+        self._evict()
+        return self._runs.get(run_id)
+
+    def start(
+        self,
+        run_id: str,
+        events: AsyncIterator[Any],
+        session_id: Optional[str] = None,
+    ) -> RunBuffer:
+        """Pump ``events`` into a new buffer from a background task."""
+        self._evict()
+        buffer = RunBuffer(run_id, self.max_events, session_id)
+        self._runs[run_id] = buffer
+        while len(self._runs) > self.max_runs:
+            finished = next((key for key, run in self._runs.items() if run.done), None)
+            if finished is None:
+                logger.warning(
+                    f"{len(self._runs)} runs in flight exceed max_runs={self.max_runs}"
+                )
+                break
+            del self._runs[finished]
+
+        async def pump() -> None:
+            try:
+                async for event in events:
+                    buffer.append(event)
+            except Exception as e:
+                logger.error(f"run {run_id} failed", exc_info=e)
+            finally:
+                buffer.finish()
+
+        buffer.task = asyncio.ensure_future(pump())
+        return buffer
+
+    def _evict(self) -> None:
+        now = time.monotonic()
+        expired = [
+            run_id
+            for run_id, run in self._runs.items()
+            if run.done and now - run.finished_at > self.ttl
+        ]
+        for run_id in expired:
+            del self._runs[run_id]
+
+    async def aclose(self) -> None:
+        """Cancel the runs still in flight."""
+        tasks = [run.task for run in self._runs.values() if run.task and not run.done]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+import os
+from typing import Any, Dict, List, Optional
+
+from langchain_core.pydantic_v1 import BaseModel
+
+ENV_PREFIX = "LANGCHAIN_GLM_SERVER_"
+
+
+class ServerSettings(BaseModel):
+    """Configuration of the agent server.
+
+    Every field can be set by an environment variable named after it with the
+    ``LANGCHAIN_GLM_SERVER_`` prefix, e.g. ``LANGCHAIN_GLM_SERVER_WORKERS=4``.
+    Worker processes read their settings from the environment.
+    """
+
+    host: str = "127.0.0.1"
+    port: int = 10000
+    workers: int = 1
+    """Number of worker processes, every one runs its own event loop."""
+    loop: str = "auto"
+    """uvicorn event loop, ``auto`` picks uvloop when it is installed."""
+    model_name: str = "glm-4-alltools"
+    builtin_tools: List[str] = ["code_interpreter", "web_browser", "drawing_tool"]
+    """Platform tools bound by the default runnable factory."""
+    runnable_factory: Optional[str] = None
+    """``module:callable`` building a ZhipuAIAllToolsRunnable from a
+        ``session_store`` keyword argument, replaces the default factory."""
+    pool_size: int = 1
+    """Number of pre-built runnables per worker."""
+    max_concurrent_streams: int = 64
+    """Streams served at the same time by one worker."""
+    acquire_timeout: Optional[float] = 0.0
+    """Seconds a request waits for a free stream slot before it is refused
+        with 503, ``None`` waits forever."""
+    ping_interval: float = 15.0
+    """Seconds of silence on a stream before a keep-alive comment is sent."""
+    event_format: str = "json"
+    """Wire format of the requests that do not ask for one, see
+        :mod:`langchain_glm.server.wire`."""
+    compress_streams: bool = True
+    """gzip the streams of clients sending ``Accept-Encoding: gzip``."""
+    batch_max_size: int = 64
+    """Events per message of the batched wire formats."""
+    batch_max_delay: float = 0.02
+    """Seconds an event may wait for the rest of its batch."""
+    replay_max_runs: int = 1024
+    """Runs whose events are buffered for reconnecting clients."""
+    replay_max_events: int = 4096
+    """Events buffered per run, a client missing older ones gets 410."""
+    replay_ttl: float = 300.0
+    """Seconds the events of a finished run stay available."""
+    timing: bool = False
+    """End every turn with an ``AllToolsTiming`` event giving the time spent
+        per stage, and log it at debug level."""
+    profile_dir: Optional[str] = None
+    """Directory of the run profiles, ``<run_id>.folded`` collapsed stacks.
+        Requests sending ``X-Profile: 1`` are profiled once it is set."""
+    profile_sample_rate: float = 0.0
+    """Share of the runs profiled without being asked for."""
+    profile_interval: float = 0.01
+    """Seconds between two stack samples of a profiled run."""
+    max_queue_size: int = 0
+    """Events buffered per stream for a slow client, 0 is unbounded."""
+    session_store_path: Optional[str] = None
+    """sqlite file shared by the workers, ``None`` keeps the sessions in the
+        memory of every worker, which then needs sticky routing."""
+    max_sessions: int = 10000
+    session_ttl: Optional[float] = 3600.0
+    """Seconds after the last turn when a session expires."""
+    session_evict_interval: Optional[float] = 300.0
+    """Seconds between two sweeps of the expired sessions, ``None`` only drops
+        them when they are loaded again."""
+    cors_origins: List[str] = ["*"]
+    log_level: str = "info"
+
+    @classmethod
+    def from_env(cls, **overrides: Any) -> "ServerSettings":
+        """Settings from the environment, ``overrides`` take precedence."""
+        values: Dict[str, Any] = {}
+        for name, field in cls.__fields__.items():
+            raw = os.environ.get(ENV_PREFIX + name.upper())
+            if raw is None:
+                continue
+            if field.outer_type_ is not field.type_:
+                # list fields are comma separated
+                values[name] = [item.strip() for item in raw.split(",") if item.strip()]
+            elif raw.lower() in ("", "none") and not field.required:
+                values[name] = None
+            else:
+                values[name] = raw
+        values.update(overrides)
+        return cls(**values)
+
+    def to_env(self) -> Dict[str, str]:
+        """Environment variables that :meth:`from_env` reads back into these
+        settings."""
+        env = {}
+        for name, value in self.dict().items():
+            if isinstance(value, list):
+                value = ",".join(value)
+            env[ENV_PREFIX + name.upper()] = "none" if value is None else str(value)
+        return env
@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+"""Server-sent events framing with keep-alive pings."""
+import asyncio
+from typing import AsyncIterator, Optional
+
+PING = b": ping\n\n"
+
+
+def format_sse(
+    data: str,
+    event: Optional[str] = None,
+    id: Optional[str] = None,
+    retry: Optional[int] = None,
+) -> bytes:
+    """Encode one event, multi-line data is split into several ``data`` lines."""
+    lines = []
+    if id is not None:
+        lines.append(f"id: {id}")
+    if event is not None:
+        lines.append(f"event: {event}")
+    if retry is not None:
+        lines.append(f"retry: {retry}")
+    lines.extend(f"data: {line}" for line in data.splitlines() or [""])
+    return ("\n".join(lines) + "\n\n").encode("utf-8")
+
+
+async def with_pings(
+    frames: AsyncIterator[bytes], interval: float, ping: bytes = PING
+) -> AsyncIterator[bytes]:
+    """Pass ``frames`` through, adding ``ping`` after ``interval`` seconds
+    without a frame.
+
+    Proxies and load balancers close connections that stay silent, a tool run
+    or a slow first token easily exceeds their idle timeout.
+    """
+    if interval <= 0:
+        async for frame in frames:
+            yield frame
+        return
+
+    next_frame: Optional[asyncio.Future] = None
+    try:
+        while True:
+            if next_frame is None:
+                next_frame = asyncio.ensure_future(frames.__anext__())
+            done, _ = await asyncio.wait({next_frame}, timeout=interval)
+            if not done:
+                yield ping
+                continue
+            try:
+                frame = next_frame.result()
+            except StopAsyncIteration:
+                return
+            finally:
+                next_frame = None
+            yield frame
+    finally:
+        if next_frame is not None:
+            # the source must be idle before it can be closed
+            next_frame.cancel()
+            await asyncio.gather(next_frame, return_exceptions=True)
+        aclose = getattr(frames, "aclose", None)
+        if aclose is not None:
+            await aclose()
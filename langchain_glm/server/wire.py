@@ -0,0 +1,319 @@
+# -*- coding: utf-8 -*-
+"""Wire formats of the agent event stream.
+
+``json`` sends every event as its own SSE message with the payload of
+``AllToolsBaseComponent.to_json()``. ``compact`` packs the events produced
+within ``max_delay`` seconds into one SSE message holding a JSON array of
+events with short keys, run ids are sent once and referenced by number
+afterwards. ``msgpack`` sends the same batches as a stream of msgpack maps
+instead of SSE, ``{"e": [events], "i": "<run_id>:<number>"}`` with the id of
+the last event of the batch, the id a reconnecting client sends back as
+``Last-Event-ID`` like with the SSE formats. Any format can additionally be
+gzip compressed per stream.
+
+The client picks the format with the ``X-Event-Format`` header or the
+``format`` query parameter, ``Accept: application/x-msgpack`` selects
+msgpack, and compression with ``Accept-Encoding: gzip``.
+"""
+import asyncio
+import json
+import zlib
+from typing import (
+    Any,
+    AsyncIterator,
+    Dict,
+    Iterable,
+    List,
+    Mapping,
+    Optional,
+    Type,
+)
+
+from langchain_glm.agents.zhipuai_all_tools.schema import (
+    AllToolsAction,
+    AllToolsActionToolEnd,
+    AllToolsActionToolStart,
+    AllToolsBaseComponent,
+    AllToolsFinish,
+    AllToolsLLMStatus,
+    AllToolsTiming,
+)
+from langchain_glm.server.replay import format_event_id
+from langchain_glm.server.sse import PING, format_sse
+
+JSON = "json"
+COMPACT = "compact"
+MSGPACK = "msgpack"
+MSGPACK_MEDIA_TYPE = "application/x-msgpack"
+
+_CLASSES: List[Type[AllToolsBaseComponent]] = [
+    AllToolsLLMStatus,
+    AllToolsAction,
+    AllToolsActionToolStart,
+    AllToolsActionToolEnd,
+    AllToolsFinish,
+    AllToolsTiming,
+]
+_CLASS_CODES: Dict[str, int] = {
+    cls.class_name(): code for code, cls in enumerate(_CLASSES)
+}
+_KEYS = {
+    "status": "s",
+    "text": "t",
+    "message_type": "m",
+    "tool": "n",
+    "tool_input": "i",
+    "tool_output": "o",
+    "log": "l",
+    "return_values": "v",
+}
+_LONG_KEYS = {short: key for key, short in _KEYS.items()}
+# run id reference and first appearance of a run id
+_RUN_REF = "r"
+_RUN_NEW = "R"
+# keys of a msgpack frame
+MSGPACK_EVENTS = "e"
+MSGPACK_EVENT_ID = "i"
+
+
+class CompactEncoder:
+    """Short-key dicts of the events of one stream.
+
+    Stateful, a run id gets a number on its first event and later events
+    only carry that number.
+    """
+
+    def __init__(self) -> None:
+        self._runs: Dict[str, int] = {}
+
+    def encode(self, event: AllToolsBaseComponent) -> Dict[str, Any]:
+        data = event.to_dict()
+        compact: Dict[str, Any] = {"c": _CLASS_CODES[data.pop("class_name")]}
+        run_id = data.pop("run_id")
+        if run_id in self._runs:
+            compact[_RUN_REF] = self._runs[run_id]
+        else:
+            self._runs[run_id] = len(self._runs)
+            compact[_RUN_NEW] = run_id
+        for key, value in data.items():
+            # defaults are left to the decoder
+            if key == "message_type" and value == 1:
+                continue
+            compact[_KEYS.get(key, key)] = value
+        return compact
+
+
+class CompactDecoder:
+    """Inverse of :class:`CompactEncoder`, yields ``to_dict()`` style dicts."""
+
+    def __init__(self) -> None:
+        self._runs: List[str] = []
+
+    def decode(self, compact: Dict[str, Any]) -> Dict[str, Any]:
+        compact = dict(compact)
+        cls = _CLASSES[compact.pop("c")]
+        if _RUN_NEW in compact:
+            self._runs.append(compact.pop(_RUN_NEW))
+            run_id = self._runs[-1]
+        else:
+            run_id = self._runs[compact.pop(_RUN_REF)]
+        data = {"run_id": run_id}
+        data.update((_LONG_KEYS.get(key, key), value) for key, value in compact.items())
+        if cls is AllToolsLLMStatus:
+            data.setdefault("message_type", 1)
+        data["class_name"] = cls.class_name()
+        return data
+
+    def decode_batch(self, data: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        return [self.decode(compact) for compact in data]
+
+
+async def batch_events(
+    events: AsyncIterator[Any], max_size: int, max_delay: float
+) -> AsyncIterator[List[Any]]:
+    """Group ``events`` into lists of at most ``max_size``, a list is sent no
+    later than ``max_delay`` seconds after its first event arrived."""
+    loop = asyncio.get_running_loop()
+    batch: List[Any] = []
+    deadline = 0.0
+    next_event: Optional[asyncio.Future] = None
+    try:
+        while True:
+            if next_event is None:
+                next_event = asyncio.ensure_future(events.__anext__())
+            timeout = max(deadline - loop.time(), 0) if batch else None
+            done, _ = await asyncio.wait({next_event}, timeout=timeout)
+            if not done:
+                yield batch
+                batch = []
+                continue
+            try:
+                event = next_event.result()
+            except StopAsyncIteration:
+                if batch:
+                    yield batch
+                return
+            finally:
+                next_event = None
+            if not batch:
+                deadline = loop.time() + max_delay
+            batch.append(event)
+            if len(batch) >= max_size:
+                yield batch
+                batch = []
+    finally:
+        if next_event is not None:
+            next_event.cancel()
+            await asyncio.gather(next_event, return_exceptions=True)
+        aclose = getattr(events, "aclose", None)
+        if aclose is not None:
+            await aclose()
+
+
+class WireFormat:
+    """Encoding of one stream, built per request by :func:`negotiate`."""
+
+    def __init__(
+        self,
+        name: str = JSON,
+        gzip: bool = False,
+        max_batch_size: int = 64,
+        max_delay: float = 0.02,
+        compression_level: int = 6,
+    ):
+        """
+        Args:
+            name: ``json``, ``compact`` or ``msgpack``.
+            gzip: Compress the stream.
+            max_batch_size: Events per message of the batched formats.
+            max_delay: Seconds an event may wait for the rest of its batch.
+            compression_level: zlib level of the compressed stream.
+        """
+        if name not in (JSON, COMPACT, MSGPACK):
+            raise ValueError(f"Unknown event format: {name}")
+        self.name = name
+        self.gzip = gzip
+        self.max_batch_size = max_batch_size
+        self.max_delay = max_delay
+        self.compression_level = compression_level
+        self._packb: Any = None
+        if name == MSGPACK:
+            try:
+                import msgpack
+            except ImportError as e:
+                raise ImportError(
+                    "The msgpack event format requires msgpack, "
+                    "install it with `pip install msgpack`."
+                ) from e
+            self._packb = msgpack.packb
+
+    @property
+    def media_type(self) -> str:
+        return MSGPACK_MEDIA_TYPE if self.name == MSGPACK else "text/event-stream"
+
+    @property
+    def headers(self) -> Dict[str, str]:
+        headers = {"X-Event-Format": self.name}
+        if self.gzip:
+            headers["Content-Encoding"] = "gzip"
+        return headers
+
+    @property
+    def ping(self) -> bytes:
+        # msgpack nil between the arrays of events
+        return b"\xc0" if self.name == MSGPACK else PING
+
+    async def encode(
+        self,
+        events: AsyncIterator[AllToolsBaseComponent],
+        run_id: Optional[str] = None,
+        start: int = 0,
+    ) -> AsyncIterator[bytes]:
+        """Frames of ``events`` in this format, uncompressed.
+
+        Args:
+            events: The events to send.
+            run_id: Run the events belong to, SSE messages and msgpack frames
+                then carry the id ``<run_id>:<number>`` of their last event.
+            start: Number of the event before the first one of ``events``.
+        """
+        seq = start
+
+        def event_id() -> Optional[str]:
+            return None if run_id is None else format_event_id(run_id, seq)
+
+        if self.name == JSON:
+            async for event in events:
+                seq += 1
+                yield format_sse(event.to_json(), id=event_id())
+            return
+
+        encoder = CompactEncoder()
+        async for batch in batch_events(events, self.max_batch_size, self.max_delay):
+            seq += len(batch)
+            data = [encoder.encode(event) for event in batch]
+            if self.name == MSGPACK:
+                frame: Dict[str, Any] = {MSGPACK_EVENTS: data}
+                if run_id is not None:
+                    frame[MSGPACK_EVENT_ID] = event_id()
+                yield self._packb(frame)
+            else:
+                yield format_sse(
+                    json.dumps(data, ensure_ascii=False, separators=(",", ":")),
+                    id=event_id(),
+                )
+
+    async def compress(self, frames: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+        """gzip ``frames`` when negotiated, every frame is flushed so the
+        client can decode it as soon as it arrives."""
+        if not self.gzip:
+            async for frame in frames:
+                yield frame
+            return
+        compressor = zlib.compressobj(self.compression_level, zlib.DEFLATED, 31)
+        async for frame in frames:
+            yield compressor.compress(frame) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        yield compressor.flush()
+
+
+def _accepts(header: str, token: str) -> bool:
+    for item in header.split(","):
+        name, *params = item.split(";")
+        if name.strip().lower() != token:
+            continue
+        for param in params:
+            key, _, value = param.partition("=")
+            if key.strip() == "q":
+                try:
+                    return float(value) > 0
+                except ValueError:
+                    return False
+        return True
+    return False
+
+
+def negotiate(
+    headers: Mapping[str, str],
+    query: Optional[Mapping[str, str]] = None,
+    default: str = JSON,
+    allow_gzip: bool = True,
+    **kwargs: Any,
+) -> WireFormat:
+    """Pick the wire format a request asks for.
+
+    Args:
+        headers: Request headers, looked up by lower case name.
+        query: Request query parameters.
+        default: Format of requests that ask for none.
+        allow_gzip: Compress when the request accepts gzip.
+        kwargs: Batching and compression options of :class:`WireFormat`.
+
+    Raises:
+        ValueError: When the format is unknown.
+        ImportError: When msgpack is asked for but not installed.
+    """
+    name = (query or {}).get("format") or headers.get("x-event-format")
+    if not name and _accepts(headers.get("accept", ""), MSGPACK_MEDIA_TYPE):
+        name = MSGPACK
+    gzip = allow_gzip and _accepts(headers.get("accept-encoding", ""), "gzip")
+    return WireFormat(name or default, gzip=gzip, **kwargs)
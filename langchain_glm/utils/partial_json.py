@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+"""Parse every tool call argument string once.
+
+While a response streams, each aggregated message chunk re-parses the args of
+all of its tool calls, and the output parser parses them again. The args of a
+finished call do not change any more, for large platform tool payloads (for
+example ``web_browser`` outputs) this repeated decoding dominates the cost.
+:func:`cached_parse_partial_json` keeps the results of recent argument strings.
+
+The parsed objects are shared between callers and must not be modified, the
+output parsers copy them where they leave as ``tool_input`` or ``outputs`` of
+an agent action.
+"""
+import threading
+from collections import OrderedDict
+from typing import Any
+
+from langchain_core.utils.json import parse_partial_json
+
+
+class PartialJsonMemo:
+    """LRU of ``parse_partial_json`` results keyed by the argument string."""
+
+    def __init__(self, max_size: int = 128, min_length: int = 256):
+        """
+        Args:
+            max_size: Number of parsed argument strings kept.
+            min_length: Shorter strings are parsed every time, they are cheap
+                and streaming deltas would only push the large payloads out.
+        """
+        self.max_size = max_size
+        self.min_length = min_length
+        self._entries: "OrderedDict[str, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def parse(self, s: str) -> Any:
+        if not isinstance(s, str) or len(s) < self.min_length:
+            return parse_partial_json(s)
+        with self._lock:
+            if s in self._entries:
+                self._entries.move_to_end(s)
+                self.hits += 1
+                return self._entries[s]
+        parsed = parse_partial_json(s)
+        with self._lock:
+            self.misses += 1
+            self._entries[s] = parsed
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return parsed
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+partial_json_memo = PartialJsonMemo()
+
+
+def cached_parse_partial_json(s: str) -> Any:
+    """``parse_partial_json`` through the shared :class:`PartialJsonMemo`."""
+    return partial_json_memo.parse(s)
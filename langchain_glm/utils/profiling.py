@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+"""Sampling profiler for single agent runs.
+
+A background thread samples the Python stacks of the process every
+``interval`` seconds while the run is in flight and counts them in the
+collapsed format read by ``flamegraph.pl``, speedscope and inferno, one
+``thread;outer;...;inner count`` line per distinct stack.
+
+The event loop and the executor threads are shared by every run of the
+process, samples of concurrent runs end up in the same profile. Threads
+waiting for work are left out.
+"""
+import logging
+import os
+import random
+import re
+import sys
+import threading
+from collections import Counter
+from types import FrameType
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def _frame_name(frame: FrameType) -> str:
+    code = frame.f_code
+    return (
+        f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+    )
+
+
+def _is_idle(frame: FrameType) -> bool:
+    """Event loop waiting in its selector, or executor worker waiting for a
+    work item."""
+    code = frame.f_code
+    if code.co_name == "select" and code.co_filename.endswith("selectors.py"):
+        return True
+    while frame is not None:
+        code = frame.f_code
+        if code.co_name == "get" and code.co_filename.endswith("queue.py"):
+            caller = frame.f_back
+            return (
+                caller is not None
+                and caller.f_code.co_name == "_worker"
+                and caller.f_code.co_filename.endswith("thread.py")
+            )
+        frame = frame.f_back
+    return False
+
+
+class StackSampler:
+    """Counts the stacks of every other thread, see :meth:`start`."""
+
+    def __init__(self, interval: float = 0.01, max_depth: int = 128):
+        """
+        Args:
+            interval: Seconds between two samples.
+            max_depth: Innermost frames kept of deeper stacks.
+        """
+        self.interval = interval
+        self.max_depth = max_depth
+        self.samples: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._thread_names: Dict[int, str] = {}
+
+    def start(self) -> "StackSampler":
+        self._thread = threading.Thread(
+            target=self._run, name="langchain-glm-profiler", daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        """Stop sampling, does not wait for the sampling thread."""
+        self._stop.set()
+
+    def join(self) -> None:
+        self.stop()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _thread_name(self, ident: int) -> str:
+        name = self._thread_names.get(ident)
+        if name is None:
+            self._thread_names = {
+                thread.ident: thread.name for thread in threading.enumerate()
+            }
+            name = self._thread_names.get(ident, str(ident))
+        return name
+
+    def _run(self) -> None:
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for ident, frame in sys._current_frames().items():
+                if ident == own or _is_idle(frame):
+                    continue
+                stack = []
+                while frame is not None and len(stack) < self.max_depth:
+                    stack.append(_frame_name(frame))
+                    frame = frame.f_back
+                stack.append(self._thread_name(ident))
+                self.samples[";".join(reversed(stack))] += 1
+
+    def folded(self) -> str:
+        """The samples in the collapsed stack format."""
+        return "".join(
+            f"{stack} {count}\n" for stack, count in sorted(self.samples.items())
+        )
+
+
+class RunProfiler:
+    """Picks the runs to profile and writes their profiles.
+
+    Example:
+
+        .. code-block:: python
+
+            runnable = ZhipuAIAllToolsRunnable.create_agent_executor(
+                "glm-4-alltools",
+                profiler=RunProfiler("profiles", sample_rate=0.01),
+            )
+            # profiles/<run_id>.folded
+            flamegraph.pl profiles/<run_id>.folded > run.svg
+    """
+
+    def __init__(
+        self, directory: str, sample_rate: float = 0.0, interval: float = 0.01
+    ):
+        """
+        Args:
+            directory: Where the profiles are written, created if missing.
+            sample_rate: Share of the runs profiled without being asked for.
+            interval: Seconds between two stack samples.
+        """
+        if not 0.0 <= sample_rate <= 1.0:
+            raise ValueError(f"sample_rate must be within [0, 1], got {sample_rate}")
+        self.directory = directory
+        self.sample_rate = sample_rate
+        self.interval = interval
+
+    def __deepcopy__(self, memo: Dict[int, Any]) -> "RunProfiler":
+        return self
+
+    def should_profile(self, requested: Optional[bool] = None) -> bool:
+        """``requested`` if given, else decided by the sample rate."""
+        if requested is not None:
+            return requested
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def start(self) -> StackSampler:
+        return StackSampler(self.interval).start()
+
+    def path(self, run_id: str) -> str:
+        return os.path.join(self.directory, re.sub(r"[^\w.-]", "_", run_id) + ".folded")
+
+    def write(self, sampler: StackSampler, run_id: str) -> str:
+        """Stop ``sampler`` and write its profile, returns the file path.
+
+        Blocks until the sampling thread is done, call it from an executor.
+        """
+        sampler.join()
+        os.makedirs(self.directory, exist_ok=True)
+        path = self.path(run_id)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(sampler.folded())
+        logger.info(f"profile of run {run_id} written to {path}")
+        return path
@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+"""Stage timers of one agent turn.
+
+The timers are spread over the agent, the chat model and the callback
+handler, they report to the :class:`TurnTiming` of the running turn, found
+through a context variable. Outside of a timed turn :func:`timed` returns a
+shared no-op context manager, a timer then costs one context variable lookup.
+
+Stages nest, ``plan`` contains ``prompt``, ``upstream``, ``stream_parse`` and
+``output_parse`` of the model call, so their times do not add up to the
+total.
+"""
+import logging
+import threading
+import time
+from contextlib import nullcontext
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Dict, List, Optional, TypeVar
+
+from langchain_core.runnables import RunnableConfig
+from langchain_core.runnables.base import RunnableBinding
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+_current: ContextVar[Optional["TurnTiming"]] = ContextVar(
+    "langchain_glm_turn_timing", default=None
+)
+_OFF = nullcontext()
+
+
+class _StageTimer:
+    __slots__ = ("timing", "stage", "start")
+
+    def __init__(self, timing: "TurnTiming", stage: str):
+        self.timing = timing
+        self.stage = stage
+
+    def __enter__(self) -> None:
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc: Any) -> None:
+        self.timing.add(self.stage, time.perf_counter() - self.start)
+
+
+class TurnTiming:
+    """Seconds and number of calls per stage of one turn.
+
+    Thread safe, the model stream and sync tools report from executor
+    threads.
+    """
+
+    def __init__(self, run_id: str):
+        self.run_id = run_id
+        self.stages: Dict[str, List[float]] = {}
+        self.start = time.perf_counter()
+        self.total: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def stage(self, stage: str) -> _StageTimer:
+        """Context manager adding its duration to ``stage``."""
+        return _StageTimer(self, stage)
+
+    def add(self, stage: str, seconds: float) -> None:
+        with self._lock:
+            entry = self.stages.get(stage)
+            if entry is None:
+                self.stages[stage] = [seconds, 1]
+            else:
+                entry[0] += seconds
+                entry[1] += 1
+
+    def finish(self) -> float:
+        """Stop the turn clock, returns the total seconds."""
+        if self.total is None:
+            self.total = time.perf_counter() - self.start
+        return self.total
+
+    def to_dict(self) -> Dict[str, Any]:
+        total = self.total
+        if total is None:
+            total = time.perf_counter() - self.start
+        with self._lock:
+            stages = {
+                stage: {"ms": round(seconds * 1000, 3), "count": int(count)}
+                for stage, (seconds, count) in self.stages.items()
+            }
+        return {
+            "run_id": self.run_id,
+            "total_ms": round(total * 1000, 3),
+            "stages": stages,
+        }
+
+
+TimingSink = Callable[[TurnTiming], None]
+"""Receives the timing of every finished turn."""
+
+
+def logging_sink(timing: TurnTiming) -> None:
+    """Sink logging the timing of a turn at debug level."""
+    logger.debug(f"turn timing {timing.to_dict()}")
+
+
+def current_timing() -> Optional[TurnTiming]:
+    return _current.get()
+
+
+def timed(stage: str) -> Any:
+    """Time the block as ``stage`` of the current turn, if it is timed."""
+    timing = _current.get()
+    if timing is None:
+        return _OFF
+    return _StageTimer(timing, stage)
+
+
+async def run_timed(timing: TurnTiming, awaitable: Awaitable[T]) -> T:
+    """Await ``awaitable`` with ``timing`` as the current turn timing.
+
+    Meant to be wrapped in a task, the context variable is then only set in
+    the context of that task.
+    """
+    _current.set(timing)
+    return await awaitable
+
+
+class TimedRunnable(RunnableBinding):
+    """Times ``invoke`` of the bound runnable as ``stage``, without adding a
+    run of its own to the trace."""
+
+    stage: str
+
+    def __init__(self, bound: Any, stage: str, **kwargs: Any):
+        super().__init__(bound=bound, stage=stage, **kwargs)
+
+    def invoke(
+        self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any
+    ) -> Any:
+        with timed(self.stage):
+            return super().invoke(input, config, **kwargs)
+
+    async def ainvoke(
+        self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any
+    ) -> Any:
+        with timed(self.stage):
+            return await super().ainvoke(input, config, **kwargs)
@@ -0,0 +1,8 @@
+# -*- coding: utf-8 -*-
+from langchain_glm.vectorstores.index import VectorIndex
+from langchain_glm.vectorstores.store import ZhipuAIVectorStore
+
+__all__ = [
+    "VectorIndex",
+    "ZhipuAIVectorStore",
+]
@@ -0,0 +1,334 @@
+# -*- coding: utf-8 -*-
+"""Exact and IVF nearest neighbour search over a float32 matrix."""
+import json
+import logging
+import os
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# bound of the temporary (queries x rows) score matrix, in floats
+_MAX_SCORE_BLOCK = 1 << 24
+
+
+def normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    """Float32 copy of ``vectors`` with every row scaled to unit length."""
+    vectors = np.array(vectors, dtype=np.float32, ndmin=2)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    np.divide(vectors, norms, out=vectors, where=norms > 0)
+    return vectors
+
+
+def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Column indices of the ``k`` best scores of every row, best first."""
+    if k >= scores.shape[1]:
+        return np.argsort(-scores, axis=1)
+    top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    order = np.argsort(-np.take_along_axis(scores, top, axis=1), axis=1)
+    return np.take_along_axis(top, order, axis=1)
+
+
+def _save_array(path: str, array: np.ndarray) -> None:
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        np.save(f, array)
+    os.replace(tmp, path)
+
+
+class VectorIndex:
+    """Unit length float32 vectors with string ids, scored by cosine similarity.
+
+    Search is an exact matrix product over all live rows, unless an IVF coarse
+    index was built with :meth:`build_ivf`, then only the rows of the
+    ``n_probe`` closest clusters of a query are scored. Deleted rows are
+    masked until :meth:`compact` drops them.
+    """
+
+    def __init__(self, dim: Optional[int] = None):
+        self.dim = dim
+        self._vectors = np.zeros((0, dim or 0), dtype=np.float32)
+        self._size = 0
+        self._live = np.zeros(0, dtype=bool)
+        self._ids: List[str] = []
+        self._rows: Dict[str, int] = {}
+        # IVF coarse index
+        self.centroids: Optional[np.ndarray] = None
+        self.n_probe = 8
+        self._assignments = np.zeros(0, dtype=np.int32)
+        self._lists: Optional[List[np.ndarray]] = None
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def __contains__(self, id_: str) -> bool:
+        return id_ in self._rows
+
+    @property
+    def ids(self) -> List[str]:
+        return [id_ for row, id_ in enumerate(self._ids) if self._live[row]]
+
+    @property
+    def vectors(self) -> np.ndarray:
+        """The rows in use, deleted ones included."""
+        return self._vectors[: self._size]
+
+    def _reserve(self, rows: int) -> None:
+        capacity = self._vectors.shape[0]
+        writable = isinstance(self._vectors, np.ndarray) and not isinstance(
+            self._vectors, np.memmap
+        )
+        if rows <= capacity and writable:
+            return
+        # grow geometrically, a memory mapped matrix is copied into memory
+        capacity = max(rows, 2 * capacity, 64)
+        vectors = np.zeros((capacity, self.dim), dtype=np.float32)
+        if self._size:
+            vectors[: self._size] = self._vectors[: self._size]
+        self._vectors = vectors
+        live = np.zeros(capacity, dtype=bool)
+        live[: self._size] = self._live[: self._size]
+        self._live = live
+        assignments = np.zeros(capacity, dtype=np.int32)
+        assignments[: self._size] = self._assignments[: self._size]
+        self._assignments = assignments
+
+    def add(self, ids: Sequence[str], vectors: np.ndarray) -> None:
+        """Add or replace vectors, they are normalized to unit length.
+
+        An id given several times keeps the last of its vectors.
+        """
+        if len(ids) == 0:
+            return
+        vectors = normalize_rows(vectors)
+        if len(ids) != len(vectors):
+            raise ValueError(f"Got {len(ids)} ids for {len(vectors)} vectors")
+        if self.dim is None:
+            self.dim = vectors.shape[1]
+        if vectors.shape[1] != self.dim:
+            raise ValueError(
+                f"Vectors of dimension {vectors.shape[1]} do not fit an index of "
+                f"dimension {self.dim}"
+            )
+        rows = {id_: row for row, id_ in enumerate(ids)}
+        if len(rows) < len(ids):
+            # an id repeated within the batch keeps its last vector
+            keep = sorted(rows.values())
+            ids = [ids[row] for row in keep]
+            vectors = vectors[keep]
+        self.delete([id_ for id_ in ids if id_ in self._rows])
+        start = self._size
+        self._reserve(start + len(ids))
+        self._vectors[start : start + len(ids)] = vectors
+        self._live[start : start + len(ids)] = True
+        for offset, id_ in enumerate(ids):
+            self._rows[id_] = start + offset
+        self._ids.extend(ids)
+        self._size += len(ids)
+        if self.centroids is not None:
+            self._assignments[start : self._size] = self._assign(vectors)
+            self._lists = None
+
+    def delete(self, ids: Sequence[str]) -> int:
+        """Remove ids, unknown ones are ignored. Returns the number removed."""
+        removed = 0
+        for id_ in ids:
+            row = self._rows.pop(id_, None)
+            if row is not None:
+                self._live[row] = False
+                removed += 1
+        if removed:
+            self._lists = None
+        if self._size and len(self._rows) < self._size // 2:
+            self.compact()
+        return removed
+
+    def mask(self, ids: Iterable[str]) -> np.ndarray:
+        """Boolean mask over :attr:`vectors` selecting ``ids``, for :meth:`search`."""
+        mask = np.zeros(self._size, dtype=bool)
+        mask[[self._rows[id_] for id_ in ids if id_ in self._rows]] = True
+        return mask
+
+    def get(self, ids: Sequence[str]) -> np.ndarray:
+        return self._vectors[[self._rows[id_] for id_ in ids]]
+
+    def compact(self) -> None:
+        """Drop the rows of deleted vectors."""
+        keep = np.flatnonzero(self._live[: self._size])
+        self._vectors = np.ascontiguousarray(self._vectors[keep])
+        self._assignments = self._assignments[keep]
+        self._ids = [self._ids[row] for row in keep]
+        self._size = len(keep)
+        self._live = np.ones(self._size, dtype=bool)
+        self._rows = {id_: row for row, id_ in enumerate(self._ids)}
+        self._lists = None
+
+    def _assign(self, vectors: np.ndarray) -> np.ndarray:
+        assignments = np.empty(len(vectors), dtype=np.int32)
+        step = max(1, _MAX_SCORE_BLOCK // max(len(self.centroids), 1))
+        for i in range(0, len(vectors), step):
+            block = vectors[i : i + step] @ self.centroids.T
+            assignments[i : i + step] = np.argmax(block, axis=1)
+        return assignments
+
+    def build_ivf(
+        self,
+        n_lists: Optional[int] = None,
+        n_probe: int = 8,
+        iterations: int = 10,
+        sample_size: int = 65536,
+        seed: int = 0,
+    ) -> None:
+        """Cluster the vectors with spherical k-means for approximate search.
+
+        Args:
+            n_lists: Number of clusters, ``sqrt(len(self))`` by default.
+            n_probe: Clusters scored per query, more is slower and more exact.
+            iterations: k-means iterations.
+            sample_size: Vectors the clusters are trained on.
+            seed: Seed of the sampling.
+        """
+        live = np.flatnonzero(self._live[: self._size])
+        if len(live) == 0:
+            raise ValueError("Can not build an IVF index without vectors")
+        n_lists = min(n_lists or max(int(np.sqrt(len(live))), 1), len(live))
+        rng = np.random.default_rng(seed)
+        sample = self._vectors[
+            np.sort(rng.choice(live, min(sample_size, len(live)), replace=False))
+        ]
+        centroids = sample[rng.choice(len(sample), n_lists, replace=False)].copy()
+        for _ in range(iterations):
+            self.centroids = centroids
+            assignments = self._assign(sample)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignments, sample)
+            empty = np.flatnonzero(~sums.any(axis=1))
+            # reseed empty clusters with random vectors of the sample
+            sums[empty] = sample[rng.choice(len(sample), len(empty))]
+            centroids = normalize_rows(sums)
+        self.centroids = centroids
+        self.n_probe = n_probe
+        self._assignments = np.zeros(self._vectors.shape[0], dtype=np.int32)
+        self._assignments[: self._size] = self._assign(self._vectors[: self._size])
+        self._lists = None
+
+    def drop_ivf(self) -> None:
+        self.centroids = None
+        self._lists = None
+
+    def _inverted_lists(self) -> List[np.ndarray]:
+        if self._lists is None:
+            live = np.flatnonzero(self._live[: self._size])
+            assignments = self._assignments[live]
+            order = np.argsort(assignments, kind="stable")
+            bounds = np.searchsorted(
+                assignments[order], np.arange(len(self.centroids) + 1)
+            )
+            rows = live[order]
+            self._lists = [
+                rows[bounds[i] : bounds[i + 1]] for i in range(len(self.centroids))
+            ]
+        return self._lists
+
+    def search(
+        self,
+        queries: np.ndarray,
+        k: int = 4,
+        allowed: Optional[np.ndarray] = None,
+    ) -> List[List[Tuple[str, float]]]:
+        """The ``k`` most similar ids of every query with their cosine similarity.
+
+        Args:
+            queries: One query vector or a matrix with one query per row.
+            k: Number of results per query.
+            allowed: Boolean mask over :attr:`vectors`, only rows set in it
+                are returned.
+        """
+        queries = normalize_rows(queries)
+        if not self._rows or k <= 0:
+            return [[] for _ in queries]
+        live = self._live[: self._size]
+        if allowed is not None:
+            live = live & allowed[: self._size]
+        n_live = int(live.sum())
+        if n_live == 0:
+            return [[] for _ in queries]
+        use_ivf = self.centroids is not None and self.n_probe < len(self.centroids)
+        if use_ivf:
+            return [self._search_ivf(query, k, live) for query in queries]
+
+        results: List[List[Tuple[str, float]]] = []
+        step = max(1, _MAX_SCORE_BLOCK // max(self._size, 1))
+        for i in range(0, len(queries), step):
+            scores = queries[i : i + step] @ self._vectors[: self._size].T
+            scores[:, ~live] = -np.inf
+            top = _top_k(scores, min(k, n_live))
+            for row_scores, rows in zip(scores, top):
+                results.append(
+                    [(self._ids[row], float(row_scores[row])) for row in rows]
+                )
+        return results
+
+    def _search_ivf(
+        self, query: np.ndarray, k: int, live: np.ndarray
+    ) -> List[Tuple[str, float]]:
+        lists = self._inverted_lists()
+        probe = _top_k((query @ self.centroids.T)[None, :], self.n_probe)[0]
+        rows = np.concatenate([lists[i] for i in probe])
+        rows = rows[live[rows]]
+        if len(rows) == 0:
+            return []
+        scores = self._vectors[rows] @ query
+        top = _top_k(scores[None, :], min(k, len(rows)))[0]
+        return [(self._ids[rows[i]], float(scores[i])) for i in top]
+
+    def save(self, path: str) -> None:
+        """Write the index into the directory ``path``."""
+        if len(self._rows) < self._size:
+            self.compact()
+        os.makedirs(path, exist_ok=True)
+        # write next to the files and rename, the vectors may be memory mapped
+        # from the very file being replaced
+        _save_array(os.path.join(path, "vectors.npy"), self.vectors)
+        if self.centroids is not None:
+            _save_array(os.path.join(path, "centroids.npy"), self.centroids)
+            _save_array(
+                os.path.join(path, "assignments.npy"), self._assignments[: self._size]
+            )
+        else:
+            for name in ("centroids.npy", "assignments.npy"):
+                if os.path.exists(os.path.join(path, name)):
+                    os.remove(os.path.join(path, name))
+        tmp = os.path.join(path, "index.json.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(
+                {"dim": self.dim, "ids": self._ids, "n_probe": self.n_probe},
+                f,
+                ensure_ascii=False,
+            )
+        os.replace(tmp, os.path.join(path, "index.json"))
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = True) -> "VectorIndex":
+        """Read an index written by :meth:`save`.
+
+        With ``mmap`` the vectors stay on disk and are paged in by searches,
+        the first :meth:`add` copies them into memory.
+        """
+        with open(os.path.join(path, "index.json"), encoding="utf-8") as f:
+            meta = json.load(f)
+        index = cls(meta["dim"])
+        index._vectors = np.load(
+            os.path.join(path, "vectors.npy"), mmap_mode="r" if mmap else None
+        )
+        index._size = index._vectors.shape[0]
+        index._live = np.ones(index._size, dtype=bool)
+        index._ids = list(meta["ids"])
+        index._rows = {id_: row for row, id_ in enumerate(index._ids)}
+        index.n_probe = meta.get("n_probe", index.n_probe)
+        index._assignments = np.zeros(index._size, dtype=np.int32)
+        if os.path.exists(os.path.join(path, "centroids.npy")):
+            index.centroids = np.load(os.path.join(path, "centroids.npy"))
+            index._assignments = np.load(os.path.join(path, "assignments.npy"))
+        return index
@@ -0,0 +1,214 @@
+# -*- coding: utf-8 -*-
+"""In-process LangChain vector store on top of :class:`VectorIndex`."""
+import json
+import logging
+import os
+import uuid
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+)
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+
+from langchain_glm.embeddings.base import ZhipuAIEmbeddings
+from langchain_glm.vectorstores.index import VectorIndex
+
+logger = logging.getLogger(__name__)
+
+Filter = Union[Dict[str, Any], Callable[[Dict[str, Any]], bool]]
+
+
+class ZhipuAIVectorStore(VectorStore):
+    """Vector store keeping the vectors in a float32 matrix of this process.
+
+    Meant for semantic caches, tool retrieval and small RAG sets that do not
+    need a vector database. ``save_local`` writes the index to a directory,
+    ``load_local`` memory maps it back.
+
+    Example:
+        .. code-block:: python
+
+            from langchain_glm.embeddings import ZhipuAIEmbeddings
+            from langchain_glm.vectorstores import ZhipuAIVectorStore
+
+            store = ZhipuAIVectorStore.from_texts(texts, ZhipuAIEmbeddings())
+            store.similarity_search("query", k=4)
+    """
+
+    def __init__(
+        self,
+        embedding: Embeddings,
+        index: Optional[VectorIndex] = None,
+        documents: Optional[Dict[str, Document]] = None,
+    ):
+        self._embedding = embedding
+        self.index = index or VectorIndex()
+        self.documents: Dict[str, Document] = documents or {}
+
+    @property
+    def embeddings(self) -> Optional[Embeddings]:
+        return self._embedding
+
+    def _embed_texts(self, texts: List[str]) -> np.ndarray:
+        if isinstance(self._embedding, ZhipuAIEmbeddings):
+            return self._embedding.embed_documents_into(texts, normalize=True)
+        return np.asarray(self._embedding.embed_documents(texts), dtype=np.float32)
+
+    def add_texts(
+        self,
+        texts: Iterable[str],
+        metadatas: Optional[List[dict]] = None,
+        *,
+        ids: Optional[List[str]] = None,
+        **kwargs: Any,
+    ) -> List[str]:
+        texts = list(texts)
+        ids = list(ids) if ids else [str(uuid.uuid4()) for _ in texts]
+        metadatas = metadatas or [{} for _ in texts]
+        vectors = self._embed_texts(texts)
+        self.index.add(ids, vectors)
+        for id_, text, metadata in zip(ids, texts, metadatas):
+            self.documents[id_] = Document(id=id_, page_content=text, metadata=metadata)
+        return ids
+
+    def delete(self, ids: Optional[List[str]] = None, **kwargs: Any) -> Optional[bool]:
+        if ids is None:
+            return False
+        for id_ in ids:
+            self.documents.pop(id_, None)
+        return self.index.delete(ids) > 0
+
+    def get_by_ids(self, ids: Sequence[str], /) -> List[Document]:
+        return [self.documents[id_] for id_ in ids if id_ in self.documents]
+
+    def _allowed(self, filter: Optional[Filter]) -> Optional[np.ndarray]:
+        if filter is None:
+            return None
+        if callable(filter):
+            match = filter
+        else:
+
+            def match(metadata: Dict[str, Any]) -> bool:
+                return all(metadata.get(key) == value for key, value in filter.items())
+
+        return self.index.mask(
+            id_ for id_, document in self.documents.items() if match(document.metadata)
+        )
+
+    def batch_similarity_search_with_score_by_vector(
+        self,
+        embeddings: Union[np.ndarray, List[List[float]]],
+        k: int = 4,
+        filter: Optional[Filter] = None,
+    ) -> List[List[Tuple[Document, float]]]:
+        """Top ``k`` documents of many query vectors in one matrix product.
+
+        Args:
+            embeddings: Query vectors, one per row.
+            k: Number of documents per query.
+            filter: Metadata values the documents must have, or a predicate
+                over the metadata.
+
+        Returns:
+            For every query the documents with their cosine similarity.
+        """
+        results = self.index.search(np.asarray(embeddings), k, self._allowed(filter))
+        return [
+            [(self.documents[id_], score) for id_, score in hits] for hits in results
+        ]
+
+    def batch_similarity_search_with_score(
+        self, queries: List[str], k: int = 4, filter: Optional[Filter] = None
+    ) -> List[List[Tuple[Document, float]]]:
+        return self.batch_similarity_search_with_score_by_vector(
+            self._embed_texts(queries), k, filter
+        )
+
+    def similarity_search_with_score_by_vector(
+        self, embedding: List[float], k: int = 4, filter: Optional[Filter] = None
+    ) -> List[Tuple[Document, float]]:
+        return self.batch_similarity_search_with_score_by_vector(
+            [embedding], k, filter
+        )[0]
+
+    def similarity_search_with_score(
+        self, query: str, k: int = 4, filter: Optional[Filter] = None, **kwargs: Any
+    ) -> List[Tuple[Document, float]]:
+        return self.similarity_search_with_score_by_vector(
+            self._embedding.embed_query(query), k, filter
+        )
+
+    def similarity_search_by_vector(
+        self, embedding: List[float], k: int = 4, **kwargs: Any
+    ) -> List[Document]:
+        return [
+            document
+            for document, _ in self.similarity_search_with_score_by_vector(
+                embedding, k, kwargs.get("filter")
+            )
+        ]
+
+    def similarity_search(
+        self, query: str, k: int = 4, **kwargs: Any
+    ) -> List[Document]:
+        return [
+            document
+            for document, _ in self.similarity_search_with_score(query, k, **kwargs)
+        ]
+
+    def _select_relevance_score_fn(self) -> Callable[[float], float]:
+        # cosine similarity in [-1, 1]
+        return lambda score: (score + 1.0) / 2.0
+
+    @classmethod
+    def from_texts(
+        cls,
+        texts: List[str],
+        embedding: Embeddings,
+        metadatas: Optional[List[dict]] = None,
+        *,
+        ids: Optional[List[str]] = None,
+        **kwargs: Any,
+    ) -> "ZhipuAIVectorStore":
+        store = cls(embedding, **kwargs)
+        store.add_texts(texts, metadatas, ids=ids)
+        return store
+
+    def save_local(self, path: str) -> None:
+        """Write the vectors and documents into the directory ``path``."""
+        self.index.save(path)
+        tmp = os.path.join(path, "documents.json.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    id_: {"page_content": doc.page_content, "metadata": doc.metadata}
+                    for id_, doc in self.documents.items()
+                },
+                f,
+                ensure_ascii=False,
+            )
+        os.replace(tmp, os.path.join(path, "documents.json"))
+
+    @classmethod
+    def load_local(
+        cls, path: str, embedding: Embeddings, mmap: bool = True
+    ) -> "ZhipuAIVectorStore":
+        """Read a store written by :meth:`save_local`, memory mapping the vectors."""
+        index = VectorIndex.load(path, mmap=mmap)
+        with open(os.path.join(path, "documents.json"), encoding="utf-8") as f:
+            documents = {
+                id_: Document(id=id_, **document)
+                for id_, document in json.load(f).items()
+            }
+        return cls(embedding, index=index, documents=documents)
@@ -1,317 +1,4 @@
 # -*- coding: utf-8 -*-
-import contextlib
-import json
-import logging
-import os
-from typing import Any, Callable, Dict, Iterator, List, Tuple, Union
+from langchain_glm.server.client import ZhipuAIPluginsClient
 
-import httpx
-
-# httpx 请求默认超时时间（秒）。如果加载模型或对话较慢，出现超时错误，可以适当加大该值。
-HTTPX_DEFAULT_TIMEOUT = 300.0
-
-logger = logging.getLogger(__name__)
-log_verbose = False
-
-
-def get_httpx_client(
-    use_async: bool = False,
-    proxies: Union[str, Dict] = None,
-    timeout: float = HTTPX_DEFAULT_TIMEOUT,
-    unused_proxies: List[str] = [],
-    **kwargs,
-) -> Union[httpx.Client, httpx.AsyncClient]:
-    """
-    helper to get httpx client with default proxies that bypass local addesses.
-    """
-    default_proxies = {
-        # do not use proxy for locahost
-        "all://127.0.0.1": None,
-        "all://localhost": None,
-    }
-    # do not use proxy for user deployed fastchat servers
-    for x in unused_proxies:
-        host = ":".join(x.split(":")[:2])
-        default_proxies.update({host: None})
-
-    # get proxies from system envionrent
-    # proxy not str empty string, None, False, 0, [] or {}
-    default_proxies.update(
-        {
-            "http://": (
-                os.environ.get("http_proxy")
-                if os.environ.get("http_proxy")
-                and len(os.environ.get("http_proxy").strip())
-                else None
-            ),
-            "https://": (
-                os.environ.get("https_proxy")
-                if os.environ.get("https_proxy")
-                and len(os.environ.get("https_proxy").strip())
-                else None
-            ),
-            "all://": (
-                os.environ.get("all_proxy")
-                if os.environ.get("all_proxy")
-                and len(os.environ.get("all_proxy").strip())
-                else None
-            ),
-        }
-    )
-    for host in os.environ.get("no_proxy", "").split(","):
-        if host := host.strip():
-            # default_proxies.update({host: None}) # Origin code
-            default_proxies.update(
-                {"all://" + host: None}
-            )  # PR 1838 fix, if not add 'all://', httpx will raise error
-
-    # merge default proxies with user provided proxies
-    if isinstance(proxies, str):
-        proxies = {"all://": proxies}
-
-    if isinstance(proxies, dict):
-        default_proxies.update(proxies)
-
-    # construct Client
-    kwargs.update(timeout=timeout, proxies=default_proxies)
-
-    if log_verbose:
-        logger.info(f"{get_httpx_client.__class__.__name__}:kwargs: {kwargs}")
-
-    if use_async:
-        return httpx.AsyncClient(**kwargs)
-    else:
-        return httpx.Client(**kwargs)
-
-
-class ZhipuAIPluginsClient:
-    """ """
-
-    def __init__(
-        self,
-        base_url: str,
-        timeout: float = HTTPX_DEFAULT_TIMEOUT,
-        use_async: bool = False,
-    ):
-        self.base_url = base_url
-        self.timeout = timeout
-        self._use_async = use_async
-        self._client = None
-
-    @property
-    def client(self):
-        if self._client is None or self._client.is_closed:
-            self._client = get_httpx_client(
-                base_url=self.base_url,
-                use_async=self._use_async,
-                timeout=self.timeout,
-                unused_proxies=[self.base_url],
-            )
-        return self._client
-
-    def get(
-        self,
-        url: str,
-        params: Union[Dict, List[Tuple], bytes] = None,
-        stream: bool = False,
-        **kwargs: Any,
-    ) -> Union[httpx.Response, Iterator[httpx.Response], None]:
-        try:
-            if stream:
-                return self.client.stream("GET", url, params=params, **kwargs)
-            else:
-                return self.client.get(url, params=params, **kwargs)
-        except Exception as e:
-            msg = f"error when get {url}: {e}"
-            logger.error(
-                f"{e.__class__.__name__}: {msg}", exc_info=e if log_verbose else None
-            )
-
-    def post(
-        self,
-        url: str,
-        data: Dict = None,
-        json: Dict = None,
-        stream: bool = False,
-        **kwargs: Any,
-    ) -> Union[httpx.Response, Iterator[httpx.Response], None]:
-        try:
-            # print(kwargs)
-            if stream:
-                return self.client.stream("POST", url, data=data, json=json, **kwargs)
-            else:
-                return self.client.post(url, data=data, json=json, **kwargs)
-        except Exception as e:
-            msg = f"error when post {url}: {e}"
-            logger.error(
-                f"{e.__class__.__name__}: {msg}", exc_info=e if log_verbose else None
-            )
-
-    def _httpx_stream2generator(
-        self,
-        response: contextlib._GeneratorContextManager,
-        as_json: bool = False,
-    ):
-        """
-        将httpx.stream返回的GeneratorContextManager转化为普通生成器
-        """
-
-        async def ret_async(response, as_json):
-            try:
-                async with response as r:
-                    chunk_cache = ""
-                    async for chunk in r.aiter_text(None):
-                        if not chunk:  # fastchat api yield empty bytes on start and end
-                            continue
-                        if as_json:
-                            try:
-                                if chunk.startswith("data: "):
-                                    data = json.loads(chunk_cache + chunk[6:-2])
-                                elif chunk.startswith(":"):  # skip sse comment line
-                                    continue
-                                else:
-                                    data = json.loads(chunk_cache + chunk)
-
-                                chunk_cache = ""
-                                yield data
-                            except Exception as e:
-                                msg = f"接口返回json错误： ‘{chunk}’。错误信息是：{e}。"
-                                logger.error(
-                                    f"{e.__class__.__name__}: {msg}",
-                                    exc_info=e if log_verbose else None,
-                                )
-
-                                if chunk.startswith("data: "):
-                                    chunk_cache += chunk[6:-2]
-                                elif chunk.startswith(":"):  # skip sse comment line
-                                    continue
-                                else:
-                                    chunk_cache += chunk
-                                continue
-                        else:
-                            # print(chunk, end="", flush=True)
-                            yield chunk
-            except httpx.ConnectError as e:
-                msg = f"无法连接API服务器，请确认 ‘api.py’ 已正常启动。({e})"
-                logger.error(msg)
-                yield {"code": 500, "msg": msg}
-            except httpx.ReadTimeout as e:
-                msg = f"API通信超时，请确认已启动FastChat与API服务（详见Wiki '5. 启动 API 服务或 Web UI'）。（{e}）"
-                logger.error(msg)
-                yield {"code": 500, "msg": msg}
-            except Exception as e:
-                msg = f"API通信遇到错误：{e}"
-                logger.error(
-                    f"{e.__class__.__name__}: {msg}",
-                    exc_info=e if log_verbose else None,
-                )
-                yield {"code": 500, "msg": msg}
-
-        def ret_sync(response, as_json):
-            try:
-                with response as r:
-                    chunk_cache = ""
-                    for chunk in r.iter_text(None):
-                        if not chunk:  # fastchat api yield empty bytes on start and end
-                            continue
-                        if as_json:
-                            try:
-                                if chunk.startswith("data: "):
-                                    data = json.loads(chunk_cache + chunk[6:-4])
-                                elif chunk.startswith(":"):  # skip sse comment line
-                                    continue
-                                else:
-                                    data = json.loads(chunk_cache + chunk)
-
-                                chunk_cache = ""
-                                yield data
-                            except Exception as e:
-                                if chunk.startswith("data: "):
-                                    chunk_cache += chunk[6:]
-                                elif chunk.startswith(":"):  # skip sse comment line
-                                    continue
-                                else:
-                                    chunk_cache += chunk
-                                continue
-                        else:
-                            # print(chunk, end="", flush=True)
-                            yield chunk
-            except httpx.ConnectError as e:
-                msg = f"无法连接API服务器，请确认 ‘api.py’ 已正常启动。({e})"
-                logger.error(msg)
-                yield {"code": 500, "msg": msg}
-            except httpx.ReadTimeout as e:
-                msg = f"API通信超时，请确认已启动FastChat与API服务（详见Wiki '5. 启动 API 服务或 Web UI'）。（{e}）"
-                logger.error(msg)
-                yield {"code": 500, "msg": msg}
-            except Exception as e:
-                msg = f"API通信遇到错误：{e}"
-                logger.error(
-                    f"{e.__class__.__name__}: {msg}",
-                    exc_info=e if log_verbose else None,
-                )
-                yield {"code": 500, "msg": msg}
-
-        if self._use_async:
-            return ret_async(response, as_json)
-        else:
-            return ret_sync(response, as_json)
-
-    def _get_response_value(
-        self,
-        response: httpx.Response,
-        as_json: bool = False,
-        value_func: Callable = None,
-    ):
-        """
-        转换同步或异步请求返回的响应
-        `as_json`: 返回json
-        `value_func`: 用户可以自定义返回值，该函数接受response或json
-        """
-
-        def to_json(r):
-            try:
-                return r.json()
-            except Exception as e:
-                msg = "API未能返回正确的JSON。" + str(e)
-                if log_verbose:
-                    logger.error(
-                        f"{e.__class__.__name__}: {msg}",
-                        exc_info=e if log_verbose else None,
-                    )
-                return {"code": 500, "msg": msg, "data": None}
-
-        if value_func is None:
-            value_func = lambda r: r
-
-        async def ret_async(response):
-            if as_json:
-                return value_func(to_json(await response))
-            else:
-                return value_func(await response)
-
-        if self._use_async:
-            return ret_async(response)
-        else:
-            if as_json:
-                return value_func(to_json(response))
-            else:
-                return value_func(response)
-
-    def chat(
-        self,
-        query: str,
-        history: List[Dict] = [],
-    ):
-        """ """
-        data = {
-            "query": query,
-            "history": history,
-        }
-
-        response = self.post(
-            "/chat",
-            json=data,
-            stream=True,
-        )
-        return self._httpx_stream2generator(response, as_json=True)
+__all__ = ["ZhipuAIPluginsClient"]
@@ -1,13 +1,12 @@
 # -*- coding: utf-8 -*-
 import logging.config
 import threading
-from typing import List, Tuple
+from typing import List, Optional
 
 from fastapi import APIRouter, Body, FastAPI, status
 from fastapi.middleware.cors import CORSMiddleware
 from langchain.agents import tool
 from langchain_community.tools import ShellTool
-from langchain_core.agents import AgentAction
 from pydantic.v1 import Extra, Field
 from sse_starlette.sse import EventSourceResponse
 from uvicorn import Config, Server
@@ -18,6 +17,7 @@ from zhipuai.core.logs import (
 )
 
 from langchain_glm.agent_toolkits import BaseToolOutput
+from langchain_glm.agents import ToolResultCache
 from langchain_glm.agents.zhipuai_all_tools import ZhipuAIAllToolsRunnable
 from langchain_glm.agents.zhipuai_all_tools.base import OutputType
 
@@ -38,6 +38,9 @@ def calculate(text: str = Field(description="a math expression")) -> BaseToolOut
     return BaseToolOutput(ret)
 
 
+calculate.metadata = {"cacheable": True}
+
+
 @tool
 def shell(query: str = Field(description="The command to execute")):
     """Use Shell to execute system shell commands"""
@@ -45,7 +48,24 @@ def shell(query: str = Field(description="The command to execute")):
     return BaseToolOutput(tool.run(tool_input=query))
 
 
-intermediate_steps: List[Tuple[AgentAction, BaseToolOutput]] = []
+_agent_executor: Optional[ZhipuAIAllToolsRunnable] = None
+
+
+def get_agent_executor() -> ZhipuAIAllToolsRunnable:
+    """One runnable serves every request, the state lives in per request sessions."""
+    global _agent_executor
+    if _agent_executor is None:
+        _agent_executor = ZhipuAIAllToolsRunnable.create_agent_executor(
+            model_name="glm-4-alltools",
+            tools=[
+                {"type": "code_interpreter"},
+                {"type": "web_browser"},
+                {"type": "drawing_tool"},
+                calculate,
+            ],
+            tool_cache=ToolResultCache(),
+        )
+    return _agent_executor
 
 
 async def chat(
@@ -63,26 +83,14 @@ async def chat(
     ),
 ):
     """Agent 对话"""
-    agent_executor = ZhipuAIAllToolsRunnable.create_agent_executor(
-        model_name="glm-4-alltools",
-        history=history,
-        intermediate_steps=intermediate_steps,
-        tools=[
-            {"type": "code_interpreter"},
-            {"type": "web_browser"},
-            {"type": "drawing_tool"},
-            calculate,
-        ],
-    )
-    chat_iterator = agent_executor.invoke(chat_input=query)
+    agent_executor = get_agent_executor()
+    session = agent_executor.new_session(message_id, history=history)
+    chat_iterator = agent_executor.invoke(chat_input=query, session=session)
 
     async def chat_generator():
         async for chat_output in chat_iterator:
             yield chat_output.to_json()
 
-            # if agent_executor.callback.out:
-            # intermediate_steps.extend(agent_executor.callback.intermediate_steps)
-
     return EventSourceResponse(chat_generator())
 
 
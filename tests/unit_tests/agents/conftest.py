@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+"""Fake chat model and runnable builder shared by the agent unit tests."""
+from typing import Any, Callable, List, Optional
+
+import pytest
+from langchain_core.callbacks import CallbackManagerForLLMRun
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+from langchain_core.tools import BaseTool
+
+from langchain_glm.agents.all_tools_agent import ZhipuAiAllToolsAgentExecutor
+from langchain_glm.agents.all_tools_bind.base import create_zhipuai_tools_agent
+from langchain_glm.agents.zhipuai_all_tools import ZhipuAIAllToolsRunnable
+
+
+class ToolCallingChatModel(BaseChatModel):
+    """Calls ``tool_name`` once with the human input as ``text``, then answers
+    with the tool output."""
+
+    tool_name: str
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        if isinstance(messages[-1], ToolMessage):
+            message = AIMessage(content=f"answer {messages[-1].content}")
+        else:
+            message = AIMessage(
+                content="",
+                additional_kwargs={
+                    "tool_calls": [
+                        {
+                            "id": "call_0",
+                            "type": "function",
+                            "function": {
+                                "name": self.tool_name,
+                                "arguments": '{"text": "%s"}' % messages[-1].content,
+                            },
+                        }
+                    ]
+                },
+            )
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    @property
+    def _llm_type(self) -> str:
+        return "tool-calling"
+
+
+RunnableBuilder = Callable[..., ZhipuAIAllToolsRunnable]
+
+
+@pytest.fixture
+def build_runnable() -> RunnableBuilder:
+    """Build a :class:`ZhipuAIAllToolsRunnable` whose model calls ``tool``.
+
+    The keyword arguments are passed to the runnable.
+    """
+
+    def build(tool: BaseTool, **kwargs: Any) -> ZhipuAIAllToolsRunnable:
+        prompt = ChatPromptTemplate.from_messages(
+            [
+                MessagesPlaceholder("chat_history", optional=True),
+                ("human", "{input}"),
+                MessagesPlaceholder("agent_scratchpad"),
+            ]
+        )
+        agent = create_zhipuai_tools_agent(
+            prompt=prompt,
+            llm_with_all_tools=ToolCallingChatModel(tool_name=tool.name),
+        )
+        agent_executor = ZhipuAiAllToolsAgentExecutor(
+            agent=agent, tools=[tool], return_intermediate_steps=True
+        )
+        return ZhipuAIAllToolsRunnable(agent_executor=agent_executor, **kwargs)
+
+    return build
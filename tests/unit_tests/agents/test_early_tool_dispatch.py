@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+import asyncio
+from typing import Any, AsyncIterator, List, Optional
+
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessageChunk, BaseMessage, ToolMessage
+from langchain_core.outputs import ChatGenerationChunk, ChatResult
+from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+from langchain_core.tools import StructuredTool
+
+from langchain_glm.agents.all_tools_agent import ZhipuAiAllToolsAgentExecutor
+from langchain_glm.agents.all_tools_bind.base import create_zhipuai_tools_agent
+
+events: List[str] = []
+
+
+async def lookup(key: str) -> str:
+    events.append(f"tool start {key}")
+    await asyncio.sleep(0.01)
+    return key.upper()
+
+
+class _SlowToolCallChatModel(BaseChatModel):
+    """Streams a tool call, then keeps talking before the response ends."""
+
+    def _generate(self, *args: Any, **kwargs: Any) -> ChatResult:
+        raise NotImplementedError
+
+    async def _astream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        if isinstance(messages[-1], ToolMessage):
+            yield ChatGenerationChunk(message=AIMessageChunk(content="done"))
+            return
+        for name, args in [("lookup", '{"key": '), (None, '"a"}')]:
+            yield ChatGenerationChunk(
+                message=AIMessageChunk(
+                    content="",
+                    tool_call_chunks=[
+                        {
+                            "name": name,
+                            "args": args,
+                            "id": name and "call_0",
+                            "index": 0,
+                        }
+                    ],
+                )
+            )
+        for _ in range(5):
+            await asyncio.sleep(0.01)
+            events.append("model token")
+            yield ChatGenerationChunk(message=AIMessageChunk(content=""))
+
+    @property
+    def _llm_type(self) -> str:
+        return "slow-tool-call"
+
+
+async def test_tool_starts_before_the_stream_ends():
+    prompt = ChatPromptTemplate.from_messages(
+        [("human", "{input}"), MessagesPlaceholder("agent_scratchpad")]
+    )
+    agent = create_zhipuai_tools_agent(
+        prompt=prompt, llm_with_all_tools=_SlowToolCallChatModel()
+    )
+    tool = StructuredTool.from_function(
+        coroutine=lookup, name="lookup", description="lookup"
+    )
+    executor = ZhipuAiAllToolsAgentExecutor(
+        agent=agent,
+        tools=[tool],
+        early_tool_dispatch=True,
+        return_intermediate_steps=True,
+    )
+    events.clear()
+    result = await executor.ainvoke({"input": "hi"})
+
+    assert result["output"] == "done"
+    ((action, observation),) = result["intermediate_steps"]
+    assert observation == "A"
+    assert action.message_log, "the parsed action is kept"
+    assert events.index("tool start a") < events.index("model token")
+    assert events.count("tool start a") == 1
@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+from langchain.agents.output_parsers.tools import ToolAgentAction
+
+from langchain_glm.agent_toolkits import BaseToolOutput
+from langchain_glm.agent_toolkits.all_tools.web_browser_tool import (
+    WebBrowserToolOutput,
+)
+from langchain_glm.agents.format_scratchpad.all_tools import (
+    ZhipuAIAllToolsScratchpad,
+    format_to_zhipuai_all_tool_messages,
+)
+from langchain_glm.agents.output_parsers.web_browser import WebBrowserAgentAction
+
+
+def _step(i: int):
+    if i % 3 == 0:
+        action = WebBrowserAgentAction(
+            tool="web_browser",
+            tool_input="q",
+            log="",
+            message_log=[],
+            tool_call_id=f"call_{i}",
+            outputs=[{"title": "same"}],
+        )
+        return action, WebBrowserToolOutput(data="same", platform_params={})
+    action = ToolAgentAction(
+        tool="calculate",
+        tool_input={"text": str(i)},
+        log="",
+        message_log=[],
+        tool_call_id=f"call_{i}",
+    )
+    return action, BaseToolOutput(str(i))
+
+
+def test_incremental_scratchpad_matches_full_format():
+    scratchpad = ZhipuAIAllToolsScratchpad()
+    steps = []
+    for i in range(10):
+        steps.append(_step(i))
+        assert scratchpad(steps) == format_to_zhipuai_all_tool_messages(steps)
+    # repeated web browser outputs are deduplicated
+    assert len(scratchpad(steps)) == 1 + 2 * 6
+
+
+def test_incremental_scratchpad_separates_runs():
+    scratchpad = ZhipuAIAllToolsScratchpad()
+    run_a = [_step(1)]
+    run_b = [_step(2), _step(4)]
+    assert scratchpad(run_a) == format_to_zhipuai_all_tool_messages(run_a)
+    assert scratchpad(run_b) == format_to_zhipuai_all_tool_messages(run_b)
+    run_a.append(_step(5))
+    assert scratchpad(run_a) == format_to_zhipuai_all_tool_messages(run_a)
+    # a different list with the same first step starts over
+    assert scratchpad(run_a[:1]) == format_to_zhipuai_all_tool_messages(run_a[:1])
+
+
+def test_released_runs_drop_their_messages():
+    scratchpad = ZhipuAIAllToolsScratchpad()
+    steps = [_step(1), _step(2)]
+    scratchpad(steps)
+    assert len(scratchpad) == 1
+
+    scratchpad.release(steps)
+    assert len(scratchpad) == 0
+    assert scratchpad(steps) == format_to_zhipuai_all_tool_messages(steps)
@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+from langchain_core.language_models import FakeListChatModel
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+
+from langchain_glm.agents.zhipuai_all_tools import (
+    HistoryPolicy,
+    InMemorySessionStore,
+    ZhipuAIAllToolsSession,
+)
+
+
+def _session(turns: int) -> ZhipuAIAllToolsSession:
+    history = []
+    for i in range(turns):
+        history.append({"role": "user", "content": f"q{i}"})
+        history.append({"role": "assistant", "content": f"a{i}"})
+    return ZhipuAIAllToolsSession(history=history)
+
+
+def test_max_turns_keeps_latest_turns():
+    policy = HistoryPolicy(max_turns=2)
+    messages = policy.select_messages(_session(5))
+    assert [m.content for m in messages] == ["q3", "a3", "q4", "a4"]
+    assert isinstance(messages[0], HumanMessage)
+    assert isinstance(messages[1], AIMessage)
+
+
+def test_token_budget_uses_cached_counts():
+    calls = []
+
+    def counter(text: str) -> int:
+        calls.append(text)
+        return 10
+
+    policy = HistoryPolicy(max_tokens=35, token_counter=counter)
+    session = _session(5)
+    # 3 entries fit, the window must not open with an assistant reply
+    assert [m.content for m in policy.select_messages(session)] == ["q4", "a4"]
+    counted = len(calls)
+    policy.select_messages(session)
+    assert len(calls) == counted
+
+
+async def test_summary_replaces_dropped_turns():
+    policy = HistoryPolicy(
+        max_turns=1, summary_llm=FakeListChatModel(responses=["talked about q0-q2"])
+    )
+    store = InMemorySessionStore()
+    session = _session(3)
+    store.append(session.session_id, history=session.history)
+
+    async def persist(s: ZhipuAIAllToolsSession) -> None:
+        store.append(s.session_id, summary=(s.summary, s.summary_upto))
+
+    await policy.schedule_summary(session, on_summary=persist)
+    assert session.summary == "talked about q0-q2"
+    assert session.summary_upto == 4
+
+    session.history.extend(
+        [{"role": "user", "content": "q3"}, {"role": "assistant", "content": "a3"}]
+    )
+    messages = policy.select_messages(session)
+    assert isinstance(messages[0], SystemMessage)
+    assert [m.content for m in messages[1:]] == ["q3", "a3"]
+
+    loaded = store.load(session.session_id)
+    assert (loaded.summary, loaded.summary_upto) == ("talked about q0-q2", 4)
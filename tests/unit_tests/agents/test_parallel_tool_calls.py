@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+import asyncio
+
+from langchain.agents.output_parsers.tools import ToolAgentAction
+from langchain_core.runnables import RunnableLambda
+from langchain_core.tools import StructuredTool
+
+from langchain_glm.agents.all_tools_agent import ZhipuAiAllToolsAgentExecutor
+
+
+def _executor(**kwargs):
+    running = {"now": 0, "peak": 0}
+
+    async def sleep_echo(text: str) -> str:
+        running["now"] += 1
+        running["peak"] = max(running["peak"], running["now"])
+        await asyncio.sleep(0.01 * (5 - int(text)))
+        running["now"] -= 1
+        return text
+
+    tool = StructuredTool.from_function(
+        coroutine=sleep_echo, name="sleep_echo", description="echo"
+    )
+    agent = RunnableLambda(lambda x: x)
+    executor = ZhipuAiAllToolsAgentExecutor(agent=agent, tools=[tool], **kwargs)
+    return executor, tool, running
+
+
+def _actions(n: int):
+    return [
+        ToolAgentAction(
+            tool="sleep_echo",
+            tool_input={"text": str(i)},
+            log="",
+            message_log=[],
+            tool_call_id=f"call_{i}",
+        )
+        for i in range(n)
+    ]
+
+
+async def _run(executor, tool):
+    steps = await executor._aperform_agent_actions(
+        {tool.name: tool}, {tool.name: "blue"}, _actions(4)
+    )
+    return [step.observation for step in steps]
+
+
+async def test_parallel_tool_calls_keep_order():
+    executor, tool, running = _executor()
+    assert await _run(executor, tool) == ["0", "1", "2", "3"]
+    assert running["peak"] == 4
+
+
+async def test_concurrency_limits():
+    executor, tool, running = _executor(max_concurrency=3, tool_concurrency={})
+    await _run(executor, tool)
+    assert running["peak"] == 3
+
+    executor, tool, running = _executor(tool_concurrency={"sleep_echo": 2})
+    assert await _run(executor, tool) == ["0", "1", "2", "3"]
+    assert running["peak"] == 2
+
+    executor, tool, running = _executor(parallel_tool_calls=False)
+    await _run(executor, tool)
+    assert running["peak"] == 1
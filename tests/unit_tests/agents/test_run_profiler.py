@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+import threading
+import time
+
+import pytest
+from langchain.agents import tool
+
+from langchain_glm.agent_toolkits import BaseToolOutput
+from langchain_glm.utils.profiling import RunProfiler, StackSampler
+
+
+@tool
+def slow_double(text: str) -> BaseToolOutput:
+    """Double a number, slowly."""
+    time.sleep(0.1)
+    return BaseToolOutput(str(2 * int(text)))
+
+
+def _busy(stop: threading.Event) -> None:
+    while not stop.is_set():
+        sum(range(1000))
+
+
+def test_sampler_folds_the_stacks_of_busy_threads():
+    stop = threading.Event()
+    worker = threading.Thread(target=_busy, args=(stop,), name="busy")
+    worker.start()
+    sampler = StackSampler(interval=0.002).start()
+    time.sleep(0.1)
+    sampler.join()
+    stop.set()
+    worker.join()
+
+    lines = sampler.folded().splitlines()
+    busy = [line for line in lines if line.startswith("busy;")]
+    assert busy
+    stack, count = busy[0].rsplit(" ", 1)
+    assert "_busy (test_run_profiler.py:" in stack
+    assert int(count) > 0
+    assert not any("langchain-glm-profiler" in line for line in lines)
+
+
+def test_sample_rate_picks_runs():
+    assert not RunProfiler("profiles").should_profile()
+    assert RunProfiler("profiles").should_profile(True)
+    assert RunProfiler("profiles", sample_rate=1.0).should_profile()
+    assert not RunProfiler("profiles", sample_rate=1.0).should_profile(False)
+    with pytest.raises(ValueError):
+        RunProfiler("profiles", sample_rate=2.0)
+
+
+async def test_profiled_run_writes_profile_named_after_run(build_runnable, tmp_path):
+    runnable = build_runnable(
+        slow_double, profiler=RunProfiler(str(tmp_path), interval=0.005)
+    )
+
+    events = [event async for event in runnable.invoke("21", profile=True)]
+
+    path = tmp_path / f"{events[0].run_id}.folded"
+    assert "slow_double (test_run_profiler.py:" in path.read_text()
+    assert [p.name for p in tmp_path.iterdir()] == [path.name]
+
+
+async def test_runs_are_not_profiled_unless_asked_or_sampled(build_runnable, tmp_path):
+    runnable = build_runnable(slow_double, profiler=RunProfiler(str(tmp_path)))
+    _ = [event async for event in runnable.invoke("21")]
+    assert list(tmp_path.iterdir()) == []
+
+    with pytest.raises(ValueError):
+        build_runnable(slow_double).invoke("21", profile=True)
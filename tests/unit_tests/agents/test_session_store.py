@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import time
+
+import pytest
+from langchain.agents.output_parsers.tools import ToolAgentAction
+
+from langchain_glm.agent_toolkits import BaseToolOutput
+from langchain_glm.agent_toolkits.all_tools.code_interpreter_tool import (
+    CodeInterpreterToolOutput,
+)
+from langchain_glm.agents.output_parsers.code_interpreter import (
+    CodeInterpreterAgentAction,
+)
+from langchain_glm.agents.zhipuai_all_tools import (
+    FileSessionStore,
+    InMemorySessionStore,
+    SQLiteSessionStore,
+)
+
+
+def _steps():
+    return [
+        (
+            ToolAgentAction(
+                tool="calculate",
+                tool_input={"text": "1+1"},
+                log="",
+                message_log=[],
+                tool_call_id="call_1",
+            ),
+            BaseToolOutput("2"),
+        ),
+        (
+            CodeInterpreterAgentAction(
+                tool="code_interpreter",
+                tool_input="print('x' * 10000)",
+                outputs=[{"type": "logs", "logs": "x" * 10000}],
+                log="",
+                message_log=[],
+                tool_call_id="call_2",
+            ),
+            CodeInterpreterToolOutput(
+                tool="code_interpreter",
+                code_input="print('x' * 10000)",
+                code_output={"logs": "x" * 10000},
+                platform_params={"sandbox": "auto"},
+            ),
+        ),
+    ]
+
+
+@pytest.fixture(params=["memory", "sqlite", "file"])
+def store(request, tmp_path):
+    if request.param == "memory":
+        return InMemorySessionStore(ttl=60)
+    if request.param == "sqlite":
+        return SQLiteSessionStore(tmp_path / "sessions.db", ttl=60)
+    return FileSessionStore(tmp_path / "sessions", ttl=60)
+
+
+def test_append_and_load_roundtrip(store):
+    assert store.load("s1") is None
+
+    history = [
+        {"role": "user", "content": "hi"},
+        {"role": "assistant", "content": "hello"},
+    ]
+    store.append("s1", history=history, intermediate_steps=_steps()[:1])
+    store.append("s1", intermediate_steps=_steps()[1:])
+
+    session = store.load("s1")
+    assert session.session_id == "s1"
+    assert session.history == history
+    (action, observation), (ci_action, ci_observation) = session.intermediate_steps
+    assert isinstance(action, ToolAgentAction)
+    assert action.tool_input == {"text": "1+1"}
+    assert action.tool_call_id == "call_1"
+    assert str(observation) == "2"
+    assert isinstance(ci_action, CodeInterpreterAgentAction)
+    assert ci_action.outputs[0]["logs"] == "x" * 10000
+    assert isinstance(ci_observation, CodeInterpreterToolOutput)
+    assert ci_observation.platform_params == {"sandbox": "auto"}
+
+    store.delete("s1")
+    assert store.load("s1") is None
+
+
+def test_ttl_eviction(store):
+    store.append("old", history=[{"role": "user", "content": "hi"}])
+    store.ttl = 0.01
+    time.sleep(0.05)
+    assert store.evict_expired() == 1
+    assert store.load("old") is None
+
+
+def test_memory_store_is_lru_bounded():
+    store = InMemorySessionStore(max_sessions=2)
+    for session_id in ["a", "b", "c"]:
+        store.append(session_id, history=[{"role": "user", "content": session_id}])
+    assert store.load("a") is None
+    assert store.load("c").history == [{"role": "user", "content": "c"}]
+
+
+def test_empty_append_keeps_the_session_loadable(store):
+    store.append("s1")
+    session = store.load("s1")
+    assert session.history == []
+    assert session.intermediate_steps == []
+
+    store.append("s1", history=[{"role": "user", "content": "hi"}])
+    store.append("s1")
+    assert store.load("s1").history == [{"role": "user", "content": "hi"}]
+
+
+def test_file_store_skips_corrupt_records(tmp_path, caplog):
+    store = FileSessionStore(tmp_path)
+    store.append("s1", history=[{"role": "user", "content": "hi"}])
+    with open(store._path("s1"), "ab") as f:
+        f.write(b'{"k": "h", "v": \n')
+    store.append("s1", history=[{"role": "assistant", "content": "hello"}])
+
+    session = store.load("s1")
+
+    assert [h["content"] for h in session.history] == ["hi", "hello"]
+    assert "corrupt record 2 of session s1" in caplog.text
+
+
+async def test_expired_sessions_are_evicted_periodically(tmp_path):
+    store = FileSessionStore(tmp_path, ttl=0.01)
+    store.append("s1", history=[{"role": "user", "content": "hi"}])
+
+    task = asyncio.ensure_future(store.evict_expired_every(0.02))
+    for _ in range(50):
+        await asyncio.sleep(0.02)
+        if not list(tmp_path.iterdir()):
+            break
+    task.cancel()
+
+    assert list(tmp_path.iterdir()) == []
+    with pytest.raises(asyncio.CancelledError):
+        await task
@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+import asyncio
+
+from langchain.agents.output_parsers.tools import ToolAgentAction
+from langchain_core.callbacks import AsyncCallbackHandler, AsyncCallbackManager
+from langchain_core.runnables import RunnableLambda
+from langchain_core.tools import StructuredTool
+
+from langchain_glm.agents import ToolResultCache
+from langchain_glm.agents.all_tools_agent import ZhipuAiAllToolsAgentExecutor
+
+
+class _ToolEvents(AsyncCallbackHandler):
+    def __init__(self):
+        self.events = []
+
+    async def on_tool_start(self, serialized, input_str, **kwargs):
+        self.events.append(("start", serialized["name"]))
+
+    async def on_tool_end(self, output, **kwargs):
+        self.events.append(("end", output))
+
+
+def _executor(cache: ToolResultCache, cacheable: bool = True):
+    calls = []
+
+    async def slow_upper(text: str) -> str:
+        calls.append(text)
+        await asyncio.sleep(0.01)
+        return text.upper()
+
+    tool = StructuredTool.from_function(
+        coroutine=slow_upper,
+        name="slow_upper",
+        description="upper",
+        metadata={"cacheable": cacheable},
+    )
+    executor = ZhipuAiAllToolsAgentExecutor(
+        agent=RunnableLambda(lambda x: x), tools=[tool], tool_cache=cache
+    )
+    return executor, tool, calls
+
+
+def _action(tool_input):
+    return ToolAgentAction(
+        tool="slow_upper",
+        tool_input=tool_input,
+        log="",
+        message_log=[],
+        tool_call_id="call_0",
+    )
+
+
+async def _run(executor, tool, actions):
+    steps = await executor._aperform_agent_actions(
+        {tool.name: tool}, {tool.name: "blue"}, actions
+    )
+    return [step.observation for step in steps]
+
+
+async def test_single_flight_and_hits():
+    cache = ToolResultCache()
+    executor, tool, calls = _executor(cache)
+    actions = [
+        _action({"text": "a"}),
+        _action('{"text": "a"} '),
+        _action({"text": "b"}),
+    ]
+    assert await _run(executor, tool, actions) == ["A", "A", "B"]
+    assert calls == ["a", "b"]
+
+    assert await _run(executor, tool, [_action({"text": "a"})]) == ["A"]
+    assert calls == ["a", "b"]
+    assert (cache.hits, cache.misses) == (2, 2)
+
+
+async def test_cache_hit_reports_tool_events():
+    executor, tool, calls = _executor(ToolResultCache())
+    handler = _ToolEvents()
+    run_manager = await AsyncCallbackManager.configure([handler]).on_chain_start(
+        {"name": "agent"}, {}
+    )
+    for _ in range(2):
+        await executor._aperform_agent_action(
+            {tool.name: tool}, {tool.name: "blue"}, _action({"text": "a"}), run_manager
+        )
+    assert calls == ["a"]
+    assert handler.events == [("start", "slow_upper"), ("end", "A")] * 2
+
+
+async def test_ttl_and_opt_in():
+    cache = ToolResultCache(default_ttl=0)
+    executor, tool, calls = _executor(cache)
+    await _run(executor, tool, [_action({"text": "a"})])
+    await asyncio.sleep(0.001)
+    await _run(executor, tool, [_action({"text": "a"})])
+    assert calls == ["a", "a"]
+
+    executor, tool, calls = _executor(ToolResultCache(), cacheable=False)
+    await _run(executor, tool, [_action({"text": "a"})])
+    await _run(executor, tool, [_action({"text": "a"})])
+    assert calls == ["a", "a"]
@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, List, Optional
+
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.prompt_values import ChatPromptValue
+from langchain_core.utils.function_calling import convert_to_openai_tool
+
+from langchain_glm.agents import ToolSelector
+
+WORDS = ["weather", "stock", "translate", "calendar", "email"]
+
+
+class _KeywordEmbeddings(Embeddings):
+    def __init__(self):
+        self.documents = 0
+        self.queries = 0
+
+    def _vector(self, text: str) -> List[float]:
+        return [float(word in text.lower()) for word in WORDS] + [0.1]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        self.documents += len(texts)
+        return [self._vector(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        self.queries += 1
+        return self._vector(text)
+
+
+class _RecordingChatModel(BaseChatModel):
+    bound_tools: List[List[str]] = []
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Any = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        self.bound_tools.append(
+            [
+                tool.get("function", {}).get("name", tool["type"])
+                for tool in kwargs["tools"]
+            ]
+        )
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content="ok"))])
+
+    @property
+    def _llm_type(self) -> str:
+        return "recording"
+
+
+def _function(name: str, description: str) -> dict:
+    def tool(query: str) -> str:
+        return query
+
+    tool.__name__ = name
+    tool.__doc__ = description
+    return convert_to_openai_tool(tool)
+
+
+TOOLS = [
+    {"type": "code_interpreter"},
+    _function("get_weather", "Look up the weather forecast of a city."),
+    _function("get_stock", "Current stock price of a ticker."),
+    _function("translate", "Translate a text to another language."),
+    _function("add_event", "Add an event to the calendar."),
+    _function("send_email", "Send an email to a contact."),
+]
+
+
+def test_binds_top_k_and_pinned_tools():
+    embeddings = _KeywordEmbeddings()
+    selector = ToolSelector(embeddings, k=1, pinned=["code_interpreter", "send_email"])
+    model = _RecordingChatModel(bound_tools=[])
+    llm = selector.bind(model.bind(tools=TOOLS))
+    # the tool descriptions are embedded on the first turn
+    assert embeddings.documents == 0
+
+    prompt = ChatPromptValue(
+        messages=[HumanMessage(content="What is the weather in Beijing?")]
+    )
+    llm.invoke(prompt)
+    # a later step of the same turn reuses the query embedding
+    llm.invoke(prompt)
+
+    assert model.bound_tools == [["code_interpreter", "get_weather", "send_email"]] * 2
+    assert embeddings.queries == 1
+    assert embeddings.documents == 4
+
+
+def test_binds_all_tools_when_few():
+    embeddings = _KeywordEmbeddings()
+    selector = ToolSelector(embeddings, k=10)
+    model = _RecordingChatModel(bound_tools=[])
+    selector.bind(model.bind(tools=TOOLS)).invoke(
+        ChatPromptValue(messages=[HumanMessage(content="translate this")])
+    )
+    assert model.bound_tools == [
+        [_t.get("function", {}).get("name", _t["type"]) for _t in TOOLS]
+    ]
+    assert embeddings.queries == 0
+
+
+def test_concurrent_first_turns_embed_the_tools_once():
+    embeddings = _KeywordEmbeddings()
+    selector = ToolSelector(embeddings, k=1)
+    prompts = [
+        ChatPromptValue(messages=[HumanMessage(content=f"stock {i}")]) for i in range(8)
+    ]
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        selected = list(
+            executor.map(lambda p: selector.select(TOOLS, p.to_string()), prompts)
+        )
+
+    assert embeddings.documents == 5
+    assert all("get_stock" in str(tools) for tools in selected)
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+import asyncio
+from typing import List
+
+from langchain.agents import tool
+from langchain_core.runnables.config import run_in_executor
+
+from langchain_glm.agent_toolkits import BaseToolOutput
+from langchain_glm.agents.zhipuai_all_tools import AllToolsTiming
+from langchain_glm.callbacks.agent_callback_handler import AgentStatus
+from langchain_glm.utils.timing import TurnTiming, run_timed, timed
+
+
+@tool
+def double(text: str) -> BaseToolOutput:
+    """Double a number."""
+    return BaseToolOutput(str(2 * int(text)))
+
+
+def test_timers_are_shared_no_ops_outside_a_turn():
+    assert timed("plan") is timed("tools")
+    with timed("plan"):
+        pass
+
+
+async def test_stages_are_collected_from_executor_threads():
+    timing = TurnTiming("run")
+
+    def work() -> None:
+        with timed("upstream"):
+            pass
+
+    async def turn() -> None:
+        await asyncio.gather(*[run_in_executor(None, work) for _ in range(8)])
+
+    await asyncio.create_task(run_timed(timing, turn()))
+    timing.finish()
+
+    record = timing.to_dict()
+    assert record["run_id"] == "run"
+    assert record["stages"]["upstream"]["count"] == 8
+    assert record["total_ms"] >= record["stages"]["upstream"]["ms"] / 8
+    # the timing only applies inside the task
+    with timed("upstream"):
+        pass
+    assert timing.stages["upstream"][1] == 8
+
+
+async def test_timed_turn_ends_with_timing_event(build_runnable):
+    sunk: List[TurnTiming] = []
+    runnable = build_runnable(double, timing=True, timing_sink=sunk.append)
+
+    events = [event async for event in runnable.invoke("21")]
+
+    record = events[-1]
+    assert isinstance(record, AllToolsTiming)
+    assert record.status == AgentStatus.timing
+    assert record.run_id == events[0].run_id
+    assert {"history", "prompt", "plan", "output_parse", "tools", "callbacks"} <= set(
+        record.stages
+    )
+    assert record.stages["plan"]["count"] == 2
+    assert record.stages["tools"]["count"] == 1
+    assert record.total_ms >= record.stages["plan"]["ms"]
+    assert [timing.run_id for timing in sunk] == [record.run_id]
+
+
+async def test_untimed_turn_has_no_timing_event(build_runnable):
+    runnable = build_runnable(double)
+
+    events = [event async for event in runnable.invoke("21")]
+
+    assert not any(isinstance(event, AllToolsTiming) for event in events)
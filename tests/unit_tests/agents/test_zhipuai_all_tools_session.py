@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+import asyncio
+
+from langchain.agents import tool
+
+from langchain_glm.agent_toolkits import BaseToolOutput
+from langchain_glm.agents.zhipuai_all_tools import AllToolsFinish, SQLiteSessionStore
+
+
+@tool
+def calculate(text: str) -> BaseToolOutput:
+    """Evaluate a math expression."""
+    return BaseToolOutput(str(eval(text)))
+
+
+async def test_concurrent_sessions_are_isolated(build_runnable):
+    runnable = build_runnable(calculate)
+
+    async def run(expression: str):
+        session = runnable.new_session(expression)
+        events = [event async for event in runnable.invoke(expression, session=session)]
+        return session, events
+
+    results = await asyncio.gather(*[run(f"{i}+{i}") for i in range(5)])
+
+    for i, (session, events) in enumerate(results):
+        assert session.history == [
+            {"role": "user", "content": f"{i}+{i}"},
+            {"role": "assistant", "content": f"answer {i + i}"},
+        ]
+        assert len(session.intermediate_steps) == 1
+        finishes = [e for e in events if isinstance(e, AllToolsFinish)]
+        assert finishes[0].return_values["output"] == f"answer {i + i}"
+    assert runnable.history == []
+    assert runnable.intermediate_steps == []
+
+
+async def test_default_session_keeps_legacy_state(build_runnable):
+    runnable = build_runnable(calculate)
+    _ = [event async for event in runnable.invoke("1+2")]
+
+    assert runnable.callback.out
+    assert runnable.history[-1] == {"role": "assistant", "content": "answer 3"}
+    assert len(runnable.intermediate_steps) == 1
+    assert build_runnable(calculate).history == []
+
+
+async def test_session_id_resumes_from_store(build_runnable, tmp_path):
+    store = SQLiteSessionStore(tmp_path / "sessions.db")
+    runnable = build_runnable(calculate)
+    runnable.session_store = store
+    _ = [event async for event in runnable.invoke("1+2", session_id="s1")]
+
+    other_worker = build_runnable(calculate)
+    other_worker.session_store = store
+    _ = [event async for event in other_worker.invoke("2+2", session_id="s1")]
+
+    session = store.load("s1")
+    assert [h["content"] for h in session.history] == [
+        "1+2",
+        "answer 3",
+        "2+2",
+        "answer 4",
+    ]
+    assert len(session.intermediate_steps) == 2
+
+
+async def test_finished_runs_release_their_scratchpad(build_runnable):
+    runnable = build_runnable(calculate)
+    _ = [event async for event in runnable.invoke("1+2")]
+
+    assert len(runnable.agent_executor.agent.runnable.scratchpad) == 0
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import json
+import uuid
+
+import pytest
+
+from langchain_glm.callbacks import (
+    AgentExecutorAsyncIteratorCallbackHandler,
+    CallbackQueueFullError,
+    QueueOverflowPolicy,
+)
+
+
+def _drain(handler: AgentExecutorAsyncIteratorCallbackHandler):
+    events = []
+    while not handler.queue.empty():
+        events.append(json.loads(handler.queue.get_nowait()))
+    return events
+
+
+async def test_drop_policy_drops_tokens_only():
+    handler = AgentExecutorAsyncIteratorCallbackHandler(
+        max_queue_size=2, overflow_policy=QueueOverflowPolicy.DROP
+    )
+    run_id = uuid.uuid4()
+    for token in ["a", "b", "c", "d"]:
+        await handler.on_llm_new_token(token, run_id=run_id)
+
+    metrics = handler.queue_metrics
+    assert metrics.depth == 2
+    assert metrics.dropped == 2
+    assert [e["text"] for e in _drain(handler)] == ["a", "b"]
+
+
+async def test_merge_policy_keeps_all_text_in_order():
+    handler = AgentExecutorAsyncIteratorCallbackHandler(
+        max_queue_size=1, overflow_policy="merge"
+    )
+    run_id = uuid.uuid4()
+    for token in ["a", "b", "c"]:
+        await handler.on_llm_new_token(token, run_id=run_id)
+    assert handler.queue_metrics.merged == 1
+
+    async def consume():
+        events = []
+        while len(events) < 3:
+            events.append(json.loads(await handler.queue.get()))
+        return events
+
+    consumer = asyncio.create_task(consume())
+    await handler.on_llm_error(ValueError("boom"))
+    events = await consumer
+
+    assert [e["text"] for e in events[:2]] == ["a", "bc"]
+    assert events[2]["text"] == "boom"
+
+
+async def test_block_policy_waits_for_consumer():
+    handler = AgentExecutorAsyncIteratorCallbackHandler(max_queue_size=1)
+    run_id = uuid.uuid4()
+    await handler.on_llm_new_token("a", run_id=run_id)
+    producer = asyncio.create_task(handler.on_llm_new_token("b", run_id=run_id))
+    await asyncio.sleep(0)
+    assert not producer.done()
+
+    assert json.loads(await handler.queue.get())["text"] == "a"
+    await producer
+    assert json.loads(await handler.queue.get())["text"] == "b"
+    assert handler.queue_metrics.blocked == 1
+
+
+async def test_error_policy_fails_the_run():
+    handler = AgentExecutorAsyncIteratorCallbackHandler(
+        max_queue_size=1, overflow_policy=QueueOverflowPolicy.ERROR
+    )
+    assert handler.raise_error
+    run_id = uuid.uuid4()
+    await handler.on_llm_new_token("a", run_id=run_id)
+    with pytest.raises(CallbackQueueFullError):
+        await handler.on_llm_new_token("b", run_id=run_id)
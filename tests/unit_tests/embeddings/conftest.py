@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+"""Fake embeddings API shared by the embeddings unit tests."""
+import threading
+import time
+from typing import Any, Callable, List, Optional, Tuple
+
+import httpx
+import pytest
+import zhipuai
+
+from langchain_glm.embeddings import ZhipuAIEmbeddings
+
+
+def _length_embedding(text: str) -> List[float]:
+    return [float(len(text)), 1.0]
+
+
+class FakeEmbeddingsClient:
+    """Records the batches it is sent and embeds every text with ``embed``.
+
+    Args:
+        embed: Embedding of one text.
+        delay: Seconds a batch takes, given the batch.
+        max_tokens: Batches of more characters are rejected as too long.
+        error: Raised for every batch.
+    """
+
+    def __init__(
+        self,
+        embed: Callable[[str], List[float]] = _length_embedding,
+        delay: Optional[Callable[[List[str]], float]] = None,
+        max_tokens: Optional[int] = None,
+        error: Optional[Exception] = None,
+    ):
+        self.embed = embed
+        self.delay = delay
+        self.max_tokens = max_tokens
+        self.error = error
+        self.lock = threading.Lock()
+        self.running = 0
+        self.peak = 0
+        self.batches: List[List[str]] = []
+
+    def create(self, input, model, **kwargs):
+        with self.lock:
+            self.running += 1
+            self.peak = max(self.peak, self.running)
+            self.batches.append(list(input))
+        try:
+            if self.delay is not None:
+                time.sleep(self.delay(input))
+            if self.error is not None:
+                raise self.error
+            if self.max_tokens is not None and (
+                sum(len(text) for text in input) > self.max_tokens
+            ):
+                response = httpx.Response(
+                    400, request=httpx.Request("POST", "https://example.com")
+                )
+                raise zhipuai.APIRequestFailedError("input too long", response=response)
+            return {
+                "data": [
+                    {"index": i, "embedding": self.embed(text)}
+                    for i, text in enumerate(input)
+                ]
+            }
+        finally:
+            with self.lock:
+                self.running -= 1
+
+
+EmbeddingsFactory = Callable[..., Tuple[ZhipuAIEmbeddings, FakeEmbeddingsClient]]
+
+
+@pytest.fixture
+def make_embeddings() -> EmbeddingsFactory:
+    """Build ``(embeddings, client)`` pairs on a :class:`FakeEmbeddingsClient`.
+
+    The keyword arguments of the client are taken out, the others are passed
+    to :class:`ZhipuAIEmbeddings`. Every character counts as a token and the
+    batches are sent one by one unless ``max_concurrency`` is given.
+    """
+
+    def make(
+        embed: Callable[[str], List[float]] = _length_embedding,
+        *,
+        delay: Optional[Callable[[List[str]], float]] = None,
+        max_tokens: Optional[int] = None,
+        error: Optional[Exception] = None,
+        **kwargs: Any,
+    ) -> Tuple[ZhipuAIEmbeddings, FakeEmbeddingsClient]:
+        client = FakeEmbeddingsClient(embed, delay, max_tokens, error)
+        kwargs.setdefault("tiktoken_enabled", False)
+        kwargs.setdefault("max_concurrency", 1)
+        embeddings = ZhipuAIEmbeddings(client=client, api_key="fake", **kwargs)
+        return embeddings, client
+
+    return make
@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+import httpx
+import pytest
+import zhipuai
+
+from langchain_glm.embeddings import AdaptiveBatcher
+
+
+def test_oversized_batches_are_split_and_budget_shrinks(make_embeddings):
+    batcher = AdaptiveBatcher(min_tokens=4, max_tokens=64, initial_tokens=64)
+    embeddings, client = make_embeddings(adaptive_batcher=batcher, max_tokens=10)
+    texts = ["a" * (i % 5 + 1) for i in range(20)]
+
+    output = embeddings.embed_documents(texts)
+    assert [row[0] for row in output] == [float(len(text)) for text in texts]
+    assert batcher.splits > 0
+    assert batcher.budget < 64
+    assert all(sum(map(len, batch)) <= 64 for batch in client.batches)
+
+
+def test_single_text_errors_are_raised(make_embeddings):
+    embeddings, _ = make_embeddings(
+        adaptive_batcher=AdaptiveBatcher(min_tokens=1), max_tokens=3
+    )
+    with pytest.raises(zhipuai.APIRequestFailedError):
+        embeddings.embed_documents(["aaaa"])
+
+
+def test_budget_follows_latency():
+    batcher = AdaptiveBatcher(
+        min_tokens=100, max_tokens=1000, initial_tokens=200, target_latency=1.0
+    )
+    batcher.observe(200, 0.1)
+    assert batcher.budget == 300
+    batcher.observe(10, 0.1)
+    assert batcher.budget == 300
+    batcher.observe(300, 2.0)
+    assert batcher.budget == 150
+    for _ in range(10):
+        batcher.observe(1000, 0.1)
+    assert batcher.budget == 1000
+
+
+async def test_async_split(make_embeddings):
+    batcher = AdaptiveBatcher(min_tokens=2, max_tokens=64, initial_tokens=64)
+    embeddings, _ = make_embeddings(
+        adaptive_batcher=batcher, max_tokens=6, max_concurrency=2
+    )
+    texts = ["aaa", "bb", "cccc", "d", "eeeee"]
+    output = await embeddings.aembed_documents(texts)
+    assert [row[0] for row in output] == [3.0, 2.0, 4.0, 1.0, 5.0]
+
+
+def _status_error(status_code: int, message: str, body=None):
+    response = httpx.Response(
+        status_code, json=body, request=httpx.Request("POST", "https://example.com")
+    )
+    return zhipuai.APIRequestFailedError(message, response=response)
+
+
+def test_errors_unrelated_to_size_are_raised_after_one_call(make_embeddings):
+    for error in [
+        _status_error(400, "invalid model"),
+        _status_error(401, "invalid api key"),
+        zhipuai.APITimeoutError(httpx.Request("POST", "https://example.com")),
+    ]:
+        embeddings, client = make_embeddings(
+            error=error, adaptive_batcher=AdaptiveBatcher(min_tokens=1)
+        )
+        with pytest.raises(type(error)):
+            embeddings.embed_documents(["a", "b", "c", "d"])
+        assert len(client.batches) == 1
+
+
+def test_size_errors_are_recognized_by_status_code_and_message():
+    assert AdaptiveBatcher.is_oversized(_status_error(413, "payload"))
+    assert AdaptiveBatcher.is_oversized(
+        _status_error(400, "bad", {"error": {"code": "1261", "message": "x"}})
+    )
+    assert AdaptiveBatcher.is_oversized(_status_error(400, "input exceeds the limit"))
+    assert not AdaptiveBatcher.is_oversized(
+        _status_error(400, "bad", {"error": {"code": "1214", "message": "x"}})
+    )
+
+
+def test_split_depth_is_capped(make_embeddings):
+    embeddings, client = make_embeddings(
+        error=_status_error(413, "payload too large"),
+        adaptive_batcher=AdaptiveBatcher(min_tokens=1, max_split_depth=1),
+    )
+    with pytest.raises(zhipuai.APIRequestFailedError):
+        embeddings.embed_documents([str(i) for i in range(8)])
+    # the batch and its first half
+    assert [len(batch) for batch in client.batches] == [8, 4]
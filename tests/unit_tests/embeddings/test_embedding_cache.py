@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+from langchain_glm.embeddings import EmbeddingCache
+
+
+def _embed(text: str):
+    return [float(len(text)), 0.5]
+
+
+def test_only_misses_reach_the_api(make_embeddings, tmp_path):
+    path = str(tmp_path / "embeddings.sqlite")
+    embeddings, client = make_embeddings(_embed, cache=EmbeddingCache(path))
+    assert embeddings.embed_documents(["a", "bb"]) == [[1.0, 0.5], [2.0, 0.5]]
+    assert embeddings.embed_documents(["bb", "ccc", "a"]) == [
+        [2.0, 0.5],
+        [3.0, 0.5],
+        [1.0, 0.5],
+    ]
+    assert client.batches == [["a", "bb"], ["ccc"]]
+    assert embeddings.embed_query("ccc") == [3.0, 0.5]
+    assert len(client.batches) == 2
+
+    # a new process finds the embeddings in the sqlite file
+    embeddings, client = make_embeddings(_embed, cache=EmbeddingCache(path))
+    assert embeddings.embed_documents(["ccc", "a"]) == [[3.0, 0.5], [1.0, 0.5]]
+    assert client.batches == []
+
+    # other model parameters are other embeddings
+    embeddings, client = make_embeddings(
+        _embed, cache=EmbeddingCache(path), dimensions=256
+    )
+    embeddings.embed_documents(["a"])
+    assert client.batches == [["a"]]
+
+
+async def test_async_memory_cache(make_embeddings):
+    cache = EmbeddingCache(max_size=1)
+    embeddings, client = make_embeddings(_embed, cache=cache)
+    assert await embeddings.aembed_documents(["a", "bb"]) == [[1.0, 0.5], [2.0, 0.5]]
+    assert await embeddings.aembed_query("bb") == [2.0, 0.5]
+    assert await embeddings.aembed_query("a") == [1.0, 0.5]
+    assert client.batches == [["a", "bb"], ["a"]]
+    assert (cache.hits, cache.misses) == (1, 3)
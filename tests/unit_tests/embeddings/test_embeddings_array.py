@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+
+from langchain_glm.embeddings import EmbeddingCache
+
+
+def _embed(text: str):
+    return [float(text.count("a")), 2.0, 0.0]
+
+
+def test_array_matches_lists(make_embeddings):
+    embeddings, _ = make_embeddings(_embed, chunk_size=2, embedding_ctx_length=4)
+    texts = ["a", "aab", "aaaabbbb", "", "b"]
+    rows = embeddings.embed_documents_into(texts)
+    assert rows.dtype == np.float32
+    assert rows.flags["C_CONTIGUOUS"]
+    assert np.allclose(rows, embeddings.embed_documents(texts))
+
+    normalized = embeddings.embed_documents_into(texts, normalize=True)
+    assert np.allclose(np.linalg.norm(normalized, axis=1), 1.0)
+
+
+def test_write_into_memmap(make_embeddings, tmp_path):
+    cache = EmbeddingCache()
+    embeddings, client = make_embeddings(_embed, cache=cache)
+    out = np.lib.format.open_memmap(
+        str(tmp_path / "vectors.npy"), mode="w+", dtype=np.float32, shape=(4, 3)
+    )
+    embeddings.embed_documents_into(["a", "aa"], out)
+    embeddings.embed_documents_into(["aa", "aaa"], out, offset=2)
+    out.flush()
+
+    loaded = np.load(str(tmp_path / "vectors.npy"))
+    assert loaded[:, 0].tolist() == [1.0, 2.0, 2.0, 3.0]
+    assert client.batches == [["a", "aa"], ["aaa"]]
@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+import pytest
+
+
+def _embed(text: str):
+    return [float(text), 1.0]
+
+
+def _delay(batch):
+    # later batches answer first
+    return 0.02 / (1 + int(batch[0]))
+
+
+TEXTS = [str(i) for i in range(10)]
+EXPECTED = [[float(i), 1.0] for i in range(10)]
+
+
+def test_batches_run_concurrently_in_order(make_embeddings):
+    embeddings, client = make_embeddings(
+        _embed, delay=_delay, chunk_size=2, max_concurrency=3
+    )
+    assert embeddings.embed_documents(TEXTS) == EXPECTED
+    assert len(client.batches) == 5
+    assert client.peak == 3
+
+
+def test_sequential_without_concurrency(make_embeddings):
+    embeddings, client = make_embeddings(
+        _embed, delay=_delay, chunk_size=2, max_concurrency=1
+    )
+    assert embeddings.embed_documents(TEXTS) == EXPECTED
+    assert client.peak == 1
+
+
+async def test_async_embeddings(make_embeddings):
+    embeddings, client = make_embeddings(
+        _embed, delay=_delay, chunk_size=3, max_concurrency=2
+    )
+    assert await embeddings.aembed_documents(TEXTS) == EXPECTED
+    assert client.peak == 2
+    assert await embeddings.aembed_query("7") == [7.0, 1.0]
+
+
+def test_failed_batch_error_is_raised(make_embeddings):
+    embeddings, client = make_embeddings(
+        _embed, delay=_delay, chunk_size=2, max_concurrency=3
+    )
+    create = client.create
+
+    def failing(input, model, **kwargs):
+        if input[0] == "0":
+            raise ValueError("rejected")
+        return create(input, model, **kwargs)
+
+    client.create = failing
+    with pytest.raises(ValueError, match="rejected"):
+        embeddings.embed_documents(TEXTS)
+    assert len(client.batches) < 5
@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+
+
+def _embed(text: str):
+    return [float(len(text.strip())), 1.0]
+
+
+TEXTS = ["header", "a", "header ", "bb", "Caf\u00e9", "a", "Cafe\u0301"]
+
+
+def test_duplicates_embedded_once(make_embeddings):
+    embeddings, client = make_embeddings(_embed, chunk_size=2)
+    output = embeddings.embed_documents(TEXTS)
+    assert [row[0] for row in output] == [6.0, 1.0, 6.0, 2.0, 4.0, 1.0, 4.0]
+    assert client.batches == [["header", "a"], ["bb", "Caf\u00e9"]]
+    assert output[1] == output[5] and output[1] is not output[5]
+
+    stats = embeddings.dedup_stats
+    assert (stats.texts, stats.embedded) == (7, 4)
+    assert np.isclose(stats.ratio, 3 / 7)
+
+
+def test_array_duplicates(make_embeddings):
+    embeddings, client = make_embeddings(_embed)
+    rows = embeddings.embed_documents_into(TEXTS)
+    assert rows[:, 0].tolist() == [6.0, 1.0, 6.0, 2.0, 4.0, 1.0, 4.0]
+    assert len(client.batches[0]) == 4
+
+
+async def test_deduplicate_disabled(make_embeddings):
+    embeddings, client = make_embeddings(_embed, deduplicate=False)
+    assert len(await embeddings.aembed_documents(TEXTS)) == 7
+    assert len(client.batches[0]) == 7
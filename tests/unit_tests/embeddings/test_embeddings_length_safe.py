@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+
+
+def _embed(text: str):
+    return [1.0, 0.0] if "a" in text else [0.0, 1.0]
+
+
+def test_long_text_is_split_and_averaged(make_embeddings):
+    embeddings, client = make_embeddings(_embed, embedding_ctx_length=3)
+    output = embeddings.embed_documents(["a", "aaabbbbbb", "b"])
+
+    assert client.batches == [["a", "aaa", "bbb", "bbb", "b"]]
+    assert output[0] == [1.0, 0.0]
+    assert output[2] == [0.0, 1.0]
+    expected = np.array([1.0, 2.0]) / np.linalg.norm([1.0, 2.0])
+    assert np.allclose(output[1], expected)
+
+
+def test_batches_packed_by_tokens_and_chunk_size(make_embeddings):
+    texts = ["aa", "a", "aaa", "b", "bbbbb"]
+    embeddings, client = make_embeddings(_embed, max_batch_tokens=4)
+    assert len(embeddings.embed_documents(texts)) == 5
+    assert client.batches == [["aa", "a"], ["aaa", "b"], ["bbbbb"]]
+
+    embeddings, client = make_embeddings(_embed)
+    embeddings.embed_documents(texts, chunk_size=2)
+    assert [len(batch) for batch in client.batches] == [2, 2, 1]
+
+
+def test_batches_packed_by_tokens_by_default(make_embeddings):
+    embeddings, client = make_embeddings(_embed, embedding_ctx_length=3)
+    embeddings.embed_documents([f"a{i:02}" for i in range(10)])
+    # 8 * embedding_ctx_length tokens per batch
+    assert [len(batch) for batch in client.batches] == [8, 2]
+
+
+async def test_async_long_text(make_embeddings):
+    embeddings, client = make_embeddings(_embed, embedding_ctx_length=3)
+    output = await embeddings.aembed_documents(["aaabbb"])
+    assert np.allclose(output[0], np.array([1.0, 1.0]) / np.sqrt(2))
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+import json
+
+from langchain_glm.agents.output_parsers import tools
+from langchain_glm.agents.output_parsers.tools import parse_ai_message_to_tool_action
+from langchain_glm.chat_models.all_tools_message import ALLToolsMessageChunk
+
+
+def _message():
+    return ALLToolsMessageChunk(
+        content="",
+        tool_call_chunks=[
+            {
+                "name": "code_interpreter",
+                "args": json.dumps({"input": "print(1)"}),
+                "id": "call_1",
+                "index": 0,
+            },
+            {
+                "name": "code_interpreter",
+                "args": json.dumps({"outputs": [{"type": "logs", "logs": "1"}]}),
+                "id": "call_1",
+                "index": 0,
+            },
+            {
+                "name": "calculate",
+                "args": '{"text": "1+1"}',
+                "id": "call_2",
+                "index": 1,
+            },
+            {
+                "name": "web_browser",
+                "args": json.dumps({"input": "news"}),
+                "id": "call_3",
+                "index": 2,
+            },
+            {
+                "name": "web_browser",
+                "args": json.dumps(
+                    {"outputs": [{"title": "t", "link": "l", "content": "c"}]}
+                ),
+                "id": "call_3",
+                "index": 2,
+            },
+        ],
+    )
+
+
+def test_actions_keep_call_order():
+    actions = parse_ai_message_to_tool_action(_message())
+    assert [(action.tool, action.tool_call_id) for action in actions] == [
+        ("code_interpreter", "call_1"),
+        ("calculate", "call_2"),
+        ("web_browser", "call_3"),
+    ]
+    assert actions[0].tool_input == "print(1)"
+    assert actions[1].tool_input == {"text": "1+1"}
+
+
+def test_chunk_args_parsed_once(monkeypatch):
+    message = _message()
+    parsed = []
+
+    def counting_parse(s, *args, **kwargs):
+        parsed.append(s)
+        return json.loads(s)
+
+    monkeypatch.setattr(tools, "cached_parse_partial_json", counting_parse)
+    parse_ai_message_to_tool_action(message)
+    assert len(parsed) == 4
@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+import json
+import time
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+import pytest
+
+pytest.importorskip("fastapi")
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+from langchain_glm.agents.zhipuai_all_tools import (  # noqa: E402
+    AllToolsLLMStatus,
+    BaseSessionStore,
+    FileSessionStore,
+    InMemorySessionStore,
+)
+from langchain_glm.callbacks.agent_callback_handler import AgentStatus  # noqa: E402
+from langchain_glm.server import RunnablePool, ServerSettings, create_app  # noqa: E402
+from langchain_glm.server.client import SSEParser  # noqa: E402
+
+
+class _FakeRunnable:
+    """Streams one token event per word of the input, ``fail`` raises after
+    the first one."""
+
+    profiler = None
+
+    def __init__(self, session_store: BaseSessionStore):
+        self.session_store = session_store
+
+    def invoke(
+        self,
+        chat_input: str,
+        config: Optional[Dict[str, Any]] = None,
+        *,
+        session_id: Optional[str] = None,
+        profile: Optional[bool] = None,
+    ) -> AsyncIterator[AllToolsLLMStatus]:
+        run_id = str(config["run_id"])
+
+        async def events() -> AsyncIterator[AllToolsLLMStatus]:
+            for word in chat_input.split():
+                if word == "fail":
+                    raise RuntimeError("upstream failed")
+                yield AllToolsLLMStatus(
+                    run_id=run_id, status=AgentStatus.llm_new_token, text=word
+                )
+
+        return events()
+
+
+def _client(store: Optional[BaseSessionStore] = None, **settings: Any) -> TestClient:
+    store = store or InMemorySessionStore()
+    pool = RunnablePool(lambda: _FakeRunnable(store), size=1, max_concurrency=1)
+    settings = ServerSettings(ping_interval=0, compress_streams=False, **settings)
+    return TestClient(create_app(settings, pool=pool, session_store=store))
+
+
+def _events(body: bytes) -> List[Dict[str, Any]]:
+    return [json.loads(message.data) for message in SSEParser().feed(body)]
+
+
+def test_chat_streams_the_events_of_a_run():
+    with _client() as client:
+        response = client.post("/chat", json={"query": "hello big world"})
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    run_id = response.headers["x-run-id"]
+    assert response.headers["x-session-id"]
+    events = _events(response.content)
+    assert [event["text"] for event in events] == ["hello", "big", "world"]
+    assert {event["run_id"] for event in events} == {run_id}
+
+
+def test_errors_are_sent_with_the_run_id():
+    with _client() as client:
+        response = client.post("/chat", json={"query": "hello fail"})
+
+    events = _events(response.content)
+    assert [event["status"] for event in events] == [
+        AgentStatus.llm_new_token,
+        AgentStatus.error,
+    ]
+    assert "upstream failed" in events[-1]["text"]
+    assert {event["run_id"] for event in events} == {response.headers["x-run-id"]}
+
+
+def test_busy_pool_is_refused():
+    with _client() as client:
+        pool = client.app.state.pool
+        lease = client.portal.call(pool.acquire, "other")
+        try:
+            response = client.post("/chat", json={"query": "hello"})
+        finally:
+            client.portal.call(lease.release)
+        assert response.status_code == 503
+        assert client.post("/chat", json={"query": "hello"}).status_code == 200
+
+
+def test_streams_resume_after_the_last_event_id():
+    with _client() as client:
+        run_id = client.post("/chat", json={"query": "a b c d"}).headers["x-run-id"]
+
+        response = client.post(
+            "/chat", json={"query": "ignored"}, headers={"Last-Event-ID": f"{run_id}:2"}
+        )
+        assert response.status_code == 200
+        assert [event["text"] for event in _events(response.content)] == ["c", "d"]
+
+        response = client.get(f"/runs/{run_id}/events", params={"last_event_id": 3})
+        assert [event["text"] for event in _events(response.content)] == ["d"]
+
+        response = client.get(
+            f"/runs/{run_id}/events", headers={"Last-Event-ID": f"{run_id}:9"}
+        )
+        assert response.status_code == 410
+        assert client.get("/runs/unknown/events").status_code == 404
+
+
+def test_delete_session():
+    with _client() as client:
+        store = client.app.state.session_store
+        store.append("s1", history=[{"role": "user", "content": "hi"}])
+
+        response = client.delete("/sessions/s1")
+
+    assert response.json() == {"session_id": "s1", "deleted": True}
+    assert store.load("s1") is None
+
+
+def test_expired_sessions_are_evicted_in_the_background(tmp_path):
+    store = FileSessionStore(tmp_path, ttl=0.01)
+    store.append("s1", history=[{"role": "user", "content": "hi"}])
+
+    with _client(store, session_evict_interval=0.02):
+        for _ in range(50):
+            time.sleep(0.02)
+            if not list(tmp_path.iterdir()):
+                break
+        assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import json
+from typing import AsyncIterator, Iterator, List
+
+import httpx
+import pytest
+
+from langchain_glm.agents.zhipuai_all_tools.schema import (
+    AllToolsActionToolStart,
+    AllToolsFinish,
+    AllToolsLLMStatus,
+)
+from langchain_glm.server.client import SSEParser, ZhipuAIPluginsClient
+from langchain_glm.server.wire import WireFormat
+
+EVENTS = [
+    AllToolsLLMStatus(run_id="run", status=1, text=""),
+    *[AllToolsLLMStatus(run_id="run", status=2, text=c) for c in "你好!"],
+    AllToolsActionToolStart(run_id="tool", status=6, tool="calculate", tool_input="1"),
+    AllToolsFinish(run_id="run", status=5, return_values={"output": "你好!"}, log=""),
+]
+
+
+async def _body(wire: WireFormat) -> List[bytes]:
+    async def events() -> AsyncIterator:
+        for event in EVENTS:
+            yield event
+
+    body = b"".join([frame async for frame in wire.compress(wire.encode(events()))])
+    # split utf-8 characters and lines across chunks
+    return [body[i : i + 7] for i in range(0, len(body), 7)]
+
+
+def _client(
+    wire: WireFormat, chunks: List[bytes], requests: List[httpx.Request]
+) -> ZhipuAIPluginsClient:
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+
+        def stream() -> Iterator[bytes]:
+            yield from chunks
+
+        return httpx.Response(
+            200,
+            headers={"X-Session-Id": "s1", **wire.headers},
+            content=stream(),
+        )
+
+    return ZhipuAIPluginsClient(
+        event_format=wire.name,
+        http2=False,
+        transport=httpx.MockTransport(handler),
+    )
+
+
+def test_sse_parser_handles_split_lines():
+    parser = SSEParser()
+    stream = (
+        b': ping\r\n\r\nid: 7\r\ndata: {"a":\ndata: 1}\r\n\r\nevent: x\rdata:y\r\r\n'
+    )
+    messages = []
+    for i in range(len(stream)):
+        messages.extend(parser.feed(stream[i : i + 1]))
+    assert [(m.id, m.event, m.data) for m in messages] == [
+        ("7", None, '{"a":\n1}'),
+        ("7", "x", "y"),
+    ]
+    assert parser.last_event_id == "7"
+
+
+def test_chat_text_reads_only_deltas():
+    requests: List[httpx.Request] = []
+    wire = WireFormat("json", gzip=True)
+    client = _client(wire, asyncio.run(_body(wire)), requests)
+    events = list(client.chat("hi", session_id="s1"))
+    assert [event.to_component() for event in events] == EVENTS
+    assert events[-1]["return_values"] == {"output": "你好!"}
+    assert json.loads(requests[0].content) == {
+        "query": "hi",
+        "history": [],
+        "session_id": "s1",
+    }
+    assert requests[0].headers["X-Event-Format"] == "json"
+
+    deltas = []
+    for event in client.chat("hi"):
+        if event.is_text_delta:
+            deltas.append(event.text)
+        else:
+            # other events are never parsed
+            assert event._data is None
+    assert "".join(deltas) == "你好!"
+    assert client.last_session_id == "s1"
+    client.close()
+
+
+async def test_achat_decodes_compact_batches():
+    requests: List[httpx.Request] = []
+    wire = WireFormat("compact", gzip=True)
+    client = _client(wire, await _body(wire), requests)
+    # the handler above returns a sync stream, wrap it for the async client
+    transport = client.client_kwargs["transport"]
+
+    class _AsyncTransport(httpx.AsyncBaseTransport):
+        async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+            response = transport.handle_request(request)
+            chunks = list(response.stream)
+
+            async def stream() -> AsyncIterator[bytes]:
+                for chunk in chunks:
+                    yield chunk
+
+            return httpx.Response(200, headers=response.headers, content=stream())
+
+    client.client_kwargs["transport"] = _AsyncTransport()
+    async with client:
+        texts = [text async for text in client.achat_text("hi")]
+    assert "".join(texts) == "你好!"
+    assert requests[0].headers["X-Event-Format"] == "compact"
+
+
+@pytest.mark.parametrize("event_format", ["json", "compact", "msgpack"])
+def test_dropped_stream_resumes_after_last_event_id(event_format):
+    if event_format == "msgpack":
+        pytest.importorskip("msgpack")
+    wire = WireFormat(event_format, max_batch_size=2)
+    requests: List[httpx.Request] = []
+
+    def frames(start: int) -> List[bytes]:
+        async def events() -> AsyncIterator:
+            for event in EVENTS[start:]:
+                yield event
+
+        async def collect() -> List[bytes]:
+            return [frame async for frame in wire.encode(events(), "run", start)]
+
+        return asyncio.run(collect())
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        if request.method == "POST":
+            sent = frames(0)[:2]
+
+            def stream() -> Iterator[bytes]:
+                yield from sent
+                raise httpx.ReadError("connection lost", request=request)
+
+        else:
+            _, _, after = request.headers["Last-Event-ID"].rpartition(":")
+            rest = frames(int(after))
+
+            def stream() -> Iterator[bytes]:
+                yield from rest
+
+        headers = {"X-Run-Id": "run", **wire.headers}
+        return httpx.Response(200, headers=headers, content=stream())
+
+    client = ZhipuAIPluginsClient(
+        event_format=event_format,
+        http2=False,
+        transport=httpx.MockTransport(handler),
+    )
+    events = list(client.chat("hi"))
+
+    assert [event.to_component() for event in events] == EVENTS
+    assert events[-1].id == f"run:{len(EVENTS)}"
+    resumed = 2 if event_format == "json" else 4
+    assert requests[1].url.path == "/runs/run/events"
+    assert requests[1].headers["Last-Event-ID"] == f"run:{resumed}"
+    client.close()
@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+import asyncio
+from typing import AsyncIterator, Iterator, List
+
+import httpx
+import pytest
+
+from langchain_glm.agents.zhipuai_all_tools.schema import AllToolsLLMStatus
+from langchain_glm.server.client import ZhipuAIPluginsClient
+from langchain_glm.server.replay import ReplayGapError, RunRegistry, parse_event_id
+from langchain_glm.server.wire import WireFormat
+
+EVENTS = [AllToolsLLMStatus(run_id="llm", status=2, text=str(i)) for i in range(6)]
+
+
+async def _slow_events(produced: List[int]) -> AsyncIterator[AllToolsLLMStatus]:
+    for i, event in enumerate(EVENTS):
+        await asyncio.sleep(0.01)
+        produced.append(i)
+        yield event
+
+
+async def test_run_goes_on_without_reader_and_resumes():
+    runs = RunRegistry()
+    produced: List[int] = []
+    run = runs.start("run1", _slow_events(produced), session_id="s1")
+
+    reader = run.read()
+    seen = [await reader.__anext__(), await reader.__anext__()]
+    # the client disconnects
+    await reader.aclose()
+    await run.task
+    assert produced == list(range(6))
+
+    resumed = [event async for event in runs.get("run1").read(after=2)]
+    assert seen + resumed == EVENTS
+    assert parse_event_id("run1:2") == ("run1", 2)
+    assert parse_event_id("garbage") is None
+
+
+async def test_buffer_is_bounded():
+    runs = RunRegistry(max_runs=1, max_events=3, ttl=0)
+    run = runs.start("run1", _slow_events([]))
+    await run.task
+    assert [event.text for _, event in run.events] == ["3", "4", "5"]
+    with pytest.raises(ReplayGapError):
+        run.check(2)
+    run.check(3)
+
+    runs.start("run2", _slow_events([]))
+    # the finished run made room for the new one
+    assert runs.get("run1") is None
+    await runs.aclose()
+
+
+async def _frames(run_id: str, start: int) -> List[bytes]:
+    async def events() -> AsyncIterator[AllToolsLLMStatus]:
+        for event in EVENTS[start:]:
+            yield event
+
+    return [frame async for frame in WireFormat().encode(events(), run_id, start)]
+
+
+def test_client_resumes_dropped_stream():
+    first = asyncio.run(_frames("run1", 0))[:2]
+    rest = asyncio.run(_frames("run1", 2))
+    requests: List[httpx.Request] = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        headers = {"X-Run-Id": "run1", "X-Event-Format": "json"}
+        if request.method == "POST":
+
+            def dropped() -> Iterator[bytes]:
+                yield from first
+                raise httpx.ReadError("connection reset")
+
+            return httpx.Response(200, headers=headers, content=dropped())
+        return httpx.Response(200, headers=headers, content=iter(rest))
+
+    client = ZhipuAIPluginsClient(http2=False, transport=httpx.MockTransport(handler))
+    assert "".join(client.chat_text("hi")) == "012345"
+    assert requests[1].url.path == "/runs/run1/events"
+    assert requests[1].headers["Last-Event-ID"] == "run1:2"
@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+import asyncio
+from typing import AsyncIterator, List
+
+import pytest
+
+from langchain_glm.server.pool import PoolBusyError, RunnablePool
+from langchain_glm.server.settings import ServerSettings
+from langchain_glm.server.sse import PING, format_sse, with_pings
+
+
+async def test_pool_limits_streams_and_serializes_sessions():
+    built: List[object] = []
+
+    def factory() -> object:
+        built.append(object())
+        return built[-1]
+
+    pool = RunnablePool(factory, size=2, max_concurrency=2)
+    first = await pool.acquire("a")
+    second = await pool.acquire("b")
+    # the two streams got different runnables
+    assert {first.runnable, second.runnable} == set(built)
+    with pytest.raises(PoolBusyError):
+        await pool.acquire("c", timeout=0)
+
+    second.release()
+    # a second turn of session "a" waits for the first one
+    waiting = asyncio.ensure_future(pool.acquire("a", timeout=None))
+    await asyncio.sleep(0.01)
+    assert not waiting.done()
+    first.release()
+    third = await asyncio.wait_for(waiting, 1)
+    assert pool.in_flight == 1
+    third.release()
+    third.release()
+    assert pool.in_flight == 0
+    assert pool._session_locks == {}
+
+
+async def test_pings_fill_silent_streams():
+    closed = []
+
+    async def frames() -> AsyncIterator[bytes]:
+        try:
+            yield format_sse("first")
+            await asyncio.sleep(0.05)
+            yield format_sse("a\nb", event="end", id="2")
+            await asyncio.sleep(10)
+        finally:
+            closed.append(True)
+
+    received = []
+    stream = with_pings(frames(), interval=0.02)
+    async for frame in stream:
+        received.append(frame)
+        if frame.startswith(b"id: 2"):
+            break
+    await stream.aclose()
+
+    assert received[0] == b"data: first\n\n"
+    assert PING in received[1:-1]
+    assert received[-1] == b"id: 2\nevent: end\ndata: a\ndata: b\n\n"
+    assert closed == [True]
+
+
+def test_settings_round_trip_through_the_environment(monkeypatch):
+    settings = ServerSettings(workers=4, builtin_tools=["web_browser"])
+    for key, value in settings.to_env().items():
+        monkeypatch.setenv(key, value)
+    assert ServerSettings.from_env() == settings
+    assert ServerSettings.from_env(port=8000).port == 8000
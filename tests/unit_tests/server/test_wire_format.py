@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import json
+import zlib
+from typing import AsyncIterator, List
+
+import pytest
+
+from langchain_glm.agents.zhipuai_all_tools.schema import (
+    AllToolsActionToolStart,
+    AllToolsBaseComponent,
+    AllToolsLLMStatus,
+)
+from langchain_glm.server.wire import CompactDecoder, WireFormat, negotiate
+
+RUN_ID = "8c5b3d1e-6f7a-4b2c-9d0e-1f2a3b4c5d6e"
+
+EVENTS: List[AllToolsBaseComponent] = [
+    AllToolsLLMStatus(run_id=RUN_ID, status=1, text=""),
+    *[AllToolsLLMStatus(run_id=RUN_ID, status=2, text=c) for c in "hello"],
+    AllToolsActionToolStart(
+        run_id="tool-run", status=6, tool="calculate", tool_input="1+1"
+    ),
+]
+
+
+async def _events(delay: float = 0.0) -> AsyncIterator[AllToolsBaseComponent]:
+    for event in EVENTS:
+        yield event
+        if delay:
+            await asyncio.sleep(delay)
+
+
+async def _collect(frames: AsyncIterator[bytes]) -> List[bytes]:
+    return [frame async for frame in frames]
+
+
+def _sse_data(frames: List[bytes]) -> List[str]:
+    return [frame.decode().split("data: ", 1)[1].strip() for frame in frames]
+
+
+async def test_compact_batches_round_trip():
+    wire = WireFormat("compact", max_batch_size=4, max_delay=1.0)
+    frames = await _collect(wire.encode(_events()))
+    # seven events in batches of at most four
+    assert len(frames) == 2
+
+    decoder = CompactDecoder()
+    decoded = [
+        event
+        for data in _sse_data(frames)
+        for event in decoder.decode_batch(json.loads(data))
+    ]
+    assert decoded == [event.to_dict() for event in EVENTS]
+
+    json_size = sum(len(f) for f in await _collect(WireFormat().encode(_events())))
+    assert sum(len(f) for f in frames) < json_size / 2
+
+
+async def test_batches_are_sent_after_max_delay():
+    wire = WireFormat("compact", max_batch_size=64, max_delay=0.01)
+    frames = await _collect(wire.encode(_events(delay=0.03)))
+    assert len(frames) == len(EVENTS)
+
+
+async def test_gzip_frames_decode_as_they_arrive():
+    wire = WireFormat("json", gzip=True)
+    decompressor = zlib.decompressobj(31)
+    frames = await _collect(wire.compress(wire.encode(_events())))
+    first = decompressor.decompress(frames[0])
+    assert json.loads(_sse_data([first])[0]) == EVENTS[0].to_dict()
+    rest = b"".join(decompressor.decompress(frame) for frame in frames[1:])
+    assert rest.count(b"data: ") == len(EVENTS) - 1
+
+
+def test_negotiate():
+    assert negotiate({}).name == "json"
+    assert negotiate({}, default="compact").name == "compact"
+    wire = negotiate({"x-event-format": "compact", "accept-encoding": "br, gzip;q=0.8"})
+    assert (wire.name, wire.gzip) == ("compact", True)
+    assert wire.headers["Content-Encoding"] == "gzip"
+    assert not negotiate({"accept-encoding": "gzip;q=0"}).gzip
+    assert not negotiate({"accept-encoding": "gzip"}, allow_gzip=False).gzip
+    assert (
+        negotiate({"x-event-format": "json"}, {"format": "compact"}).name == "compact"
+    )
+    with pytest.raises(ValueError):
+        negotiate({"x-event-format": "xml"})
@@ -3,6 +3,9 @@ import sys
 
 import pytest
 
+from langchain_glm.agent_toolkits.all_tools.code_interpreter_pool import (
+    LocalCodeInterpreterPool,
+)
 from langchain_glm.agent_toolkits.all_tools.code_interpreter_tool import (
     CodeInterpreterAllToolExecutor,
 )
@@ -21,3 +24,50 @@ def test_python_ast_interpreter():
 Hello, World!
 """
     )
+
+
+@pytest.mark.skipif(sys.version_info < (3, 9), reason="Requires Python 3.9 or higher")
+async def test_local_code_interpreter_pool():
+    pool = LocalCodeInterpreterPool(size=1, timeout=2)
+    executor = CodeInterpreterAllToolExecutor(
+        name="code_interpreter",
+        platform_params={"sandbox": "none"},
+        worker_pool=pool,
+    )
+    try:
+        assert await pool.arun("x = 40", session_id="s") == ""
+        out = await executor.arun(
+            tool="code_interpreter", tool_input="print(x + 2)", log="", outputs=[]
+        )
+        # no run manager, no session: a fresh interpreter
+        assert "NameError" in out.code_output
+        assert await pool.arun("print(x + 2)", session_id="s") == "42\n"
+
+        with pytest.raises(RuntimeError):
+            await pool.arun("import time; time.sleep(5)", session_id="s")
+        # the worker was replaced, the session starts over
+        assert "NameError" in await pool.arun("x", session_id="s")
+    finally:
+        pool.close()
+
+
+@pytest.mark.skipif(sys.version_info < (3, 9), reason="Requires Python 3.9 or higher")
+async def test_code_interpreter_without_worker_pool():
+    class _UnusedPool:
+        def run(self, *args, **kwargs):
+            raise AssertionError("the worker pool must not be used")
+
+        arun = run
+
+    executor = CodeInterpreterAllToolExecutor(
+        name="code_interpreter",
+        platform_params={"sandbox": "none"},
+        worker_pool=_UnusedPool(),
+        use_worker_pool=False,
+    )
+    out = executor.run(tool="code_interpreter", tool_input="print(6 * 7)", log="")
+    assert "42" in out.code_output
+    out = await executor.arun(
+        tool="code_interpreter", tool_input="print(6 * 7)", log="", outputs=[]
+    )
+    assert "42" in out.code_output
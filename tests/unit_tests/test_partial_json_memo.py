@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+import json
+
+from langchain_glm.agents.output_parsers.tools import parse_ai_message_to_tool_action
+from langchain_glm.chat_models.all_tools_message import ALLToolsMessageChunk
+from langchain_glm.utils import partial_json
+from langchain_glm.utils.partial_json import PartialJsonMemo
+
+WEB_BROWSER_ARGS = json.dumps(
+    {
+        "outputs": [
+            {
+                "title": f"title {i}",
+                "link": f"https://example.com/{i}",
+                "content": "x" * 200,
+            }
+            for i in range(200)
+        ]
+    }
+)
+
+
+def _stream():
+    yield ALLToolsMessageChunk(
+        content="",
+        tool_call_chunks=[
+            {
+                "name": "web_browser",
+                "args": '{"input": "news"}',
+                "id": "call_0",
+                "index": 0,
+            }
+        ],
+    )
+    yield ALLToolsMessageChunk(
+        content="",
+        tool_call_chunks=[
+            {
+                "name": "web_browser",
+                "args": WEB_BROWSER_ARGS,
+                "id": "call_0",
+                "index": 1,
+            }
+        ],
+    )
+    yield ALLToolsMessageChunk(
+        content="",
+        tool_call_chunks=[
+            {"name": "calculate", "args": "", "id": "call_1", "index": 2}
+        ],
+    )
+    for delta in ['{"text"', ': "1', "+1", '"}']:
+        yield ALLToolsMessageChunk(
+            content="",
+            tool_call_chunks=[{"name": None, "args": delta, "id": None, "index": 2}],
+        )
+
+
+def _count_payload_parses(monkeypatch, memo: PartialJsonMemo) -> int:
+    parsed = []
+    parse = partial_json.parse_partial_json
+
+    def counting_parse(s, *args, **kwargs):
+        if s == WEB_BROWSER_ARGS:
+            parsed.append(s)
+        return parse(s, *args, **kwargs)
+
+    monkeypatch.setattr(partial_json, "parse_partial_json", counting_parse)
+    monkeypatch.setattr(partial_json, "partial_json_memo", memo)
+    message = None
+    for chunk in _stream():
+        message = chunk if message is None else message + chunk
+    actions = parse_ai_message_to_tool_action(message)
+    assert [action.tool for action in actions] == ["web_browser", "calculate"]
+    assert message.tool_calls[0]["args"]["outputs"][199]["title"] == "title 199"
+    return len(parsed)
+
+
+def test_large_payload_parsed_once(monkeypatch):
+    memo = PartialJsonMemo()
+    assert _count_payload_parses(monkeypatch, memo) == 1
+    assert memo.hits > 5
+
+
+def test_without_memo_payload_parsed_per_message(monkeypatch):
+    uncached = PartialJsonMemo(min_length=len(WEB_BROWSER_ARGS) + 1)
+    assert _count_payload_parses(monkeypatch, uncached) > 5
+
+
+def test_actions_do_not_share_the_memoised_args(monkeypatch):
+    monkeypatch.setattr(partial_json, "partial_json_memo", PartialJsonMemo())
+    message = None
+    for chunk in _stream():
+        message = chunk if message is None else message + chunk
+
+    first = parse_ai_message_to_tool_action(message)
+    first[0].outputs[0]["title"] = "changed"
+    second = parse_ai_message_to_tool_action(message)
+
+    assert second[0].outputs[0]["title"] == "title 0"
+    assert message.tool_calls[0]["args"]["outputs"][0]["title"] == "title 0"
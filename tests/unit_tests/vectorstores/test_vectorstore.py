@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+from typing import List
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from langchain_glm.vectorstores import VectorIndex, ZhipuAIVectorStore
+
+
+def _random(n: int, dim: int = 16, seed: int = 0) -> np.ndarray:
+    vectors = np.random.default_rng(seed).normal(size=(n, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def _brute_force(vectors: np.ndarray, query: np.ndarray, k: int) -> List[int]:
+    return list(np.argsort(-(vectors @ query))[:k])
+
+
+def test_exact_search_matches_brute_force():
+    vectors = _random(500)
+    ids = [str(i) for i in range(500)]
+    index = VectorIndex()
+    index.add(ids[:200], vectors[:200])
+    index.add(ids[200:], vectors[200:])
+
+    queries = _random(7, seed=1)
+    results = index.search(queries, k=5)
+    for query, hits in zip(queries, results):
+        assert [int(id_) for id_, _ in hits] == _brute_force(vectors, query, 5)
+        assert np.isclose(hits[0][1], float(vectors[int(hits[0][0])] @ query))
+
+    index.delete(["3", "4"])
+    assert [id_ for id_, _ in index.search(vectors[3], k=1)[0]] != ["3"]
+    assert len(index) == 498
+    # adding an existing id replaces its vector
+    index.add(["5"], vectors[6:7])
+    assert index.search(vectors[6], k=2)[0][1][0] in {"5", "6"}
+
+
+def test_ivf_finds_the_nearest_vectors():
+    vectors = _random(2000, seed=2)
+    index = VectorIndex()
+    index.add([str(i) for i in range(2000)], vectors)
+    index.build_ivf(n_lists=32, n_probe=4)
+    hits = index.search(vectors[:50], k=1)
+    assert all(hit[0][0] == str(i) for i, hit in enumerate(hits))
+
+    index.add(["new"], _random(1, seed=3))
+    assert index.search(_random(1, seed=3), k=1)[0][0][0] == "new"
+    index.delete(["new"])
+    assert index.search(_random(1, seed=3), k=1)[0][0][0] != "new"
+
+
+def test_save_and_memory_mapped_load(tmp_path):
+    vectors = _random(100)
+    index = VectorIndex()
+    index.add([str(i) for i in range(100)], vectors)
+    index.delete(["0"])
+    index.build_ivf(n_lists=4, n_probe=4)
+    index.save(str(tmp_path))
+
+    loaded = VectorIndex.load(str(tmp_path))
+    assert isinstance(loaded.vectors, np.memmap)
+    assert len(loaded) == 99
+    assert loaded.search(vectors[1], k=3) == index.search(vectors[1], k=3)
+
+    loaded.add(["extra"], vectors[0:1])
+    loaded.save(str(tmp_path))
+    assert VectorIndex.load(str(tmp_path)).search(vectors[0], k=1)[0][0][0] == "extra"
+
+
+class _CharEmbeddings(Embeddings):
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self.embed_query(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return [float(text.count(c)) for c in "abcd"]
+
+
+def test_vector_store(tmp_path):
+    store = ZhipuAIVectorStore.from_texts(
+        ["aaa", "bbb", "ab", "ccc"],
+        _CharEmbeddings(),
+        metadatas=[{"kind": "x"}, {"kind": "y"}, {"kind": "y"}, {"kind": "x"}],
+        ids=["1", "2", "3", "4"],
+    )
+    assert [doc.id for doc in store.similarity_search("aab", k=2)] == ["3", "1"]
+    assert [
+        doc.id for doc in store.similarity_search("a", k=1, filter={"kind": "y"})
+    ] == ["3"]
+    batch = store.batch_similarity_search_with_score(["b", "c"], k=1)
+    assert [hits[0][0].id for hits in batch] == ["2", "4"]
+    assert np.isclose(batch[0][0][1], 1.0)
+
+    store.delete(["3"])
+    assert store.get_by_ids(["3", "4"])[0].page_content == "ccc"
+    store.save_local(str(tmp_path))
+
+    loaded = ZhipuAIVectorStore.load_local(str(tmp_path), _CharEmbeddings())
+    docs = loaded.similarity_search_with_relevance_scores("aab", k=1)
+    assert docs[0][0].id == "1" and docs[0][0].metadata == {"kind": "x"}
+    assert 0 < docs[0][1] <= 1
+
+
+def test_repeated_ids_in_one_batch_keep_the_last_vector():
+    store = ZhipuAIVectorStore(embedding=_CharEmbeddings())
+    store.add_texts(["aaa", "bbb", "ccc"], ids=["1", "1", "2"])
+
+    assert len(store.index) == 2
+    hits = store.similarity_search("a", k=3)
+    assert sorted(doc.id for doc in hits) == ["1", "2"]
+    assert store.get_by_ids(["1"])[0].page_content == "bbb"
+
+    store.delete(["1"])
+    assert [doc.id for doc in store.similarity_search("a", k=3)] == ["2"]